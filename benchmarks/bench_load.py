@@ -0,0 +1,99 @@
+"""
+加载基准测试：比较优化前后从数据库加载交易记录的耗时
+
+优化前：load()逐行构造字典，再用datetime.strptime解析日期
+优化后：游标元组直接构造Transaction，日期用datetime.fromisoformat解析
+
+用法：
+    python benchmarks/bench_load.py            # 默认100万条
+    python benchmarks/bench_load.py 200000     # 指定条数
+"""
+import sys
+import os
+import gc
+import time
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from database.database import Database
+from database.storage import DATE_FORMAT
+from managers.transaction_manager import TransactionManager, TRANSACTION_COLUMNS
+from models.transaction import Transaction, TransactionType
+
+
+def populate(database, count):
+    """写入count条测试交易"""
+    base_date = datetime(2020, 1, 1)
+    notes = ['早餐', '午餐', '打车', '工资', '']
+    database.save_many('transactions', (
+        {
+            'amount': float(i % 1000) + 0.5,
+            'type': '收入' if i % 10 == 0 else '支出',
+            'category_id': i % 7 + 1,
+            'date': (base_date + timedelta(seconds=i * 37)).strftime(DATE_FORMAT),
+            'note': notes[i % len(notes)],
+        }
+        for i in range(count)
+    ))
+
+
+def load_before(database):
+    """优化前的加载方式：字典行 + strptime"""
+    transactions = []
+    for item in database.load('transactions'):
+        trans_type = (TransactionType.INCOME if item['type'] == '收入'
+                      else TransactionType.EXPENSE)
+        transactions.append(Transaction(
+            transaction_id=item['id'],
+            amount=item['amount'],
+            trans_type=trans_type,
+            category_id=item['category_id'],
+            date=datetime.strptime(item['date'], DATE_FORMAT),
+            note=item.get('note', '')
+        ))
+    return transactions
+
+
+def load_after(database, manager):
+    """优化后的加载方式：元组行直接构造Transaction"""
+    return list(database.iter_load(
+        'transactions',
+        columns=TRANSACTION_COLUMNS,
+        row_factory=manager._row_factory()
+    ))
+
+
+def timed(func, *args):
+    """执行func，返回(结果, 耗时秒)"""
+    gc.collect()
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    """运行基准测试并打印结果"""
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+
+    with tempfile.TemporaryDirectory() as folder:
+        database = Database(os.path.join(folder, 'bench.db'))
+        print(f"写入 {count:,} 条交易记录...")
+        populate(database, count)
+
+        before, before_time = timed(load_before, database)
+        del before
+        manager, manager_time = timed(TransactionManager, database)
+        after, after_time = timed(load_after, database, manager)
+        del after
+
+        print(f"  优化前 字典行 + strptime        {before_time:6.2f} 秒")
+        print(f"  优化后 元组行 + fromisoformat   {after_time:6.2f} 秒  "
+              f"(快 {before_time / after_time:.1f} 倍)")
+        print(f"  TransactionManager完整加载(含索引) {manager_time:6.2f} 秒")
+        database.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+内存占用基准测试：比较带__slots__的Transaction与普通类（每个实例一个__dict__）
+
+用法：
+    python benchmarks/bench_memory.py            # 默认100万条
+    python benchmarks/bench_memory.py 200000     # 指定条数，结果换算为每100万条
+"""
+import sys
+import os
+import gc
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from models.transaction import Transaction, TransactionType
+
+
+class DictTransaction:
+    """与优化前相同的普通类，用于对比"""
+
+    def __init__(self, transaction_id=None, amount=0.0,
+                 trans_type=TransactionType.EXPENSE,
+                 category_id=None, date=None, note=""):
+        self.id = transaction_id
+        self.amount = amount
+        self.type = trans_type
+        self.category_id = category_id
+        self.date = date
+        self.note = note
+
+
+def measure(cls, count):
+    """构造count个对象，返回(峰值字节数, 耗时秒)"""
+    base_date = datetime(2020, 1, 1)
+    notes = ['早餐', '午餐', '打车', '工资', '']
+
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    items = [
+        cls(transaction_id=i, amount=float(i % 1000) + 0.5,
+            trans_type=TransactionType.EXPENSE, category_id=i % 7 + 1,
+            date=base_date + timedelta(seconds=i * 37),
+            note=notes[i % len(notes)])
+        for i in range(count)
+    ]
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del items
+    return peak, elapsed
+
+
+def main():
+    """运行基准测试并打印结果"""
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    scale = 1000000 / count
+
+    print(f"构造 {count:,} 条交易记录（结果换算为每100万条）")
+    results = {}
+    for name, cls in [('普通类(__dict__)', DictTransaction),
+                      ('Transaction(__slots__)', Transaction)]:
+        peak, elapsed = measure(cls, count)
+        results[name] = peak * scale
+        print(f"  {name:24s} 内存 {peak * scale / 1024 / 1024:8.1f} MB  "
+              f"耗时 {elapsed:6.2f} 秒")
+
+    before, after = results.values()
+    print(f"每100万条节省 {(before - after) / 1024 / 1024:.1f} MB "
+          f"({(before - after) / before * 100:.0f}%)，"
+          f"每条约 {(before - after) / 1000000:.0f} 字节")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,57 +1,130 @@
 """数据库管理模块 - 对应UML组件图中的Database组件"""
 import sqlite3
 import os
+import threading
+import weakref
+from contextlib import contextmanager
+from pathlib import Path
+
+from database.migrations import (migrate, get_schema_version, create_note_fts,
+                                 create_monthly_rollup, ROLLUP_SELECT,
+                                 ROLLUP_REL_TOLERANCE, ROLLUP_ABS_TOLERANCE)
+from database.storage import (CODECS, get_storage_format, convert_storage,
+                              has_table)
+
+# 各表的INSERT语句
+INSERT_SQL = {
+    'transactions': 'INSERT INTO transactions (amount, type, category_id, date, note) '
+                    'VALUES (?, ?, ?, ?, ?)',
+    'categories': 'INSERT INTO categories (name, icon, type, is_predefined) '
+                  'VALUES (?, ?, ?, ?)',
+}
+
+# 指定ID插入，参数为(id, *_insert_params())
+INSERT_WITH_ID_SQL = {
+    'transactions': 'INSERT INTO transactions '
+                    '(id, amount, type, category_id, date, note) '
+                    'VALUES (?, ?, ?, ?, ?, ?)',
+    'categories': 'INSERT INTO categories (id, name, icon, type, is_predefined) '
+                  'VALUES (?, ?, ?, ?, ?)',
+}
+
+
+def dict_row_factory(cursor, row):
+    """将一行转换为{列名: 值}字典"""
+    return {desc[0]: value for desc, value in zip(cursor.description, row)}
+
+
+def _py_lower(value):
+    """SQL函数py_lower()的实现"""
+    return value.lower() if value is not None else None
+
+
+class _ReaderHolder:
+    """线程局部存储中的只读连接持有者，线程结束时随线程局部数据一起释放"""
+    
+    __slots__ = ('conn', '__weakref__')
+    
+    def __init__(self, conn):
+        self.conn = conn
+
+
+def _release_reader(readers, lock, reader):
+    """关闭只读连接并移出连接池（线程结束或数据库关闭时调用）"""
+    with lock:
+        if reader in readers:
+            readers.remove(reader)
+    reader.close()
+
 
 class Database:
     """数据库类 - 对应UML类图中的Database类"""
     
-    def __init__(self, db_path='accounting.db'):
-        """初始化数据库连接"""
+    def __init__(self, db_path='accounting.db', concurrent=False,
+                 storage_format=None):
+        """
+        初始化数据库连接
+        
+        Args:
+            db_path: 数据库文件路径，':memory:'为内存数据库
+            concurrent: 是否启用并发模式（仅文件数据库有效）。
+                        启用后使用WAL日志，写操作经由唯一的写连接串行执行，
+                        读操作使用每个线程各自的只读连接，读不会被写阻塞
+            storage_format: 交易表存储格式（可选）。'text'为REAL金额和文本日期，
+                            'compact'为整数分和整数秒时间戳；与现有格式不同时
+                            自动转换已有数据，为None时保持现有格式
+        """
         self.db_path = db_path
+        self.storage_format = storage_format
+        self.codec = CODECS['text']
         self.conn = None
+        self.concurrent = concurrent
+        self._transaction_depth = 0
+        self._rollback_listeners = []
+        # 写锁：保证同一时刻只有一个线程在写连接上执行事务
+        self._write_lock = threading.RLock()
+        self._writer_thread = None
+        # 读连接池：每个线程一个只读连接，线程结束时关闭
+        self._local = threading.local()
+        self._readers = []
+        self._readers_lock = threading.Lock()
         self.init_database()
     
     def init_database(self):
         """初始化数据库表"""
         db_path = self.db_path.strip()
+        self.is_memory = db_path == ':memory:'
         
-        if db_path == ':memory:':
-            # 内存数据库
+        if self.is_memory:
+            # 内存数据库只能有一个连接，不支持并发模式
+            self.concurrent = False
             self.conn = sqlite3.connect(':memory:')
         else:
             # 文件数据库，确保目录存在
             db_dir = os.path.dirname(db_path)
             if db_dir and not os.path. exists(db_dir):
                 os.makedirs(db_dir)
-            self.conn = sqlite3.connect(db_path)
+            # 并发模式下写连接由持有写锁的任意线程使用
+            self.conn = sqlite3.connect(
+                db_path, check_same_thread=not self.concurrent
+            )
+            if self.concurrent:
+                self.conn.execute('PRAGMA journal_mode=WAL')
+                self.conn.execute('PRAGMA synchronous=NORMAL')
         
-        cursor = self.conn.cursor()
+        # 与Python一致的小写转换，供关键词查询使用
+        self.conn.create_function('py_lower', 1, _py_lower, deterministic=True)
         
-        # 创建交易表
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS transactions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                amount REAL NOT NULL,
-                type TEXT NOT NULL,
-                category_id INTEGER,
-                date TEXT NOT NULL,
-                note TEXT
-            )
-        ''')
-        
-        # 创建分类表
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS categories (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                icon TEXT,
-                type TEXT,
-                is_predefined INTEGER DEFAULT 0
-            )
-        ''')
+        # 按版本执行结构迁移（建表、索引等），旧数据库原地升级
+        migrate(self.conn)
         
         self.conn.commit()
         self._init_predefined_categories()
+        
+        self.has_fts = has_table(self.conn, 'transactions_fts')
+        self.codec = CODECS[get_storage_format(self.conn)]
+        if self.storage_format and self.storage_format != self.codec.name:
+            self.convert_storage(self.storage_format)
     
     def _init_predefined_categories(self):
         """初始化预定义分类"""
@@ -85,58 +158,390 @@ class Database:
         Returns:
             插入的记录ID
         """
-        cursor = self.conn.cursor()
+        with self.transaction():
+            cursor = self.conn.cursor()
+            cursor.execute(INSERT_SQL[table], self._insert_params(table, data))
+        return cursor.lastrowid
+    
+    def save_many(self, table, rows, first_id=None):
+        """
+        批量保存数据，整批在同一个事务中只提交一次
         
-        if table == 'transactions':
-            cursor.execute(
-                'INSERT INTO transactions (amount, type, category_id, date, note) '
-                'VALUES (?, ?, ?, ?, ?)',
-                (data['amount'], data['type'], data['category_id'], 
-                 data['date'], data.get('note', ''))
-            )
-        elif table == 'categories':
-            cursor.execute(
-                'INSERT INTO categories (name, icon, type, is_predefined) '
-                'VALUES (?, ?, ?, ?)',
-                (data['name'], data.get('icon', ''), 
-                 data.get('type'), data.get('is_predefined', 0))
-            )
+        Args:
+            table: 表名
+            rows: 数据字典的可迭代对象
+            first_id: 第一条记录的ID（可选），其余记录依次递增，
+                      通常取next_id()的返回值；默认由数据库自动分配
         
-        self.conn.commit()
-        return cursor.lastrowid
+        Returns:
+            插入的记录数
+        """
+        params = [self._insert_params(table, data) for data in rows]
+        sql = INSERT_SQL[table]
+        if first_id is not None:
+            sql = INSERT_WITH_ID_SQL[table]
+            params = [(first_id + offset, *values)
+                      for offset, values in enumerate(params)]
+        with self.transaction():
+            cursor = self.conn.cursor()
+            cursor.executemany(sql, params)
+        return len(params)
+    
+    def next_id(self, table):
+        """
+        表的下一个自增ID，与AUTOINCREMENT的分配规则一致（不重用已删除的ID）
+        
+        应在transaction(immediate=True)中调用并在同一工作单元中插入，
+        先取得写锁，避免ID被其他连接的写入占用
+        
+        Args:
+            table: 表名
+        
+        Returns:
+            下一条记录的ID
+        """
+        cursor = self.conn.cursor()
+        row = cursor.execute(
+            'SELECT seq FROM sqlite_sequence WHERE name = ?', (table,)
+        ).fetchone()
+        max_id = cursor.execute(f'SELECT MAX(id) FROM {table}').fetchone()[0]
+        return max(row[0] if row else 0, max_id or 0) + 1
     
-    def load(self, table, condition=None):
+    def _insert_params(self, table, data):
+        """将数据字典转换为INSERT语句参数"""
+        if table == 'transactions':
+            return (self.codec.encode_amount(data['amount']), data['type'],
+                    data['category_id'], self.codec.encode_date(data['date']),
+                    data.get('note', ''))
+        return (data['name'], data.get('icon', ''),
+                data.get('type'), data.get('is_predefined', 0))
+    
+    def load(self, table, condition=None, params=(), order_by=None):
         """
         加载数据 - 对应UML中的load()方法
         
         Args:
             table: 表名
-            condition: 查询条件（可选）
+            condition: 查询条件（可选），值用?占位
+            params: 查询条件中占位符对应的参数
+            order_by: 排序子句（可选）
         
         Returns:
             查询结果列表
         """
-        cursor = self.conn.cursor()
+        return list(self.iter_load(table, condition, params,
+                                   order_by=order_by,
+                                   row_factory=dict_row_factory))
+    
+    def iter_load(self, table, where=None, params=(), batch_size=500,
+                  row_factory=None, columns='*', order_by=None, limit=None,
+                  group_by=None):
+        """
+        流式加载数据，每次从游标取一批，内存占用与总行数无关
         
-        if condition:
-            query = f'SELECT * FROM {table} WHERE {condition}'
-        else:
-            query = f'SELECT * FROM {table}'
+        Args:
+            table: 表名
+            where: 查询条件（可选），值用?占位
+            params: 查询条件中占位符对应的参数
+            batch_size: 每批读取的行数（游标arraysize）
+            row_factory: 行转换函数 row_factory(cursor, row)，
+                         为None时直接产出元组
+            columns: 查询的列，默认全部
+            order_by: 排序子句（可选）
+            limit: 最多读取的行数（可选）
+            group_by: 分组子句（可选）
         
-        cursor.execute(query)
-        columns = [desc[0] for desc in cursor.description]
-        results = []
+        Yields:
+            每行的元组或row_factory的返回值
+        """
+        cursor = self.read_connection().cursor()
+        cursor.arraysize = batch_size
         
-        for row in cursor.fetchall():
-            results.append(dict(zip(columns, row)))
+        query = f'SELECT {columns} FROM {table}'
+        if where:
+            query += f' WHERE {where}'
+        if group_by:
+            query += f' GROUP BY {group_by}'
+        if order_by:
+            query += f' ORDER BY {order_by}'
+        if limit is not None:
+            query += f' LIMIT {int(limit)}'
         
-        return results
+        cursor.execute(query, tuple(params))
+        while True:
+            rows = cursor.fetchmany()
+            if not rows:
+                break
+            if row_factory is None:
+                yield from rows
+            else:
+                for row in rows:
+                    yield row_factory(cursor, row)
+    
     def delete(self, table, record_id):
         """删除记录"""
-        cursor = self.conn.cursor()
-        cursor.execute(f'DELETE FROM {table} WHERE id = ?', (record_id,))
-        self.conn.commit()
+        with self.transaction():
+            cursor = self.conn.cursor()
+            cursor.execute(f'DELETE FROM {table} WHERE id = ?', (record_id,))
+    
+    def update(self, table, record_id, data):
+        """
+        更新记录
+        
+        Args:
+            table: 表名
+            record_id: 记录ID
+            data: 要更新的字段字典
+        
+        Returns:
+            受影响的行数
+        """
+        if table == 'transactions':
+            data = dict(data)
+            if 'amount' in data:
+                data['amount'] = self.codec.encode_amount(data['amount'])
+            if 'date' in data:
+                data['date'] = self.codec.encode_date(data['date'])
+        columns = ', '.join(f'{column}=?' for column in data)
+        with self.transaction():
+            cursor = self.conn.cursor()
+            cursor.execute(
+                f'UPDATE {table} SET {columns} WHERE id = ?',
+                (*data.values(), record_id)
+            )
+        return cursor.rowcount
+    
+    @contextmanager
+    def transaction(self, immediate=False):
+        """
+        工作单元上下文管理器
+        
+        with块内的save/delete/update不会单独提交，
+        最外层with块正常结束时统一提交一次，出现异常时整体回滚。
+        可以嵌套使用，嵌套的内层块并入外层事务。
+        工作单元期间持有写锁，其他线程的写操作会等待其结束。
+        
+        Args:
+            immediate: 是否立即以BEGIN IMMEDIATE取得数据库写锁。
+                默认的事务在第一条写语句时才加锁，此前的读取（如next_id()）
+                可能被其他连接（包括其他进程）的写入抢先
+        """
+        with self._write_lock:
+            self._transaction_depth += 1
+            self._writer_thread = threading.get_ident()
+            try:
+                if immediate and not self.conn.in_transaction:
+                    self.conn.execute('BEGIN IMMEDIATE')
+                yield self
+            except BaseException:
+                self._transaction_depth -= 1
+                if self._transaction_depth == 0:
+                    self._writer_thread = None
+                    self.conn.rollback()
+                    for callback in list(self._rollback_listeners):
+                        callback()
+                raise
+            self._transaction_depth -= 1
+            if self._transaction_depth == 0:
+                self._writer_thread = None
+                self.conn.commit()
+    
+    def in_transaction(self):
+        """当前线程是否处于transaction()工作单元中"""
+        return (self._transaction_depth > 0 and
+                self._writer_thread == threading.get_ident())
+    
+    def add_rollback_listener(self, callback):
+        """
+        注册回滚回调，工作单元回滚后调用，
+        用于让内存中的数据与数据库重新同步
+        """
+        self._rollback_listeners.append(callback)
+    
+    def read_connection(self):
+        """
+        获取当前线程用于读取的连接
+        
+        非并发模式下总是返回写连接；并发模式下，处于工作单元中的线程
+        使用写连接以读到自己未提交的修改，其余情况返回线程独占的只读连接。
+        只读连接由线程局部数据持有，线程结束后自动关闭并移出连接池，
+        短生命周期的工作线程不会使打开的连接不断增加。
+        """
+        if not self.concurrent or self.in_transaction():
+            return self.conn
+        
+        holder = getattr(self._local, 'reader', None)
+        if holder is None:
+            uri = Path(self.db_path.strip()).resolve().as_uri() + '?mode=ro'
+            reader = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            reader.create_function('py_lower', 1, _py_lower,
+                                   deterministic=True)
+            holder = self._local.reader = _ReaderHolder(reader)
+            with self._readers_lock:
+                self._readers.append(reader)
+            weakref.finalize(holder, _release_reader, self._readers,
+                             self._readers_lock, reader)
+        return holder.conn
+    
+    def convert_storage(self, target):
+        """
+        转换交易表存储格式，已有数据原地转换
+        
+        Args:
+            target: 目标格式（'text'或'compact'）
+        
+        Returns:
+            转换的记录数
+        """
+        with self._write_lock:
+            count = convert_storage(self.conn, target)
+            self.codec = CODECS[target]
+        return count
+    
+    def match_notes(self, expression):
+        """
+        在备注全文索引中检索
+        
+        Args:
+            expression: FTS5查询表达式，支持"短语"、前缀*、AND/OR/NOT，
+                        trigram分词下每个词至少3个字符
+        
+        Returns:
+            匹配的交易ID集合
+        """
+        if not self.has_fts:
+            raise ValueError("当前数据库不支持全文检索")
+        cursor = self.read_connection().execute(
+            'SELECT rowid FROM transactions_fts WHERE transactions_fts MATCH ?',
+            (expression,)
+        )
+        return {row[0] for row in cursor}
+    
+    def rebuild_fts(self):
+        """
+        重建备注全文索引
+        
+        全文索引表或同步触发器不存在时先创建，再根据交易表重新生成索引，
+        用于修复旧数据库或索引与数据不一致的情况
+        
+        Returns:
+            是否支持全文检索
+        """
+        with self.transaction():
+            create_note_fts(self.conn.cursor())
+        self.has_fts = has_table(self.conn, 'transactions_fts')
+        return self.has_fts
+    
+    def rebuild_rollup(self):
+        """
+        按原始交易数据重建月度汇总表
+        
+        汇总表或同步触发器不存在时先创建，用于修复汇总与数据不一致的情况
+        
+        Returns:
+            汇总表的行数
+        """
+        with self.transaction():
+            cursor = self.conn.cursor()
+            create_monthly_rollup(cursor)
+            return cursor.execute(
+                'SELECT COUNT(*) FROM monthly_rollup').fetchone()[0]
+    
+    def verify_rollup(self):
+        """
+        校验月度汇总表与原始交易数据是否一致
+        
+        Returns:
+            合计或笔数不一致的(年, 月, 类型, 分类ID)列表，一致时为空列表
+        """
+        stored = ('SELECT year, month, type, category_id, total, count '
+                  'FROM monthly_rollup')
+        expected = ROLLUP_SELECT
+        same_key = ('a.year = b.year AND a.month = b.month AND a.type = b.type '
+                    'AND a.category_id IS b.category_id')
+        cursor = self.read_connection().cursor()
+        # 合计允许的误差与math.isclose()相同：相对误差按两者中较大的绝对值计算
+        # （文本格式的REAL合计逐笔加减，误差随合计增大）
+        cursor.execute(f'''
+            SELECT a.year, a.month, a.type, a.category_id
+            FROM ({stored}) AS a LEFT JOIN ({expected}) AS b ON {same_key}
+            WHERE b.year IS NULL OR a.count != b.count
+               OR abs(a.total - b.total) >
+                  max(? * max(abs(a.total), abs(b.total)), ?)
+            UNION
+            SELECT a.year, a.month, a.type, a.category_id
+            FROM ({expected}) AS a LEFT JOIN ({stored}) AS b ON {same_key}
+            WHERE b.year IS NULL
+            ORDER BY 1, 2, 3, 4
+        ''', (ROLLUP_REL_TOLERANCE, ROLLUP_ABS_TOLERANCE))
+        return cursor.fetchall()
+    
+    def data_version(self):
+        """
+        获取写连接的PRAGMA data_version
+        
+        其他连接（包括其他进程）提交修改后该值会变化，本连接自己的提交不会，
+        可用于判断数据库是否被外部修改
+        """
+        return self.conn.execute('PRAGMA data_version').fetchone()[0]
+    
+    def total_changes(self):
+        """
+        写连接自打开以来修改的总行数
+        
+        经由本连接的任何修改（包括不经过管理器直接执行的SQL）都会使其增加
+        """
+        return self.conn.total_changes
+    
+    def change_stamp(self, table):
+        """
+        表的修改标记，用于校验内存模型快照是否过期
+        
+        修改计数由触发器维护并随数据一起持久化。PRAGMA data_version只在
+        同一连接存续期间有意义，不能用于校验上次运行时保存的快照。
+        
+        Args:
+            table: 表名（'transactions'或'categories'）
+        
+        Returns:
+            (修改计数, 最大ID, 行数)
+        """
+        changes = next(self.iter_load(
+            'settings', 'key = ?', (f'{table}_changes',), columns='value'
+        ), None)
+        count, max_id = next(self.iter_load(table, columns='COUNT(*), MAX(id)'))
+        return (int(changes[0]) if changes else None, max_id, count)
+    
+    def sum_by_category(self, where=None, params=()):
+        """
+        按类型和分类汇总交易金额，在数据库中完成，不读取交易行
+        
+        Args:
+            where: 查询条件（可选），值用?占位，如TransactionQuery.build()的结果
+            params: 查询条件中占位符对应的参数
+        
+        Returns:
+            [(类型值, 分类ID, 金额合计, 笔数, 最小金额, 最大金额)]，
+            金额均为存储值（文本格式为金额，紧凑格式为整数分），
+            由codec.sum_amounts()和codec.decode_amount()转换
+        """
+        return list(self.iter_load(
+            'transactions', where, params,
+            columns=('type, category_id, SUM(amount), COUNT(*), '
+                     'MIN(amount), MAX(amount)'),
+            group_by='type, category_id'
+        ))
+    
+    def get_schema_version(self):
+        """获取当前数据库结构版本"""
+        return get_schema_version(self.conn)
+    
     def close(self):
         """关闭数据库连接"""
+        with self._readers_lock:
+            for reader in self._readers:
+                reader.close()
+            self._readers.clear()
+        self._local = threading.local()
         if self.conn:
             self.conn.close()
\ No newline at end of file
@@ -0,0 +1,331 @@
+"""数据库结构迁移 - 按版本号顺序升级数据库结构"""
+import sqlite3
+from datetime import datetime
+
+
+def _create_base_tables(cursor):
+    """创建交易表和分类表"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS transactions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            amount REAL NOT NULL,
+            type TEXT NOT NULL,
+            category_id INTEGER,
+            date TEXT NOT NULL,
+            note TEXT
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS categories (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            icon TEXT,
+            type TEXT,
+            is_predefined INTEGER DEFAULT 0
+        )
+    ''')
+
+
+# 交易表索引：按日期范围、分类+日期、类型+日期查询
+TRANSACTION_INDEXES = [
+    'CREATE INDEX IF NOT EXISTS idx_transactions_date '
+    'ON transactions (date)',
+    'CREATE INDEX IF NOT EXISTS idx_transactions_category_date '
+    'ON transactions (category_id, date)',
+    'CREATE INDEX IF NOT EXISTS idx_transactions_type_date '
+    'ON transactions (type, date)',
+]
+
+
+def _add_transaction_indexes(cursor):
+    """为交易表添加索引"""
+    for statement in TRANSACTION_INDEXES:
+        cursor.execute(statement)
+
+
+def _create_settings_table(cursor):
+    """创建设置表，记录交易表存储格式"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS settings (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+    ''')
+    cursor.execute(
+        "INSERT OR IGNORE INTO settings (key, value) "
+        "VALUES ('storage_format', 'text')"
+    )
+
+
+# 备注全文索引的同步触发器，交易表重建后需要重新创建
+FTS_TRIGGERS = [
+    '''CREATE TRIGGER IF NOT EXISTS transactions_fts_insert
+       AFTER INSERT ON transactions BEGIN
+           INSERT INTO transactions_fts (rowid, note) VALUES (new.id, new.note);
+       END''',
+    '''CREATE TRIGGER IF NOT EXISTS transactions_fts_delete
+       AFTER DELETE ON transactions BEGIN
+           INSERT INTO transactions_fts (transactions_fts, rowid, note)
+           VALUES ('delete', old.id, old.note);
+       END''',
+    '''CREATE TRIGGER IF NOT EXISTS transactions_fts_update
+       AFTER UPDATE OF note ON transactions BEGIN
+           INSERT INTO transactions_fts (transactions_fts, rowid, note)
+           VALUES ('delete', old.id, old.note);
+           INSERT INTO transactions_fts (rowid, note) VALUES (new.id, new.note);
+       END''',
+]
+
+
+def fts5_available():
+    """当前SQLite是否支持FTS5及trigram分词器"""
+    conn = sqlite3.connect(':memory:')
+    try:
+        conn.execute(
+            "CREATE VIRTUAL TABLE probe USING fts5(x, tokenize='trigram')"
+        )
+        return True
+    except sqlite3.OperationalError:
+        return False
+    finally:
+        conn.close()
+
+
+def create_note_fts(cursor):
+    """
+    创建备注全文索引（FTS5外部内容表，trigram分词，无需分词即可检索中文）
+
+    SQLite不支持FTS5或trigram时跳过，关键词查询继续使用逐行匹配
+    """
+    if not fts5_available():
+        return
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS transactions_fts USING fts5(
+            note,
+            content='transactions',
+            content_rowid='id',
+            tokenize='trigram'
+        )
+    ''')
+    for statement in FTS_TRIGGERS:
+        cursor.execute(statement)
+    cursor.execute(
+        "INSERT INTO transactions_fts (transactions_fts) VALUES ('rebuild')"
+    )
+
+
+def change_triggers(table):
+    """
+    维护表修改计数的触发器
+
+    每次增删改使settings中的'<表名>_changes'加一，计数随数据一起提交或回滚，
+    可跨进程判断内存模型快照是否过期。表重建后需要重新创建。
+    """
+    return [
+        f'''CREATE TRIGGER IF NOT EXISTS {table}_changes_{event.lower()}
+           AFTER {event} ON {table} BEGIN
+               UPDATE settings SET value = value + 1
+               WHERE key = '{table}_changes';
+           END'''
+        for event in ('INSERT', 'UPDATE', 'DELETE')
+    ]
+
+
+def _add_change_counters(cursor):
+    """为交易表和分类表添加修改计数"""
+    for table in ('transactions', 'categories'):
+        cursor.execute(
+            "INSERT OR IGNORE INTO settings (key, value) VALUES (?, '0')",
+            (f'{table}_changes',)
+        )
+        for statement in change_triggers(table):
+            cursor.execute(statement)
+
+
+# 月度汇总表的年、月表达式，同时适用于文本格式和紧凑格式：
+# 文本格式的日期为'YYYY-MM-DD HH:MM:SS'，紧凑格式为整数秒时间戳。
+# 金额合计按交易表的存储单位保存：文本格式为REAL金额，不舍入到分；
+# 紧凑格式为整数分
+def _rollup_year(date):
+    """日期列对应的年份表达式"""
+    return (f"CAST(CASE typeof({date}) WHEN 'text' THEN substr({date}, 1, 4) "
+            f"ELSE strftime('%Y', {date}, 'unixepoch') END AS INTEGER)")
+
+
+def _rollup_month(date):
+    """日期列对应的月份表达式"""
+    return (f"CAST(CASE typeof({date}) WHEN 'text' THEN substr({date}, 6, 2) "
+            f"ELSE strftime('%m', {date}, 'unixepoch') END AS INTEGER)")
+
+
+# 按原始数据重新计算月度汇总，用于建表、重建和校验
+ROLLUP_SELECT = f'''
+    SELECT {_rollup_year('date')} AS year, {_rollup_month('date')} AS month,
+           type, category_id, SUM(amount) AS total,
+           COUNT(*) AS count
+    FROM transactions
+    GROUP BY 1, 2, 3, 4
+'''
+
+
+def _rollup_add(row, sign):
+    """将一条交易计入（sign为+）或移出（sign为-）月度汇总的语句"""
+    key = (f"year = {_rollup_year(f'{row}.date')} "
+           f"AND month = {_rollup_month(f'{row}.date')} "
+           f"AND type = {row}.type AND category_id IS {row}.category_id")
+    statements = []
+    if sign == '+':
+        # 分类ID可能为NULL，唯一索引不约束NULL，因此不用UPSERT
+        statements.append(
+            f"INSERT INTO monthly_rollup "
+            f"(year, month, type, category_id, total, count) "
+            f"SELECT {_rollup_year(f'{row}.date')}, "
+            f"{_rollup_month(f'{row}.date')}, {row}.type, {row}.category_id, "
+            f"0, 0 WHERE NOT EXISTS (SELECT 1 FROM monthly_rollup WHERE {key});"
+        )
+    statements.append(
+        f"UPDATE monthly_rollup SET "
+        f"total = total {sign} {row}.amount, "
+        f"count = count {sign} 1 WHERE {key};"
+    )
+    if sign == '-':
+        statements.append(
+            f"DELETE FROM monthly_rollup WHERE {key} AND count = 0;"
+        )
+    return '\n'.join(statements)
+
+
+# 月度汇总的同步触发器，交易表重建后需要重新创建
+ROLLUP_TRIGGERS = [
+    f'''CREATE TRIGGER IF NOT EXISTS transactions_rollup_insert
+       AFTER INSERT ON transactions BEGIN
+           {_rollup_add('new', '+')}
+       END''',
+    f'''CREATE TRIGGER IF NOT EXISTS transactions_rollup_delete
+       AFTER DELETE ON transactions BEGIN
+           {_rollup_add('old', '-')}
+       END''',
+    f'''CREATE TRIGGER IF NOT EXISTS transactions_rollup_update
+       AFTER UPDATE OF amount, type, category_id, date ON transactions BEGIN
+           {_rollup_add('old', '-')}
+           {_rollup_add('new', '+')}
+       END''',
+]
+
+# 校验汇总表时金额合计允许的误差（相对误差和绝对误差，取较大者）：
+# 文本格式的REAL合计随增删逐笔加减，舍入误差与合计的大小成正比；
+# 紧凑格式的整数分不受影响
+ROLLUP_REL_TOLERANCE = 1e-9
+ROLLUP_ABS_TOLERANCE = 1e-6
+
+
+def rebuild_rollup(cursor):
+    """按原始交易数据重新计算月度汇总表"""
+    cursor.execute('DELETE FROM monthly_rollup')
+    cursor.execute(
+        'INSERT INTO monthly_rollup (year, month, type, category_id, total, count) '
+        + ROLLUP_SELECT
+    )
+
+
+def create_monthly_rollup(cursor):
+    """
+    创建月度汇总表：每月、每种类型、每个分类一行，金额合计按交易表的存储单位保存
+
+    由触发器在交易增删改的同一事务中同步更新，月度、年度和全部统计
+    只需读取与分类数成正比的行
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS monthly_rollup (
+            year INTEGER NOT NULL,
+            month INTEGER NOT NULL,
+            type TEXT NOT NULL,
+            category_id INTEGER,
+            total NUMERIC NOT NULL,
+            count INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute(
+        'CREATE UNIQUE INDEX IF NOT EXISTS idx_monthly_rollup_key '
+        'ON monthly_rollup (year, month, type, category_id)'
+    )
+    for statement in ROLLUP_TRIGGERS:
+        cursor.execute(statement)
+    rebuild_rollup(cursor)
+
+
+# 迁移步骤列表：(版本号, 说明, 迁移函数)，版本号必须递增
+MIGRATIONS = [
+    (1, '创建交易表和分类表', _create_base_tables),
+    (2, '为交易表添加日期、分类、类型索引', _add_transaction_indexes),
+    (3, '添加设置表，记录存储格式', _create_settings_table),
+    (4, '添加备注全文索引', create_note_fts),
+    (5, '添加修改计数，用于校验内存快照', _add_change_counters),
+    (6, '添加月度汇总表', create_monthly_rollup),
+]
+
+
+def get_schema_version(conn):
+    """
+    获取数据库当前结构版本
+
+    Args:
+        conn: sqlite3连接
+
+    Returns:
+        当前版本号，未迁移过的数据库返回0
+    """
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at TEXT
+        )
+    ''')
+    cursor.execute('SELECT MAX(version) FROM schema_version')
+    version = cursor.fetchone()[0]
+    return version or 0
+
+
+def migrate(conn, migrations=None):
+    """
+    执行所有未应用的迁移步骤
+
+    每个步骤在独立事务中执行，失败时回滚该步骤，
+    已有数据不受影响。
+
+    Args:
+        conn: sqlite3连接
+        migrations: 迁移步骤列表（可选，默认使用MIGRATIONS）
+
+    Returns:
+        本次应用的版本号列表
+    """
+    if migrations is None:
+        migrations = MIGRATIONS
+
+    current = get_schema_version(conn)
+    conn.commit()
+    applied = []
+
+    for version, description, step in migrations:
+        if version <= current:
+            continue
+        cursor = conn.cursor()
+        try:
+            cursor.execute('BEGIN')
+            step(cursor)
+            cursor.execute(
+                'INSERT INTO schema_version (version, description, applied_at) '
+                'VALUES (?, ?, ?)',
+                (version, description,
+                 datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(version)
+
+    return applied
@@ -0,0 +1,136 @@
+"""查询构造器 - 将交易查询条件转换为参数化SQL"""
+import unicodedata
+
+from database.storage import CODECS
+
+# 全文索引子查询，trigram分词下关键词至少3个字符才能使用
+FTS_CLAUSE = ('id IN (SELECT rowid FROM transactions_fts '
+              'WHERE transactions_fts MATCH ?)')
+FTS_MIN_LENGTH = 3
+
+
+def fts_phrase(text):
+    """将文本转换为FTS5短语，按子串匹配"""
+    return '"' + text.replace('"', '""') + '"'
+
+
+def _fts_safe_char(char):
+    """字符是ASCII字符，或没有大小写之分且不是组合附加符号（如汉字、数字）"""
+    return char.isascii() or (
+        char.lower() == char == char.upper() == char.casefold()
+        and not unicodedata.combining(char))
+
+
+def fts_narrows(keyword):
+    """
+    关键词能否先用全文索引缩小候选范围
+
+    trigram分词器的大小写折叠与Python的str.lower()不完全一致：
+    'İ'.lower()是'i'加组合附加符号两个字符，较新的Unicode大小写字母对
+    SQLite不折叠。关键词只由ASCII字符和没有大小写之分的字符组成时，
+    全文索引的匹配结果一定包含逐条大小写不敏感匹配的结果，否则只逐条匹配
+    """
+    return len(keyword) >= FTS_MIN_LENGTH and all(
+        _fts_safe_char(char) for char in keyword)
+
+
+def seek_clause(after_key, codec=None, descending=False):
+    """
+    键集分页条件：取排序键(date, id)在after_key之后的行
+
+    配合ORDER BY date, id（降序时为date DESC, id DESC）使用，
+    由日期索引直接定位到上一页末尾，与已翻过的页数无关
+
+    Args:
+        after_key: 上一页最后一行的(日期, id)
+        codec: 交易表存储格式的编解码器（可选，默认文本格式）
+        descending: 是否按降序翻页
+
+    Returns:
+        (clause, params)
+    """
+    if codec is None:
+        codec = CODECS['text']
+    date, trans_id = after_key
+    op = '<' if descending else '>'
+    return f'(date, id) {op} (?, ?)', [codec.date_bound(date), trans_id]
+
+
+class TransactionQuery:
+    """交易查询条件，参数与TransactionManager.query()一致"""
+
+    def __init__(self, start_date=None, end_date=None, category_id=None,
+                 min_amount=None, max_amount=None, keyword=None,
+                 trans_type=None, note_match=None):
+        """
+        初始化查询条件
+
+        Args:
+            start_date: 开始日期
+            end_date: 结束日期
+            category_id: 分类ID
+            min_amount: 最小金额
+            max_amount: 最大金额
+            keyword: 关键词
+            trans_type: 交易类型
+            note_match: 备注全文检索表达式（FTS5语法）
+        """
+        self.start_date = start_date
+        self.end_date = end_date
+        self.category_id = category_id
+        self.min_amount = min_amount
+        self.max_amount = max_amount
+        self.keyword = keyword
+        self.trans_type = trans_type
+        self.note_match = note_match
+
+    def build(self, codec=None, fts=False):
+        """
+        生成WHERE子句和参数
+
+        Args:
+            codec: 交易表存储格式的编解码器（可选，默认文本格式）
+            fts: 数据库是否有备注全文索引
+
+        Returns:
+            (where, params)，没有条件时where为空字符串
+        """
+        if codec is None:
+            codec = CODECS['text']
+        clauses = []
+        params = []
+
+        if self.start_date:
+            clauses.append('date >= ?')
+            params.append(codec.date_bound(self.start_date))
+        if self.end_date:
+            clauses.append('date <= ?')
+            params.append(codec.date_bound(self.end_date))
+        if self.category_id:
+            clauses.append('category_id = ?')
+            params.append(self.category_id)
+        if self.min_amount is not None:
+            clauses.append('amount >= ?')
+            params.append(codec.amount_lower_bound(self.min_amount))
+        if self.max_amount is not None:
+            clauses.append('amount <= ?')
+            params.append(codec.amount_upper_bound(self.max_amount))
+        if self.keyword:
+            keyword = self.keyword.lower()
+            if fts and fts_narrows(keyword):
+                # 先用全文索引缩小候选范围，再逐条精确匹配
+                clauses.append(FTS_CLAUSE)
+                params.append(fts_phrase(keyword))
+            # py_lower与Python的str.lower()一致，保持大小写不敏感的语义
+            clauses.append('instr(py_lower(note), ?) > 0')
+            params.append(keyword)
+        if self.note_match:
+            if not fts:
+                raise ValueError("当前数据库不支持全文检索")
+            clauses.append(FTS_CLAUSE)
+            params.append(self.note_match)
+        if self.trans_type:
+            clauses.append('type = ?')
+            params.append(self.trans_type.value)
+
+        return ' AND '.join(clauses), params
@@ -0,0 +1,251 @@
+"""交易表存储格式 - 文本格式与紧凑整数格式的编解码和相互转换"""
+import math
+from datetime import datetime
+
+from database.migrations import (TRANSACTION_INDEXES, FTS_TRIGGERS,
+                                 ROLLUP_TRIGGERS, change_triggers,
+                                 rebuild_rollup)
+from models.transaction import (to_cents, from_cents, to_timestamp,
+                                from_timestamp)
+
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+class TextCodec:
+    """文本格式：金额为REAL，日期为'%Y-%m-%d %H:%M:%S'文本"""
+
+    name = 'text'
+    amount_type = 'REAL'
+    date_type = 'TEXT'
+
+    def encode_amount(self, amount):
+        """金额转换为存储值"""
+        return amount
+
+    def decode_amount(self, value):
+        """存储值转换为金额"""
+        return value
+
+    def sum_amounts(self, values):
+        """多个金额存储值（如各组的合计）之和转换为金额，精确求和后舍入一次"""
+        return math.fsum(values)
+
+    def encode_date(self, date):
+        """日期（datetime或文本）转换为存储值"""
+        if isinstance(date, str):
+            return date
+        return date.strftime(DATE_FORMAT)
+
+    def decode_date(self, value):
+        """
+        存储值转换为日期
+
+        符合DATE_FORMAT的定长文本用datetime.fromisoformat()解析，
+        比strptime快一个数量级；其他文本仍按DATE_FORMAT严格解析
+        """
+        if len(value) == 19 and value[10] == ' ':
+            return datetime.fromisoformat(value)
+        return datetime.strptime(value, DATE_FORMAT)
+
+    def amount_lower_bound(self, amount):
+        """查询条件amount >= ?的参数"""
+        return amount
+
+    def amount_upper_bound(self, amount):
+        """查询条件amount <= ?的参数"""
+        return amount
+
+    def date_bound(self, date):
+        """
+        查询条件中与日期列比较的参数
+
+        秒以下部分非零时保留微秒，保证与内存中datetime比较的结果一致
+        """
+        return date.isoformat(sep=' ')
+
+
+class CompactCodec:
+    """紧凑格式：金额为整数分，日期为整数秒时间戳"""
+
+    name = 'compact'
+    amount_type = 'INTEGER'
+    date_type = 'INTEGER'
+
+    def encode_amount(self, amount):
+        """金额转换为存储值"""
+        return to_cents(amount)
+
+    def decode_amount(self, value):
+        """存储值转换为金额"""
+        return from_cents(value)
+
+    def sum_amounts(self, values):
+        """多个金额存储值之和转换为金额，按整数分累加"""
+        return from_cents(sum(values))
+
+    def encode_date(self, date):
+        """日期（datetime或文本）转换为存储值"""
+        if isinstance(date, str):
+            date = datetime.strptime(date, DATE_FORMAT)
+        return to_timestamp(date)
+
+    def decode_date(self, value):
+        """存储值转换为日期"""
+        return from_timestamp(value)
+
+    def amount_lower_bound(self, amount):
+        """
+        查询条件amount >= ?的参数：满足 分/100 >= amount 的最小整数分
+
+        按解码后的金额比较，结果与内存中的比较一致
+        """
+        if not math.isfinite(amount):
+            return amount
+        cents = math.ceil(amount * 100)
+        while from_cents(cents - 1) >= amount:
+            cents -= 1
+        while from_cents(cents) < amount:
+            cents += 1
+        return cents
+
+    def amount_upper_bound(self, amount):
+        """查询条件amount <= ?的参数：满足 分/100 <= amount 的最大整数分"""
+        if not math.isfinite(amount):
+            return amount
+        cents = math.floor(amount * 100)
+        while from_cents(cents + 1) <= amount:
+            cents += 1
+        while from_cents(cents) > amount:
+            cents -= 1
+        return cents
+
+    def date_bound(self, date):
+        """查询条件中与日期列比较的参数，保留秒以下部分"""
+        return to_timestamp(date) + date.microsecond / 1000000
+
+
+CODECS = {
+    TextCodec.name: TextCodec(),
+    CompactCodec.name: CompactCodec(),
+}
+
+
+def get_storage_format(conn):
+    """读取数据库当前的交易表存储格式"""
+    row = conn.execute(
+        "SELECT value FROM settings WHERE key = 'storage_format'"
+    ).fetchone()
+    return row[0] if row else TextCodec.name
+
+
+def has_table(conn, name):
+    """数据库中是否存在指定的表（包括虚拟表）"""
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+        (name,)
+    ).fetchone()
+    return row is not None
+
+
+def convert_storage(conn, target):
+    """
+    将交易表转换为目标存储格式
+
+    在一个事务中重建交易表：逐行解码后按新格式写入新表，
+    再替换原表并重建索引，记录ID和自增序列保持不变。
+
+    Args:
+        conn: sqlite3连接
+        target: 目标格式名称（'text'或'compact'）
+
+    Returns:
+        转换的记录数
+    """
+    if target not in CODECS:
+        raise ValueError(f"未知的存储格式: {target}")
+
+    source = CODECS[get_storage_format(conn)]
+    codec = CODECS[target]
+    if source is codec:
+        return 0
+
+    cursor = conn.cursor()
+    try:
+        cursor.execute('BEGIN')
+        row = cursor.execute(
+            "SELECT seq FROM sqlite_sequence WHERE name = 'transactions'"
+        ).fetchone()
+        sequence = row[0] if row else None
+
+        cursor.execute(f'''
+            CREATE TABLE transactions_new (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                amount {codec.amount_type} NOT NULL,
+                type TEXT NOT NULL,
+                category_id INTEGER,
+                date {codec.date_type} NOT NULL,
+                note TEXT
+            )
+        ''')
+
+        reader = conn.cursor()
+        reader.execute(
+            'SELECT id, amount, type, category_id, date, note FROM transactions'
+        )
+        count = 0
+        while True:
+            rows = reader.fetchmany(1000)
+            if not rows:
+                break
+            cursor.executemany(
+                'INSERT INTO transactions_new '
+                '(id, amount, type, category_id, date, note) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                [(trans_id,
+                  codec.encode_amount(source.decode_amount(amount)),
+                  trans_type, category_id,
+                  codec.encode_date(source.decode_date(date)),
+                  note)
+                 for trans_id, amount, trans_type, category_id, date, note
+                 in rows]
+            )
+            count += len(rows)
+
+        cursor.execute('DROP TABLE transactions')
+        cursor.execute('ALTER TABLE transactions_new RENAME TO transactions')
+        for statement in TRANSACTION_INDEXES:
+            cursor.execute(statement)
+        # 删除原表时其上的触发器一并删除，全文索引的同步触发器需要重建
+        if has_table(conn, 'transactions_fts'):
+            for statement in FTS_TRIGGERS:
+                cursor.execute(statement)
+        # 修改计数的触发器同样需要重建；转换可能改变金额和日期的精度，计数加一
+        for statement in change_triggers('transactions'):
+            cursor.execute(statement)
+        # 月度汇总同理：重建触发器，并按转换后的数据重新计算
+        if has_table(conn, 'monthly_rollup'):
+            for statement in ROLLUP_TRIGGERS:
+                cursor.execute(statement)
+            rebuild_rollup(cursor)
+        cursor.execute(
+            "UPDATE settings SET value = value + 1 "
+            "WHERE key = 'transactions_changes'"
+        )
+        # 保留原自增序列，已删除记录的ID不会被重新分配
+        max_id = cursor.execute('SELECT MAX(id) FROM transactions').fetchone()[0]
+        cursor.execute("DELETE FROM sqlite_sequence WHERE name = 'transactions'")
+        cursor.execute(
+            "INSERT INTO sqlite_sequence (name, seq) VALUES ('transactions', ?)",
+            (max(sequence or 0, max_id or 0),)
+        )
+        cursor.execute(
+            "INSERT OR REPLACE INTO settings (key, value) "
+            "VALUES ('storage_format', ?)",
+            (target,)
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    return count
@@ -25,8 +25,14 @@ def main():
     print("✓ 数据库初始化完成")
     
     print("正在加载管理器...")
-    category_manager = CategoryManager(database)
-    transaction_manager = TransactionManager(database)
+    category_manager = CategoryManager(
+        database, snapshot_path='accounting.categories.snapshot'
+    )
+    # 启动时只加载今年和去年的交易，更早的数据在查询时按需加载
+    transaction_manager = TransactionManager(
+        database, window_years=2,
+        snapshot_path='accounting.transactions.snapshot'
+    )
     statistics_manager = StatisticsManager(transaction_manager)
     print("✓ 管理器加载完成")
     
@@ -43,6 +49,9 @@ def main():
     
     main_view.run()
     
+    # 保存内存模型快照，下次启动时跳过逐行解析
+    transaction_manager.save_snapshot()
+    category_manager.save_snapshot()
     database.close()
     print("\n程序已退出")
 
@@ -0,0 +1,73 @@
+"""数据库维护命令
+
+用法：
+    python src/maintenance.py [--db accounting.db] rebuild-fts
+    python src/maintenance.py [--db accounting.db] rebuild-rollup
+    python src/maintenance.py [--db accounting.db] verify-rollup
+"""
+import sys
+import os
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from database.database import Database
+
+
+def rebuild_fts(database, args):
+    """重建备注全文索引"""
+    if database.rebuild_fts():
+        print("✓ 备注全文索引已重建")
+        return 0
+    print("✗ 当前SQLite不支持FTS5 trigram分词器，无法建立全文索引")
+    return 1
+
+
+def rebuild_rollup(database, args):
+    """按原始交易数据重建月度汇总表"""
+    rows = database.rebuild_rollup()
+    print(f"✓ 月度汇总表已重建，共{rows}行")
+    return 0
+
+
+def verify_rollup(database, args):
+    """校验月度汇总表与原始交易数据是否一致"""
+    mismatches = database.verify_rollup()
+    if not mismatches:
+        print("✓ 月度汇总表与交易数据一致")
+        return 0
+    print(f"✗ 月度汇总表有{len(mismatches)}项与交易数据不一致：")
+    for year, month, type_value, category_id in mismatches:
+        category = category_id if category_id is not None else '未分类'
+        print(f"  {year}-{month:02d}  {type_value}  分类 {category}")
+    print("可运行 rebuild-rollup 重建")
+    return 1
+
+
+COMMANDS = {
+    'rebuild-fts': (rebuild_fts, '重建备注全文索引'),
+    'rebuild-rollup': (rebuild_rollup, '重建月度汇总表'),
+    'verify-rollup': (verify_rollup, '校验月度汇总表与交易数据是否一致'),
+}
+
+
+def main(argv=None):
+    """解析命令行并执行维护命令"""
+    parser = argparse.ArgumentParser(description='记账本数据库维护')
+    parser.add_argument('--db', default='accounting.db', help='数据库文件路径')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    for name, (_, help_text) in COMMANDS.items():
+        subparsers.add_parser(name, help=help_text)
+
+    args = parser.parse_args(argv)
+    database = Database(args.db)
+    try:
+        command, _ = COMMANDS[args.command]
+        return command(database, args)
+    finally:
+        database.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,20 +1,45 @@
 """分类管理器 - 对应UML类图中的CategoryManager类"""
 from models.category import Category
 from models.transaction import TransactionType
+from managers.snapshot import load_snapshot, save_snapshot
 
 class CategoryManager:
     """分类管理器 - 对应UML组件图中的分类管理组件"""
     
-    def __init__(self, database):
-        """初始化管理器"""
+    def __init__(self, database, snapshot_path=None):
+        """
+        初始化管理器
+        
+        Args:
+            database: Database实例
+            snapshot_path: 分类快照文件路径（可选），快照未过期时直接从快照加载
+        """
         self.database = database
+        self.snapshot_path = snapshot_path
         self.categories = []
         self.load_categories()
     
     def load_categories(self):
-        """从数据库加载分类"""
-        data = self.database.load('categories')
+        """从数据库加载分类，配置了快照且快照未过期时直接从快照加载"""
         self.categories = []
+        self._data_version = self.database.data_version()
+        stamp = self._snapshot_stamp()
+        if stamp is not None:
+            rows = load_snapshot(self.snapshot_path, stamp)
+            if rows is not None:
+                for cat_id, name, icon, type_value, is_predefined in rows:
+                    trans_type = (TransactionType.INCOME if type_value == '收入'
+                                 else TransactionType.EXPENSE)
+                    self.categories.append(Category(
+                        category_id=cat_id,
+                        name=name,
+                        icon=icon,
+                        trans_type=trans_type,
+                        is_predefined=is_predefined
+                    ))
+                return
+        
+        data = self.database.load('categories')
         for item in data:
             trans_type = (TransactionType.INCOME if item['type'] == '收入' 
                          else TransactionType.EXPENSE)
@@ -27,6 +52,30 @@ class CategoryManager:
             )
             self.categories.append(cat)
     
+    def _snapshot_stamp(self):
+        """快照对应的数据库修改标记，不使用快照时返回None"""
+        if (not self.snapshot_path or self.database.is_memory
+                or self.database.in_transaction()):
+            return None
+        return self.database.change_stamp('categories')
+    
+    def save_snapshot(self):
+        """
+        将分类保存为快照，下次启动时可直接加载
+        
+        数据库被其他连接修改过时内存数据可能不是最新的，不保存
+        
+        Returns:
+            是否保存
+        """
+        stamp = self._snapshot_stamp()
+        if stamp is None or self.database.data_version() != self._data_version:
+            return False
+        rows = [(c.id, c.name, c.icon, c.type.value if c.type else None,
+                 c.is_predefined)
+                for c in self.categories]
+        return save_snapshot(self.snapshot_path, stamp, rows)
+    
     def add_category(self, category):
         """
         添加分类 - 对应UML中的addCategory()方法
@@ -0,0 +1,400 @@
+"""列式交易存储 - 以并行数组保存交易字段，查询和汇总使用向量化运算"""
+import copy
+import math
+from array import array
+from bisect import bisect_left, bisect_right
+
+from models.transaction import TransactionType, to_timestamp
+
+try:
+    import numpy as np
+except ImportError:  # 未安装NumPy时使用纯Python实现
+    np = None
+
+
+def _micros(date):
+    """日期转换为整数微秒时间戳，保留秒以下部分"""
+    return to_timestamp(date) * 1000000 + date.microsecond
+
+
+# 精确分组求和时尾数拆成的段数和每段的位数：每段小于2**18，
+# 不超过2**35行时各段的部分和都小于2**53，float64累加没有舍入误差
+_LIMB_BITS = 18
+_LIMB_MASK = (1 << _LIMB_BITS) - 1
+
+
+def _exact_group_sums(values, groups, size):
+    """
+    按分组精确求浮点数之和
+
+    每个浮点数拆成53位整数尾数和二进制指数，尾数再拆成三段18位整数，
+    按(分组, 指数)用np.bincount累加各段。各段的部分和都是小于2**53的整数，
+    float64累加没有误差，之后只需按分组和不同指数的个数循环合并。
+
+    Args:
+        values: 有限浮点数数组
+        groups: 各元素所属的分组编号（0 ~ size-1）
+        size: 分组数
+
+    Returns:
+        ([每组的整数分子], 公共指数)，每组的精确和为 分子 * 2**指数
+    """
+    if not len(values):
+        return [0] * size, 0
+    mantissas, exponents = np.frexp(values)
+    mantissas = (mantissas * float(1 << 53)).astype(np.int64)
+    # 出现过的指数依次编号（指数范围有限，用bincount代替排序去重）
+    base = int(exponents.min())
+    offsets = exponents.astype(np.int64) - base
+    present = np.flatnonzero(np.bincount(offsets))
+    width = len(present)
+    exponent_codes = np.zeros(int(present[-1]) + 1, dtype=np.int64)
+    exponent_codes[present] = np.arange(width)
+    keys = groups * width + exponent_codes[offsets]
+    limbs = [
+        np.bincount(keys, weights=limb.astype(np.float64),
+                    minlength=size * width).astype(np.int64).tolist()
+        for limb in (mantissas & _LIMB_MASK,
+                     (mantissas >> _LIMB_BITS) & _LIMB_MASK,
+                     mantissas >> (2 * _LIMB_BITS))
+    ]
+    # 以最小指数为公共指数，各指数的分子左移对齐后相加
+    shifts = present.tolist()
+    numerators = []
+    for group in range(size):
+        numerator = 0
+        for offset, shift in enumerate(shifts):
+            key = group * width + offset
+            numerator += ((limbs[2][key] << (2 * _LIMB_BITS))
+                          + (limbs[1][key] << _LIMB_BITS)
+                          + limbs[0][key]) << shift
+        numerators.append(numerator)
+    return numerators, base - 53
+
+
+def _to_float(numerator, exponent):
+    """分子 * 2**指数 舍入到最近的浮点数（整数运算，只舍入一次）"""
+    if exponent >= 0:
+        return float(numerator << exponent)
+    return numerator / (1 << -exponent)
+
+
+class ColumnarStore:
+    """
+    列式交易存储
+
+    金额、类型、分类、日期（微秒时间戳）和ID分别保存在并行数组中，
+    备注按字典编码保存在单独的字符串表中。行按(日期, id)排序，
+    日期范围通过二分查找定位。安装了NumPy时使用NumPy数组和布尔掩码，
+    否则使用array模块和纯Python循环，两种实现结果相同。
+
+    增删单行时由insert()/delete()得到新的存储，只复制各列数组（C层面的
+    整块内存复制），不逐行重建；原存储保持不变，已返回的查询结果仍然有效。
+    """
+
+    # 与行一一对应的列
+    COLUMNS = ('ids', 'amounts', 'incomes', 'category_codes', 'dates',
+               'note_codes')
+
+    def __init__(self, transactions, use_numpy=None):
+        """
+        构建列式存储
+
+        Args:
+            transactions: 按(日期, id)排序的交易记录
+            use_numpy: 是否使用NumPy（可选，默认在已安装时使用）
+        """
+        if use_numpy is None:
+            use_numpy = np is not None
+        self.use_numpy = use_numpy and np is not None
+
+        # 分类ID和备注的字典编码表
+        self.categories = []
+        self.notes = []
+        category_codes = {}
+        note_codes = {}
+
+        ids, amounts, incomes, cats, dates, notes = [], [], [], [], [], []
+        for trans in transactions:
+            ids.append(trans.id)
+            amounts.append(trans.amount)
+            incomes.append(1 if trans.type == TransactionType.INCOME else 0)
+            code = category_codes.get(trans.category_id)
+            if code is None:
+                code = category_codes[trans.category_id] = len(self.categories)
+                self.categories.append(trans.category_id)
+            cats.append(code)
+            dates.append(_micros(trans.date))
+            code = note_codes.get(trans.note)
+            if code is None:
+                code = note_codes[trans.note] = len(self.notes)
+                self.notes.append(trans.note)
+            notes.append(code)
+
+        self._category_codes = category_codes
+        self._note_index = note_codes
+        self._lower_notes = [note.lower() for note in self.notes]
+
+        if self.use_numpy:
+            self.ids = np.array(ids, dtype=np.int64)
+            self.amounts = np.array(amounts, dtype=np.float64)
+            self.incomes = np.array(incomes, dtype=np.bool_)
+            self.category_codes = np.array(cats, dtype=np.int64)
+            self.dates = np.array(dates, dtype=np.int64)
+            self.note_codes = np.array(notes, dtype=np.int64)
+        else:
+            self.ids = array('q', ids)
+            self.amounts = array('d', amounts)
+            self.incomes = array('b', incomes)
+            self.category_codes = array('q', cats)
+            self.dates = array('q', dates)
+            self.note_codes = array('q', notes)
+
+    def __len__(self):
+        """行数"""
+        return len(self.ids)
+
+    def insert(self, pos, trans):
+        """
+        在第pos行之前插入一笔交易
+
+        Returns:
+            新的ColumnarStore，与原存储共享只增不减的字典编码表
+        """
+        values = (trans.id, trans.amount,
+                  1 if trans.type == TransactionType.INCOME else 0,
+                  self._category_code(trans.category_id), _micros(trans.date),
+                  self._note_code(trans.note))
+        store = copy.copy(self)
+        for name, value in zip(self.COLUMNS, values):
+            column = getattr(self, name)
+            if self.use_numpy:
+                column = np.insert(column, pos, value)
+            else:
+                column = array(column.typecode, column)
+                column.insert(pos, value)
+            setattr(store, name, column)
+        return store
+
+    def delete(self, pos):
+        """
+        删除第pos行
+
+        Returns:
+            新的ColumnarStore
+        """
+        store = copy.copy(self)
+        for name in self.COLUMNS:
+            column = getattr(self, name)
+            if self.use_numpy:
+                column = np.delete(column, pos)
+            else:
+                column = array(column.typecode, column)
+                del column[pos]
+            setattr(store, name, column)
+        return store
+
+    def _category_code(self, category_id):
+        """分类ID的字典编码，新分类追加到编码表"""
+        code = self._category_codes.get(category_id)
+        if code is None:
+            code = self._category_codes[category_id] = len(self.categories)
+            self.categories.append(category_id)
+        return code
+
+    def _note_code(self, note):
+        """备注的字典编码，新备注追加到编码表"""
+        code = self._note_index.get(note)
+        if code is None:
+            code = self._note_index[note] = len(self.notes)
+            self.notes.append(note)
+            self._lower_notes.append(note.lower())
+        return code
+
+    def select(self, start_date=None, end_date=None, category_id=None,
+               min_amount=None, max_amount=None, keyword=None,
+               trans_type=None, ids=None):
+        """
+        按条件筛选行，参数与TransactionManager.query()一致
+
+        Args:
+            ids: 限定的交易ID集合（可选），如全文检索的匹配结果
+
+        Returns:
+            符合条件的行下标（按日期排序）
+        """
+        lo, hi = self._date_range(start_date, end_date)
+
+        category_code = None
+        if category_id:
+            category_code = self._category_codes.get(category_id)
+            if category_code is None:
+                lo = hi
+        note_codes = None
+        if keyword:
+            keyword = keyword.lower()
+            note_codes = [code for code, note in enumerate(self._lower_notes)
+                          if keyword in note]
+        income = None
+        if trans_type:
+            income = trans_type == TransactionType.INCOME
+
+        if self.use_numpy:
+            return self._select_numpy(lo, hi, category_code, min_amount,
+                                      max_amount, note_codes, income, ids)
+        return self._select_python(lo, hi, category_code, min_amount,
+                                   max_amount, note_codes, income, ids)
+
+    def _date_range(self, start_date, end_date):
+        """日期条件对应的行下标区间"""
+        if self.use_numpy:
+            lo = (int(np.searchsorted(self.dates, _micros(start_date), 'left'))
+                  if start_date else 0)
+            hi = (int(np.searchsorted(self.dates, _micros(end_date), 'right'))
+                  if end_date else len(self.dates))
+        else:
+            lo = bisect_left(self.dates, _micros(start_date)) if start_date else 0
+            hi = (bisect_right(self.dates, _micros(end_date))
+                  if end_date else len(self.dates))
+        return lo, max(lo, hi)
+
+    def _select_numpy(self, lo, hi, category_code, min_amount, max_amount,
+                      note_codes, income, ids):
+        """NumPy实现：在日期区间内组合布尔掩码"""
+        mask = np.ones(hi - lo, dtype=np.bool_)
+        if category_code is not None:
+            mask &= self.category_codes[lo:hi] == category_code
+        if min_amount is not None:
+            mask &= self.amounts[lo:hi] >= min_amount
+        if max_amount is not None:
+            mask &= self.amounts[lo:hi] <= max_amount
+        if note_codes is not None:
+            mask &= np.isin(self.note_codes[lo:hi], note_codes)
+        if income is not None:
+            mask &= self.incomes[lo:hi] == income
+        if ids is not None:
+            mask &= np.isin(self.ids[lo:hi], list(ids))
+        return np.flatnonzero(mask) + lo
+
+    def _select_python(self, lo, hi, category_code, min_amount, max_amount,
+                       note_codes, income, ids):
+        """纯Python实现：逐行检查日期区间内的条件"""
+        if note_codes is not None:
+            note_codes = set(note_codes)
+        positions = []
+        for pos in range(lo, hi):
+            if (category_code is not None and
+                    self.category_codes[pos] != category_code):
+                continue
+            if min_amount is not None and not self.amounts[pos] >= min_amount:
+                continue
+            if max_amount is not None and not self.amounts[pos] <= max_amount:
+                continue
+            if note_codes is not None and self.note_codes[pos] not in note_codes:
+                continue
+            if income is not None and bool(self.incomes[pos]) != income:
+                continue
+            if ids is not None and self.ids[pos] not in ids:
+                continue
+            positions.append(pos)
+        return positions
+
+    def ids_at(self, positions):
+        """行下标对应的交易ID列表"""
+        if self.use_numpy:
+            return self.ids[positions].tolist()
+        return [self.ids[pos] for pos in positions]
+
+    def aggregate(self, positions):
+        """
+        汇总指定行的收支
+
+        合计值与Statistics.calculate()相同，都是精确和舍入到最近的浮点数，
+        因此与逐条累加的结果完全一致，和求和顺序无关。
+
+        Returns:
+            (总收入, 总支出,
+             {分类ID: (合计, 笔数, 收入, 支出, 最小金额, 最大金额)})
+        """
+        if self.use_numpy:
+            return self._aggregate_numpy(np.asarray(positions, dtype=np.int64))
+        return self._aggregate_python(positions)
+
+    def _aggregate_numpy(self, positions):
+        """
+        NumPy实现：分类编码和类型组成分组，按分组向量化精确求和
+
+        逐元素的运算都在NumPy中完成，Python只按分类合并各组的整数分子并舍入一次
+        """
+        amounts = self.amounts[positions]
+        if not np.isfinite(amounts).all():
+            # 含无穷大或NaN时按IEEE规则求和，与Statistics一致
+            return self._aggregate_python(positions.tolist())
+        incomes = self.incomes[positions]
+        codes = self.category_codes[positions]
+        size = len(self.categories)
+
+        # 分组：分类编码*2 + 是否支出
+        numerators, exponent = _exact_group_sums(
+            amounts, codes * 2 + ~incomes, 2 * size)
+        counts = np.bincount(codes, minlength=size)
+        present = np.flatnonzero(counts)
+        minimums = np.full(size, np.inf)
+        np.minimum.at(minimums, codes, amounts)
+        maximums = np.full(size, -np.inf)
+        np.maximum.at(maximums, codes, amounts)
+
+        total_income = total_expense = 0
+        categories = {}
+        for code, count, minimum, maximum in zip(
+                present.tolist(), counts[present].tolist(),
+                minimums[present].tolist(), maximums[present].tolist()):
+            income = numerators[2 * code]
+            expense = numerators[2 * code + 1]
+            total_income += income
+            total_expense += expense
+            categories[self.categories[code]] = (
+                _to_float(income + expense, exponent), count,
+                _to_float(income, exponent), _to_float(expense, exponent),
+                minimum, maximum)
+        return (_to_float(total_income, exponent),
+                _to_float(total_expense, exponent), categories)
+
+    def _aggregate_python(self, positions):
+        """纯Python实现：逐行按分类和类型分组后求和"""
+        income, expense = [], []
+        groups = {}
+        for pos in positions:
+            amount = self.amounts[pos]
+            is_income = self.incomes[pos]
+            (income if is_income else expense).append(amount)
+            group = groups.get(self.category_codes[pos])
+            if group is None:
+                group = groups[self.category_codes[pos]] = ([], [])
+            group[not is_income].append(amount)
+        categories = {}
+        for code, (group_income, group_expense) in groups.items():
+            group = group_income + group_expense
+            categories[self.categories[code]] = (
+                math.fsum(group), len(group),
+                math.fsum(group_income), math.fsum(group_expense),
+                min(group), max(group))
+        return math.fsum(income), math.fsum(expense), categories
+
+
+class ColumnarResult(list):
+    """
+    列式存储的查询结果
+
+    本身是交易记录列表，同时保留行下标，
+    Statistics.calculate()可以直接在列上完成汇总
+    """
+
+    def __init__(self, transactions, store, positions):
+        super().__init__(transactions)
+        self.store = store
+        self.positions = positions
+
+    def aggregate(self):
+        """在列上汇总，返回值同ColumnarStore.aggregate()"""
+        return self.store.aggregate(self.positions)
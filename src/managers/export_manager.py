@@ -18,19 +18,26 @@ class ExportManager:
         self.transaction_manager = transaction_manager
         self.category_manager = category_manager
     
-    def export_to_csv(self, filename, transactions=None):
+    def export_to_csv(self, filename, transactions=None, filters=None):
         """
         导出为CSV格式
         
         Args:
             filename: 文件名
-            transactions: 交易记录列表（可选，默认导出全部）
+            transactions: 交易记录列表或可迭代对象（可选）
+            filters: 查询条件字典，键与TransactionManager.query()的参数相同
+                     （可选，未指定transactions时使用，默认导出全部）
         
         Returns:
             是否成功
+        
+        未指定transactions时通过iter_query()按日期顺序逐条写出，
+        不在内存中构造交易列表
         """
         if transactions is None:
-            transactions = self.transaction_manager.get_transactions()
+            transactions = self.transaction_manager.iter_query(
+                **(filters or {})
+            )
         
         try:
             with open(filename, 'w', newline='', encoding='utf-8-sig') as csvfile:
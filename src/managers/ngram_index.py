@@ -0,0 +1,90 @@
+"""备注倒排索引 - 按字符二元组（bigram）缩小关键词查询的候选范围"""
+
+
+class NgramIndex:
+    """
+    字符二元组倒排索引
+
+    备注按str.lower()转换后拆成相邻两个字符的二元组，每个二元组对应包含它的
+    交易ID集合。关键词的所有二元组对应集合的交集即为候选集，候选仍需做子串
+    检查，因此结果与逐条匹配完全一致。中文备注没有分词边界也可以直接使用。
+
+    倒排表在第一次查找候选时才构建，此前add()只记录备注，
+    启动加载大量交易时不必为从不按关键词查询的会话付出建索引的开销。
+    """
+
+    def __init__(self):
+        """初始化空索引"""
+        # 二元组 -> 交易ID集合，None表示尚未构建
+        self._postings = None
+        # 已索引的备注，删除时按原内容移除
+        self._texts = {}
+
+    def __len__(self):
+        """已索引的交易数"""
+        return len(self._texts)
+
+    def add(self, trans_id, note):
+        """
+        索引一条交易的备注
+
+        Args:
+            trans_id: 交易ID
+            note: 备注
+        """
+        if trans_id in self._texts:
+            self.remove(trans_id)
+        note = note or ''
+        self._texts[trans_id] = note
+        if self._postings is not None:
+            for gram in self._grams(note.lower()):
+                self._postings.setdefault(gram, set()).add(trans_id)
+
+    def remove(self, trans_id):
+        """移除一条交易的备注索引"""
+        note = self._texts.pop(trans_id, None)
+        if note is None or self._postings is None:
+            return
+        for gram in self._grams(note.lower()):
+            ids = self._postings.get(gram)
+            if ids is not None:
+                ids.discard(trans_id)
+                if not ids:
+                    del self._postings[gram]
+
+    def candidates(self, keyword):
+        """
+        关键词的候选交易ID
+
+        Args:
+            keyword: 关键词（大小写不敏感）
+
+        Returns:
+            候选ID集合；关键词不足两个字符无法缩小范围时返回None
+        """
+        grams = self._grams(keyword.lower())
+        if not grams:
+            return None
+        if self._postings is None:
+            self._build()
+        postings = []
+        for gram in grams:
+            ids = self._postings.get(gram)
+            if not ids:
+                return set()
+            postings.append(ids)
+        postings.sort(key=len)
+        return set.intersection(*postings)
+
+    def _build(self):
+        """根据已记录的备注构建倒排表"""
+        postings = {}
+        for trans_id, note in self._texts.items():
+            for gram in self._grams(note.lower()):
+                postings.setdefault(gram, set()).add(trans_id)
+        self._postings = postings
+
+    @staticmethod
+    def _grams(text):
+        """文本中所有不重复的字符二元组"""
+        return {text[i:i + 2] for i in range(len(text) - 1)}
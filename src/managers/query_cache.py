@@ -0,0 +1,85 @@
+"""查询结果缓存 - 按查询条件缓存结果，数据变化时整体失效"""
+import threading
+from collections import OrderedDict
+
+
+class QueryCache:
+    """
+    LRU查询结果缓存
+
+    每次读写都带上调用方的数据版本号（generation），
+    版本号与缓存中的不一致时说明数据已变化，缓存整体清空。
+    各方法由锁保护，可以在多个线程中同时使用。
+    """
+
+    def __init__(self, maxsize=128):
+        """
+        初始化缓存
+
+        Args:
+            maxsize: 最多缓存的查询数，0表示不缓存
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._generation = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, generation):
+        """
+        查找缓存
+
+        Args:
+            key: 规范化后的查询条件
+            generation: 当前数据版本号
+
+        Returns:
+            缓存的结果，未命中时返回None
+        """
+        with self._lock:
+            self._check_generation(generation)
+            result = self._entries.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def put(self, key, generation, result):
+        """保存查询结果，超出容量时淘汰最久未使用的条目"""
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._check_generation(generation)
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+
+    def info(self):
+        """
+        缓存统计信息，用于监控
+
+        Returns:
+            {'hits', 'misses', 'size', 'maxsize'}字典
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+            }
+
+    def _check_generation(self, generation):
+        """数据版本号变化时清空缓存，调用方持有锁"""
+        if generation != self._generation:
+            self._entries.clear()
+            self._generation = generation
@@ -0,0 +1,55 @@
+"""内存模型快照 - 将加载好的数据保存到磁盘，下次启动时直接读取"""
+import os
+import pickle
+
+# 快照文件格式版本，内容结构变化时递增，旧快照自动作废
+SNAPSHOT_FORMAT = 1
+
+
+def load_snapshot(path, stamp):
+    """
+    读取快照
+
+    Args:
+        path: 快照文件路径
+        stamp: 数据库当前的修改标记（Database.change_stamp()）
+
+    Returns:
+        保存时的数据；文件不存在、损坏或修改标记不一致（已过期）时返回None
+    """
+    try:
+        with open(path, 'rb') as f:
+            snapshot = pickle.load(f)
+    except Exception:
+        return None
+    if (not isinstance(snapshot, dict)
+            or snapshot.get('format') != SNAPSHOT_FORMAT
+            or snapshot.get('stamp') != stamp):
+        return None
+    return snapshot.get('data')
+
+
+def save_snapshot(path, stamp, data):
+    """
+    保存快照，先写临时文件再替换，中途失败不会留下不完整的快照
+
+    Args:
+        path: 快照文件路径
+        stamp: 数据对应的修改标记
+        data: 要保存的数据（元组、列表等可pickle的对象）
+
+    Returns:
+        是否成功
+    """
+    temp_path = f'{path}.tmp'
+    try:
+        with open(temp_path, 'wb') as f:
+            pickle.dump(
+                {'format': SNAPSHOT_FORMAT, 'stamp': stamp, 'data': data},
+                f, protocol=pickle.HIGHEST_PROTOCOL
+            )
+        os.replace(temp_path, path)
+        return True
+    except Exception as e:
+        print(f"保存快照失败: {str(e)}")
+        return False
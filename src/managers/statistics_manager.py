@@ -1,19 +1,67 @@
 """统计管理器 - 对应UML类图中的StatisticsManager类"""
+import copy
+import math
+from datetime import datetime, timedelta
+from database.query_builder import TransactionQuery
 from models.statistics import Statistics
-from datetime import datetime
+from models.transaction import TransactionType
+
+# 统计后端：rollup读月度汇总表，sql在交易表上GROUP BY，memory逐条计算
+STATISTICS_BACKENDS = ('rollup', 'sql', 'memory')
+# 核对后端结果时金额允许的误差：两边都对原始金额求和，只有求和顺序和
+# 汇总表逐笔加减带来的最低有效位差异
+COMPARE_REL_TOLERANCE = 1e-9
+COMPARE_ABS_TOLERANCE = 1e-6
+
+# calculate_series()支持的统计周期
+SERIES_GRANULARITIES = ('day', 'week', 'month', 'quarter', 'year')
+# 按月汇总表可以直接分组的周期
+_MONTHLY_GRANULARITIES = {'month': 1, 'quarter': 3, 'year': 12}
+
+
+def _period_start(date, granularity):
+    """日期所在周期的起始时间，周从周一开始"""
+    if granularity == 'day':
+        return datetime(date.year, date.month, date.day)
+    if granularity == 'week':
+        return (datetime(date.year, date.month, date.day)
+                - timedelta(days=date.weekday()))
+    months = _MONTHLY_GRANULARITIES[granularity]
+    month = (date.month - 1) // months * months + 1
+    return datetime(date.year, month, 1)
+
+
+def _next_period(start, granularity):
+    """下一个周期的起始时间"""
+    if granularity == 'day':
+        return start + timedelta(days=1)
+    if granularity == 'week':
+        return start + timedelta(days=7)
+    months = start.year * 12 + start.month - 1 + _MONTHLY_GRANULARITIES[granularity]
+    return datetime(months // 12, months % 12 + 1, 1)
 
 
 class StatisticsManager:
     """统计管理器 - 对应UML组件图中的统计管理组件"""
     
-    def __init__(self, transaction_manager):
+    def __init__(self, transaction_manager, backend='rollup', compare=False):
         """
         初始化管理器
         
         Args:
             transaction_manager: TransactionManager实例
+            backend: 统计后端
+                'rollup' 整月的统计读月度汇总表，其他条件在交易表上聚合（默认）
+                'sql'    全部在交易表上按类型、分类SUM/COUNT聚合
+                'memory' 逐条遍历交易对象计算
+            compare: 是否同时用memory后端计算并核对结果，不一致时抛出
+                RuntimeError，用于校验数据库聚合的正确性
         """
+        if backend not in STATISTICS_BACKENDS:
+            raise ValueError(f"未知的统计后端: {backend}")
         self.transaction_manager = transaction_manager
+        self.backend = backend
+        self.compare = compare
     
     def calculate_monthly(self, year, month):
         """
@@ -26,26 +74,273 @@ class StatisticsManager:
         Returns:
             Statistics对象
         """
-        from datetime import timedelta
+        start = datetime(year, month, 1)
+        return self._calculate(
+            {'start_date': start,
+             'end_date': _next_period(start, 'month') - timedelta(seconds=1)},
+            ('year = ? AND month = ?', (year, month))
+        )
+    
+    def calculate_yearly(self, year):
+        """
+        计算年度统计
         
-        start_date = datetime(year, month, 1)
-        if month == 12:
-            end_date = datetime(year + 1, 1, 1) - timedelta(seconds=1)
-        else:
-            end_date = datetime(year, month + 1, 1) - timedelta(seconds=1)
+        Args:
+            year: 年份
         
-        # 通过TransactionManager查询数据
-        transactions = self.transaction_manager.query(
-            start_date=start_date,
-            end_date=end_date
+        Returns:
+            Statistics对象
+        """
+        return self._calculate(
+            {'start_date': datetime(year, 1, 1),
+             'end_date': datetime(year, 12, 31, 23, 59, 59)},
+            ('year = ?', (year,))
         )
+    
+    def calculate_all(self):
+        """
+        计算全部数据的统计
+        
+        Returns:
+            Statistics对象
+        """
+        return self._calculate({}, (None, ()))
+    
+    def calculate(self, filters=None):
+        """
+        计算任意查询条件下的统计
+        
+        Args:
+            filters: 查询条件字典，键与TransactionManager.query()的参数相同（可选）
         
-        # 创建Statistics对象并计算
-        stats = Statistics()
+        Returns:
+            Statistics对象
+        """
+        return self._calculate(filters or {})
+    
+    def _calculate(self, filters, rollup=None):
+        """
+        按当前后端计算统计
+        
+        Args:
+            filters: 查询条件字典
+            rollup: 等价的月度汇总表条件(where, params)，条件不按整月对齐时为None
+        
+        结果经过交易管理器的查询缓存，相同条件在数据变化前不再重复聚合；
+        返回副本，调用方修改结果不影响缓存
+        """
+        stats = self.transaction_manager.cached(
+            ('statistics', self.backend, self.compare, rollup), filters,
+            lambda: self._compute(filters, rollup))
+        return copy.deepcopy(stats)
+    
+    def _compute(self, filters, rollup):
+        """按当前后端计算统计，不经过缓存"""
+        if self.backend == 'memory':
+            return self._memory_statistics(filters)
+        if self.backend == 'rollup' and rollup is not None:
+            stats = self._rollup_statistics(*rollup)
+        else:
+            stats = self._sql_statistics(filters)
+        if self.compare:
+            self._compare(stats, self._memory_statistics(filters), filters)
+        return stats
+    
+    def calculate_series(self, start, end, granularity='month'):
+        """
+        按周期分段统计，一次遍历得到所有周期的结果
+        
+        统计[start, end]区间内的交易。区间按整月对齐且按月、季度、年统计时，
+        直接对月度汇总表分组，读取的行数与月数和分类数成正比；
+        否则按日期顺序流式遍历一次区间内的交易，逐条归入所在周期。
+        
+        Args:
+            start: 起始时间
+            end: 结束时间（包含）
+            granularity: 统计周期，'day'、'week'（周一开始）、'month'、
+                'quarter'或'year'
+        
+        Returns:
+            [(周期起始时间, Statistics对象)]，按时间顺序排列，
+            没有交易的周期也会列出，统计值为0
+        """
+        if granularity not in SERIES_GRANULARITIES:
+            raise ValueError(f"不支持的统计周期: {granularity}")
+        if end < start:
+            return []
+        
+        series = {}
+        period = _period_start(start, granularity)
+        while period <= end:
+            series[period] = None
+            period = _next_period(period, granularity)
+        
+        if (self.backend == 'rollup' and granularity in _MONTHLY_GRANULARITIES
+                and self._whole_months(start, end)):
+            self._rollup_series(series, start, end, granularity)
+        else:
+            self._scan_series(series, start, end, granularity)
+        return [(period, stats if stats is not None else Statistics())
+                for period, stats in series.items()]
+    
+    @staticmethod
+    def _whole_months(start, end):
+        """区间是否从月初开始、到月末最后一秒结束"""
+        return (start == _period_start(start, 'month')
+                and end + timedelta(seconds=1) == _period_start(
+                    end + timedelta(seconds=1), 'month'))
+    
+    def _rollup_series(self, series, start, end, granularity):
+        """由月度汇总表按周期分组"""
+        database = self.transaction_manager.database
+        groups = {}
+        for year, month, *row in database.iter_load(
+                'monthly_rollup',
+                'year * 12 + month BETWEEN ? AND ?',
+                (start.year * 12 + start.month, end.year * 12 + end.month),
+                columns='year, month, type, category_id, total, count, '
+                        'NULL, NULL'):
+            period = _period_start(datetime(year, month, 1), granularity)
+            groups.setdefault(period, []).append(row)
+        for period, rows in groups.items():
+            series[period] = self._stored_statistics(rows)
+    
+    def _scan_series(self, series, start, end, granularity):
+        """按日期顺序遍历区间内的交易，每个周期的交易是连续的一段"""
+        period = next_period = None
+        group = []
+        for trans in self.transaction_manager.iter_query(start_date=start,
+                                                         end_date=end):
+            if next_period is None or trans.date >= next_period:
+                if group:
+                    series[period] = self._group_statistics(group)
+                period = _period_start(trans.date, granularity)
+                next_period = _next_period(period, granularity)
+                group = []
+            group.append(trans)
+        if group:
+            series[period] = self._group_statistics(group)
+    
+    @staticmethod
+    def _group_statistics(transactions):
+        """计算一个周期的统计"""
+        stats = Statistics(track_extremes=False)
         stats.calculate(transactions)
+        return stats
+    
+    def _rollup_statistics(self, where=None, params=()):
+        """
+        由月度汇总表计算统计数据
         
+        汇总表由数据库触发器随交易增删改同步更新，每月每个分类每种类型一行，
+        读取的行数与分类数成正比，与交易笔数无关。金额合计按存储单位保存，
+        文本格式不舍入到分，与逐条计算的结果一致。
+        """
+        return self._stored_statistics(self.transaction_manager.database.iter_load(
+            'monthly_rollup', where, params,
+            columns='type, category_id, SUM(total), SUM(count), NULL, NULL',
+            group_by='type, category_id'))
+    
+    def _sql_statistics(self, filters):
+        """在交易表上按类型、分类聚合，日期条件使用日期索引"""
+        database = self.transaction_manager.database
+        where, params = TransactionQuery(**filters).build(
+            database.codec, fts=database.has_fts)
+        return self._stored_statistics(database.sum_by_category(where, params))
+    
+    def _memory_statistics(self, filters):
+        """
+        在内存中计算
+        
+        列式后端的query()结果可以直接在列上向量化汇总，其余后端逐条遍历交易对象
+        """
+        manager = self.transaction_manager
+        # 结果只读，不跟踪最值，逐条计算时不保留金额，列式结果可以在列上汇总
+        stats = Statistics(track_extremes=False)
+        if manager.backend == 'columnar':
+            stats.calculate(manager.query(**filters))
+        else:
+            stats.calculate(manager.iter_query(**filters))
+        return stats
+    
+    def _stored_statistics(self, rows):
+        """
+        由(类型值, 分类ID, 金额合计, 笔数, 最小金额, 最大金额)各行生成统计数据
+        
+        金额均为交易表的存储值：文本格式的REAL合计按math.fsum精确相加，
+        紧凑格式的整数分按整数累加，最后换算为金额。
+        月度汇总表没有最小、最大金额，对应的值为NULL，统计中的最值为None
+        """
+        codec = self.transaction_manager.database.codec
+        income, expense = [], []
+        categories = {}
+        for type_value, category_id, total, count, minimum, maximum in rows:
+            entry = categories.get(category_id)
+            if entry is None:
+                entry = categories[category_id] = [[], [], 0, minimum, maximum]
+            elif entry[3] is None or minimum is None:
+                entry[3] = entry[4] = None
+            else:
+                entry[3] = min(entry[3], minimum)
+                entry[4] = max(entry[4], maximum)
+            if type_value == TransactionType.INCOME.value:
+                income.append(total)
+                entry[0].append(total)
+            else:
+                expense.append(total)
+                entry[1].append(total)
+            entry[2] += count
+        
+        stats = Statistics(track_extremes=False)
+        stats.set_totals(
+            codec.sum_amounts(income), codec.sum_amounts(expense),
+            {cat_id: (codec.sum_amounts(category_income),
+                      codec.sum_amounts(category_expense), count,
+                      None if minimum is None else codec.decode_amount(minimum),
+                      None if maximum is None else codec.decode_amount(maximum))
+             for cat_id, (category_income, category_expense, count, minimum,
+                          maximum) in categories.items()}
+        )
         return stats
     
+    @staticmethod
+    def _compare(actual, expected, filters):
+        """
+        核对数据库聚合与逐条计算的结果
+        
+        两边都对原始金额求和（数据库不再逐笔舍入到分），金额允许浮点求和
+        顺序带来的微小误差；笔数必须完全一致
+        
+        Raises:
+            RuntimeError: 结果不一致
+        """
+        def same(value, expected_value):
+            return expected_value is not None and math.isclose(
+                value, expected_value, rel_tol=COMPARE_REL_TOLERANCE,
+                abs_tol=COMPARE_ABS_TOLERANCE)
+        
+        differences = []
+        for name in ('total_income', 'total_expense'):
+            if not same(getattr(actual, name), getattr(expected, name)):
+                differences.append(
+                    f"{name}: {getattr(actual, name)} != {getattr(expected, name)}")
+        if actual.category_counts != expected.category_counts:
+            differences.append(f"笔数: {actual.category_counts} != "
+                               f"{expected.category_counts}")
+        # 最值只在数据库给出时比较（月度汇总表没有最值）
+        for name in ('category_data', 'category_income', 'category_expense',
+                     'category_min', 'category_max'):
+            values = getattr(actual, name)
+            expected_values = getattr(expected, name)
+            for cat_id, value in values.items():
+                if value is not None and not same(value,
+                                                  expected_values.get(cat_id)):
+                    differences.append(
+                        f"{name}[{cat_id}]: {value} != {expected_values.get(cat_id)}")
+        if differences:
+            raise RuntimeError(f"统计结果与逐条计算不一致（条件{filters}）: "
+                               + '; '.join(differences))
+    
     def generate_chart(self):
         """
         生成图表 - 对应UML中的generateChart()方法
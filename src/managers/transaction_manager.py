@@ -1,52 +1,419 @@
 """交易管理器 - 增强版"""
-from models.transaction import Transaction, TransactionType
+import copy
+import math
 from datetime import datetime
+from itertools import islice
+from bisect import bisect_left, bisect_right
+from models.transaction import Transaction, TransactionType
+from database.query_builder import TransactionQuery, seek_clause
+from managers.columnar_store import ColumnarStore, ColumnarResult
+from managers.query_cache import QueryCache
+from managers.ngram_index import NgramIndex
+from managers.snapshot import load_snapshot, save_snapshot
+
+
+# 构造Transaction对象时从数据库读取的列，顺序与_row_factory()一致
+TRANSACTION_COLUMNS = 'id, amount, type, category_id, date, note'
+
+# 单笔交易金额上限
+MAX_AMOUNT = 1000000
+
+# 分页查询支持的排序：按(日期, id)升序或降序
+PAGE_ORDERS = {'date': False, '-date': True}
 
 
 class TransactionManager:
     """交易管理器"""
     
-    def __init__(self, database):
-        """初始化管理器"""
+    def __init__(self, database, backend='list', cache_size=128,
+                 window_years=None, snapshot_path=None):
+        """
+        初始化管理器
+        
+        Args:
+            database: Database实例
+            backend: 查询后端。'list'为默认的对象索引（文件数据库下推为SQL）；
+                     'columnar'为列式存储，查询和统计使用向量化运算，
+                     适合分析密集的场景
+            cache_size: 查询结果缓存的容量，0表示不缓存
+            window_years: 延迟加载窗口（可选）。指定时启动只加载最近几个
+                          自然年（如2为今年和去年）的交易，查询或统计涉及
+                          更早的日期时再按需加载，结果与全量加载相同；
+                          默认启动时全量加载
+            snapshot_path: 内存模型快照文件路径（可选）。快照未过期时
+                           直接从快照加载，不再逐行解析数据库记录
+        """
+        if backend not in ('list', 'columnar'):
+            raise ValueError(f"未知的查询后端: {backend}")
+        if window_years is not None and window_years < 1:
+            raise ValueError("延迟加载窗口至少为1年")
         self.database = database
-        self.transactions = []
+        self.backend = backend
+        self.window_years = window_years
+        self.snapshot_path = snapshot_path
+        # 已加载数据的起始日期：该日期及以后的交易全部在内存中，None表示全部已加载
+        self._loaded_from = None
+        # 列式存储：单笔增删改时随日期索引逐行更新，批量加载后失效，
+        # 下次列式查询时重建
+        self._columnar = None
+        # 数据版本号：每次增删改或重新加载时递增，用于使查询缓存失效
+        self._generation = 0
+        self._query_cache = QueryCache(cache_size)
+        # 主索引：id -> Transaction，按插入顺序保存
+        self._by_id = {}
+        # 二级索引：分类ID/交易类型 -> {id: Transaction}
+        self._by_category = {}
+        self._by_type = {}
+        # 日期索引：按(日期, id)排序的列表，用于日期范围查询和最近N条
+        self._date_keys = []
+        # 备注倒排索引：关键词查询的候选集
+        self._notes = NgramIndex()
         self.load_transactions()
+        # 外部工作单元回滚时，内存数据以数据库为准重新加载
+        self.database.add_rollback_listener(self.load_transactions)
     
     def load_transactions(self):
-        """从数据库加载交易记录"""
-        data = self.database.load('transactions')
-        self.transactions = []
-        for item in data:
-            trans_type = (TransactionType.INCOME if item['type'] == '收入' 
-                         else TransactionType.EXPENSE)
-            trans = Transaction(
-                transaction_id=item['id'],
-                amount=item['amount'],
-                trans_type=trans_type,
-                category_id=item['category_id'],
-                date=datetime.strptime(item['date'], '%Y-%m-%d %H:%M:%S'),
-                note=item.get('note', '')
+        """
+        从数据库加载交易记录，延迟加载模式下只加载最近的窗口
+        
+        配置了快照且快照未过期时直接从快照加载
+        """
+        self._generation += 1
+        self._by_id = {}
+        self._by_category = {}
+        self._by_type = {}
+        self._date_keys = []
+        self._notes = NgramIndex()
+        self._data_version = self.database.data_version()
+        
+        window_from = None
+        if self.window_years is not None:
+            window_from = datetime(
+                datetime.now().year - self.window_years + 1, 1, 1)
+        stamp = self._snapshot_stamp()
+        if stamp is not None and self._load_snapshot(stamp, window_from):
+            return
+        
+        where, params = None, ()
+        self._loaded_from = window_from
+        if window_from is not None:
+            where = 'date >= ?'
+            params = (self.database.codec.date_bound(window_from),)
+        self._index_all(self.database.iter_load(
+            'transactions', where, params,
+            columns=TRANSACTION_COLUMNS,
+            row_factory=self._row_factory()
+        ))
+    
+    def _snapshot_stamp(self):
+        """
+        快照对应的数据库修改标记
+        
+        未配置快照、内存数据库或处于未提交的工作单元中时返回None，不使用快照
+        """
+        if (not self.snapshot_path or self.database.is_memory
+                or self.database.in_transaction()):
+            return None
+        return self.database.change_stamp('transactions')
+    
+    def _load_snapshot(self, stamp, window_from):
+        """
+        从快照加载交易记录
+        
+        Returns:
+            是否加载成功；快照过期或包含的日期范围不足时返回False
+        """
+        data = load_snapshot(self.snapshot_path, stamp)
+        if data is None:
+            return False
+        loaded_from, rows = data
+        if loaded_from is not None and (window_from is None
+                                        or loaded_from > window_from):
+            return False
+        
+        income = TransactionType.INCOME
+        expense = TransactionType.EXPENSE
+        income_value = income.value
+        self._index_all(
+            Transaction(trans_id, amount,
+                        income if type_value == income_value else expense,
+                        category_id, date, note)
+            for trans_id, amount, type_value, category_id, date, note in rows
+        )
+        self._loaded_from = loaded_from
+        return True
+    
+    def save_snapshot(self):
+        """
+        将内存中的交易保存为快照，下次启动时可直接加载
+        
+        数据库被其他连接修改过时内存数据可能不是最新的，不保存
+        
+        Returns:
+            是否保存
+        """
+        stamp = self._snapshot_stamp()
+        if stamp is None or self.database.data_version() != self._data_version:
+            return False
+        rows = [(t.id, t.amount, t.type.value, t.category_id, t.date, t.note)
+                for t in self._by_id.values()]
+        return save_snapshot(self.snapshot_path, stamp,
+                             (self._loaded_from, rows))
+    
+    def _ensure_loaded(self, start_date=None):
+        """
+        确保start_date及以后的交易都已加载，start_date为None时加载全部
+        
+        只从数据库读取窗口之前尚未加载的部分，已在内存中的记录
+        （如新添加的早期交易）不会重复加载
+        """
+        loaded_from = self._loaded_from
+        if loaded_from is None or (start_date and start_date >= loaded_from):
+            return
+        
+        clauses = ['date < ?']
+        params = [self.database.codec.date_bound(loaded_from)]
+        if start_date:
+            clauses.append('date >= ?')
+            params.append(self.database.codec.date_bound(start_date))
+        by_id = self._by_id
+        rows = self.database.iter_load(
+            'transactions', ' AND '.join(clauses), params,
+            columns=TRANSACTION_COLUMNS,
+            row_factory=self._row_factory()
+        )
+        # 日期索引原有部分已经有序，排序只需合并新追加的部分
+        self._index_all(trans for trans in rows if trans.id not in by_id)
+        self._loaded_from = start_date or None
+    
+    @property
+    def transactions(self):
+        """所有交易记录列表（按ID顺序）"""
+        if self.window_years is not None:
+            # 延迟加载的记录不是按ID顺序加入的
+            self._ensure_loaded()
+            return sorted(self._by_id.values(), key=lambda t: t.id)
+        return list(self._by_id.values())
+    
+    def _index(self, trans):
+        """
+        将交易加入主索引、二级索引和日期索引，日期索引用二分插入保持有序
+        
+        Args:
+            trans: Transaction对象
+        """
+        self._by_id[trans.id] = trans
+        self._by_category.setdefault(trans.category_id, {})[trans.id] = trans
+        self._by_type.setdefault(trans.type, {})[trans.id] = trans
+        self._notes.add(trans.id, trans.note)
+        key = (trans.date, trans.id)
+        pos = bisect_right(self._date_keys, key)
+        self._date_keys.insert(pos, key)
+        if self._columnar is not None:
+            # 列式存储的行与日期索引一一对应，在同一位置插入
+            self._columnar = self._columnar.insert(pos, trans)
+    
+    def _index_all(self, transactions):
+        """
+        批量将交易加入各索引，用于从数据库或快照加载
+        
+        结果与逐条调用_index()相同，日期索引在最后统一排序
+        """
+        self._columnar = None
+        by_id = self._by_id
+        by_category = self._by_category
+        by_type = self._by_type
+        date_keys = self._date_keys
+        add_note = self._notes.add
+        for trans in transactions:
+            trans_id = trans.id
+            by_id[trans_id] = trans
+            bucket = by_category.get(trans.category_id)
+            if bucket is None:
+                bucket = by_category[trans.category_id] = {}
+            bucket[trans_id] = trans
+            bucket = by_type.get(trans.type)
+            if bucket is None:
+                bucket = by_type[trans.type] = {}
+            bucket[trans_id] = trans
+            add_note(trans_id, trans.note)
+            date_keys.append((trans.date, trans_id))
+        date_keys.sort()
+    
+    def _unindex(self, trans):
+        """
+        将交易从二级索引和日期索引中移除（主索引由调用方处理）
+        
+        对象的属性已被调用方直接修改时，按ID在所有索引中查找
+        """
+        self._remove_from_bucket(self._by_category, trans.category_id, trans.id)
+        self._remove_from_bucket(self._by_type, trans.type, trans.id)
+        self._notes.remove(trans.id)
+        
+        key = (trans.date, trans.id)
+        pos = bisect_left(self._date_keys, key)
+        if pos < len(self._date_keys) and self._date_keys[pos] == key:
+            del self._date_keys[pos]
+            if self._columnar is not None:
+                self._columnar = self._columnar.delete(pos)
+        else:
+            self._date_keys = [k for k in self._date_keys if k[1] != trans.id]
+            self._columnar = None
+    
+    def _remove_from_bucket(self, index, key, trans_id):
+        """从二级索引的桶中移除交易，空桶一并删除"""
+        if trans_id not in index.get(key, {}):
+            key = next((k for k, bucket in index.items()
+                        if trans_id in bucket), None)
+            if key is None:
+                return
+        bucket = index[key]
+        del bucket[trans_id]
+        if not bucket:
+            del index[key]
+    
+    def _row_factory(self):
+        """
+        构造行转换函数：将(id, amount, type, category_id, date, note)元组
+        直接转换为Transaction对象
+        
+        编解码函数和交易类型预先绑定为局部变量，逐行转换时不再查找属性
+        """
+        decode_amount = self.database.codec.decode_amount
+        decode_date = self.database.codec.decode_date
+        income = TransactionType.INCOME
+        expense = TransactionType.EXPENSE
+        income_value = income.value
+        
+        def row_to_transaction(cursor, row):
+            trans_id, amount, type_value, category_id, date, note = row
+            return Transaction(
+                trans_id, decode_amount(amount),
+                income if type_value == income_value else expense,
+                category_id, decode_date(date),
+                note if note is not None else ''
             )
-            self.transactions.append(trans)
+        
+        return row_to_transaction
     
     def add_transaction(self, transaction):
-        """添加交易 - 对应UML中的addTransaction()"""
-        if transaction.amount > 1000000:
-            raise ValueError("交易金额过大，禁止添加！")
-        trans_id = self.database.save('transactions', transaction.to_dict())
+        """
+        添加交易 - 对应UML中的addTransaction()
+        
+        校验规则与add_transactions()相同
+        
+        Raises:
+            ValueError: 交易不合格
+        """
+        reason = self._validate(transaction, self._category_ids())
+        if reason is not None:
+            raise ValueError(reason)
+        self._normalize(transaction)
+        with self.database.transaction():
+            trans_id = self.database.save('transactions', transaction.to_dict())
+        self._generation += 1
         transaction.id = trans_id
-        self.transactions.append(transaction)
+        self._index(transaction)
         return trans_id
     
+    def add_transactions(self, transactions):
+        """
+        批量添加交易
+        
+        先对整批记录做校验（金额范围、交易类型、分类是否存在、日期），
+        不合格的记录单独拒绝，不影响其余记录；合格的记录在同一个事务中
+        一次插入，ID连续分配，内存索引在最后统一更新。
+        
+        Args:
+            transactions: Transaction对象的可迭代对象
+        
+        Returns:
+            (新增的ID列表, 被拒绝的记录列表[(在输入中的下标, 原因)])
+        """
+        category_ids = self._category_ids()
+        
+        accepted = []
+        rejected = []
+        for index, trans in enumerate(transactions):
+            reason = self._validate(trans, category_ids)
+            if reason is None:
+                self._normalize(trans)
+                accepted.append(trans)
+            else:
+                rejected.append((index, reason))
+        if not accepted:
+            return [], rejected
+        
+        # 先取得写锁再读取下一个ID，其他连接无法在插入前占用这些ID
+        with self.database.transaction(immediate=True):
+            first_id = self.database.next_id('transactions')
+            self.database.save_many(
+                'transactions', (trans.to_dict() for trans in accepted),
+                first_id=first_id
+            )
+        self._generation += 1
+        
+        ids = list(range(first_id, first_id + len(accepted)))
+        for trans_id, trans in zip(ids, accepted):
+            trans.id = trans_id
+        self._index_all(accepted)
+        return ids, rejected
+    
+    def _category_ids(self):
+        """数据库中所有分类的ID集合"""
+        return {row[0] for row in self.database.iter_load(
+            'categories', columns='id')}
+    
+    def _normalize(self, trans):
+        """
+        保存和索引前规范化，使内存中的对象与从数据库加载的一致
+        
+        金额按存储格式编码再解码（紧凑格式舍入到分），日期舍去秒以下部分，
+        备注为None时改为空字符串。内存索引、列式存储和快照中的值因此
+        与数据库中的相同，内存与SQL两条路径的查询和统计结果一致。
+        """
+        codec = self.database.codec
+        trans.amount = codec.decode_amount(codec.encode_amount(trans.amount))
+        if trans.date.microsecond:
+            trans.date = trans.date.replace(microsecond=0)
+        if trans.note is None:
+            trans.note = ''
+    
+    def _validate(self, trans, category_ids):
+        """
+        校验一条待添加的交易
+        
+        Returns:
+            不合格的原因，合格时返回None
+        """
+        amount = trans.amount
+        if (not isinstance(amount, (int, float)) or isinstance(amount, bool)
+                or not math.isfinite(amount)):
+            return "金额不是有效的数字"
+        if amount < 0:
+            return "金额不能为负数"
+        if amount > MAX_AMOUNT:
+            return "交易金额过大，禁止添加！"
+        if not isinstance(trans.type, TransactionType):
+            return "交易类型无效"
+        if trans.category_id is not None and trans.category_id not in category_ids:
+            return f"分类不存在: {trans.category_id}"
+        if not isinstance(trans.date, datetime):
+            return "日期无效"
+        if trans.note is not None and not isinstance(trans.note, str):
+            return "备注必须是文本"
+        return None
+    
     def delete_transaction(self, trans_id):
         """删除交易 - 对应UML中的deleteTransaction()"""
         # 从数据库删除
-        #cursor = self.database.conn.cursor()
-        #cursor.execute('DELETE FROM transactions WHERE id = ?', (trans_id,))
-        #self.database.conn.commit()
-        self.database.delete('transactions', trans_id)
+        with self.database.transaction():
+            self.database.delete('transactions', trans_id)
+        self._generation += 1
         # 从内存中删除
-        self.transactions = [t for t in self.transactions if t.id != trans_id]
+        trans = self._by_id.pop(trans_id, None)
+        if trans is not None:
+            self._unindex(trans)
         return True
     
     def update_transaction(self, transaction):
@@ -56,30 +423,63 @@ class TransactionManager:
         Args:
             transaction: Transaction对象
         """
-        cursor = self.database.conn.cursor()
-        cursor.execute('''
-            UPDATE transactions 
-            SET amount=?, type=?, category_id=?, date=?, note=?
-            WHERE id=?
-        ''', (
-            transaction.amount,
-            transaction.type.value,
-            transaction.category_id,
-            transaction.date.strftime('%Y-%m-%d %H:%M:%S'),
-            transaction.note,
-            transaction.id
-        ))
-        self.database.conn.commit()
+        self._normalize(transaction)
+        data = transaction.to_dict()
+        del data['id']
+        with self.database.transaction():
+            external_change = (self.database.data_version()
+                               != self._data_version)
+            updated = self.database.update('transactions', transaction.id, data)
+        self._generation += 1
         
-        # 重新加载
-        self.load_transactions()
+        existing = self._by_id.get(transaction.id)
+        if existing is None and self._loaded_from is not None and \
+                not external_change and updated:
+            # 延迟加载窗口之前的记录：改到已加载范围内时加入索引
+            if transaction.date >= self._loaded_from:
+                self._index(transaction)
+            return
+        if external_change or not updated or existing is None:
+            # 数据库被外部修改或记录不存在时，以数据库为准全量重新加载
+            self.load_transactions()
+            return
+        
+        # 原地修改内存中的对象，并更新受影响的二级索引
+        self._unindex(existing)
+        if existing is not transaction:
+            existing.amount = transaction.amount
+            existing.type = transaction.type
+            existing.category_id = transaction.category_id
+            existing.date = transaction.date
+            existing.note = transaction.note
+        self._index(existing)
     
     def get_transactions(self):
         """获取所有交易 - 对应UML中的getTransactions()"""
         return self.transactions
     
+    def get_transaction(self, trans_id):
+        """
+        根据ID获取交易
+        
+        Args:
+            trans_id: 交易ID
+        
+        Returns:
+            Transaction对象，不存在时返回None
+        """
+        trans = self._by_id.get(trans_id)
+        if trans is None and self._loaded_from is not None:
+            # 延迟加载模式下可能是窗口之前的记录，直接从数据库读取
+            trans = next(self.database.iter_load(
+                'transactions', 'id = ?', (trans_id,),
+                columns=TRANSACTION_COLUMNS,
+                row_factory=self._row_factory()), None)
+        return trans
+    
     def query(self, start_date=None, end_date=None, category_id=None,
-              min_amount=None, max_amount=None, keyword=None, trans_type=None):
+              min_amount=None, max_amount=None, keyword=None, trans_type=None,
+              note_match=None):
         """
         查询交易 - 对应UML中的query()，增强版支持更多条件
         
@@ -91,33 +491,332 @@ class TransactionManager:
             max_amount: 最大金额
             keyword: 关键词
             trans_type: 交易类型
+            note_match: 备注全文检索表达式（FTS5语法，支持"短语"、前缀*、
+                        AND/OR/NOT），需要数据库支持全文检索
         
         Returns:
-            符合条件的交易记录列表
+            符合条件的交易记录列表，按日期排序
+        
+        相同条件的查询结果会被缓存，数据变化后缓存失效
+        """
+        key = self._query_key(start_date, end_date, category_id, min_amount,
+                              max_amount, keyword, trans_type, note_match)
+        results = self._cached(key, lambda: self._execute_query(*key))
+        # 返回副本，调用方修改结果不影响缓存
+        return copy.copy(results)
+    
+    def iter_query(self, start_date=None, end_date=None, category_id=None,
+                   min_amount=None, max_amount=None, keyword=None,
+                   trans_type=None, note_match=None):
         """
-        results = self.transactions
+        流式查询交易，参数与query()相同
         
-        if start_date:
-            results = [t for t in results if t.date >= start_date]
-        if end_date:
-            results = [t for t in results if t.date <= end_date]
+        按(日期, id)顺序逐条产出，不构造结果列表、不经过查询缓存：文件数据库
+        从游标分批读取，内存数据库沿日期索引或最小的索引桶逐条筛选。
+        适合导出、统计等只需遍历一次的场景。遍历期间不应增删交易。
+        
+        Yields:
+            符合条件的交易记录
+        """
+        key = self._query_key(start_date, end_date, category_id, min_amount,
+                              max_amount, keyword, trans_type, note_match)
+        yield from self._iter_query(key)
+    
+    def query_page(self, filters=None, order_by='date', limit=50,
+                   after_key=None):
+        """
+        分页查询交易（键集分页）
+        
+        按(日期, id)排序，从after_key之后开始取limit条。文件数据库使用
+        日期索引定位，内存数据库使用日期索引二分查找，每页的开销只与
+        limit有关，与已翻过的页数和结果总数无关。
+        
+        Args:
+            filters: 查询条件字典，键与query()的参数相同（可选）
+            order_by: 'date'按日期升序，'-date'按日期降序
+            limit: 每页条数
+            after_key: 上一页返回的next_key，None表示第一页
+        
+        Returns:
+            (交易记录列表, next_key)，没有下一页时next_key为None
+        """
+        if order_by not in PAGE_ORDERS:
+            raise ValueError(f"不支持的排序方式: {order_by}")
+        if limit <= 0:
+            raise ValueError("每页条数必须大于0")
+        descending = PAGE_ORDERS[order_by]
+        if after_key is not None:
+            after_key = tuple(after_key)
+        key = self._query_key(**(filters or {}))
+        
+        # 多取一条判断是否还有下一页
+        rows = self._iter_query(key, after_key, descending, limit + 1)
+        page = []
+        for trans in rows:
+            if len(page) == limit:
+                last = page[-1]
+                return page, (last.date, last.id)
+            page.append(trans)
+        return page, None
+    
+    def count(self, filters=None):
+        """
+        统计符合条件的交易数，不构造交易对象列表
+        
+        Args:
+            filters: 查询条件字典，键与query()的参数相同（可选）
+        
+        Returns:
+            记录数
+        
+        结果经过查询缓存，数据变化后失效
+        """
+        key = self._query_key(**(filters or {}))
+        return self._cached(('count', key), lambda: self._count(key))
+    
+    def _count(self, key):
+        """统计记录数，不经过缓存"""
+        start_date, end_date, *conditions = key
+        
+        if self.backend == 'columnar' or self.database.is_memory:
+            if all(condition is None for condition in conditions):
+                # 只有日期条件时由日期索引直接得出
+                self._ensure_loaded(start_date)
+                lo, hi = self._date_range(start_date, end_date)
+                return hi - lo
+            return sum(1 for _ in self._iter_query(key))
+        
+        where, params = self._build_query(key)
+        cursor = self.database.iter_load('transactions', where, params,
+                                         columns='COUNT(*)')
+        return next(cursor)[0]
+    
+    def _query_key(self, start_date=None, end_date=None, category_id=None,
+                   min_amount=None, max_amount=None, keyword=None,
+                   trans_type=None, note_match=None):
+        """
+        规范化查询条件，作为缓存键和各查询路径的参数
+        
+        交易日期按整秒保存，日期条件同样舍去秒以下部分，按秒比较
+        """
+        if start_date and start_date.microsecond:
+            start_date = start_date.replace(microsecond=0)
+        if end_date and end_date.microsecond:
+            end_date = end_date.replace(microsecond=0)
+        return (start_date or None, end_date or None, category_id or None,
+                min_amount, max_amount,
+                keyword.lower() if keyword else None, trans_type or None,
+                note_match or None)
+    
+    def cached(self, kind, filters, compute):
+        """
+        经由查询缓存取得按查询条件派生的结果（如统计数据）
+        
+        与query()共用缓存、容量和失效规则，数据变化后自动失效
+        
+        Args:
+            kind: 结果种类（可哈希），与规范化的查询条件一起作为缓存键
+            filters: 查询条件字典，键与query()的参数相同
+            compute: 未命中时调用的无参函数，返回值不能为None
+        
+        Returns:
+            缓存的或新计算的结果，调用方不应修改
+        """
+        key = self._query_key(**filters)
+        return self._cached((kind, key), compute)
+    
+    def _cached(self, key, compute):
+        """按缓存键查找，未命中时计算并保存"""
+        generation = self._cache_generation()
+        result = self._query_cache.get(key, generation)
+        if result is None:
+            result = compute()
+            self._query_cache.put(key, generation, result)
+        return result
+    
+    def cache_info(self):
+        """
+        查询缓存统计信息
+        
+        Returns:
+            {'hits', 'misses', 'size', 'maxsize'}字典
+        """
+        return self._query_cache.info()
+    
+    def _cache_generation(self):
+        """
+        查询缓存的版本号
+        
+        包含写连接的修改行数，直接在写连接上执行的修改也使缓存失效；
+        文件数据库还要包含PRAGMA data_version，其他连接修改数据库后缓存同样失效
+        """
+        if self.database.is_memory:
+            return (self._generation, self.database.total_changes())
+        return (self._generation, self.database.total_changes(),
+                self.database.data_version())
+    
+    def _execute_query(self, *key):
+        """执行查询，不经过缓存"""
+        if self.backend == 'columnar':
+            (start_date, end_date, category_id, min_amount, max_amount,
+             keyword, trans_type, note_match) = key
+            self._ensure_loaded(start_date)
+            return self._query_columnar(
+                start_date=start_date, end_date=end_date,
+                category_id=category_id, min_amount=min_amount,
+                max_amount=max_amount, keyword=keyword,
+                trans_type=trans_type, ids=self._match_ids(note_match)
+            )
+        return list(self._iter_query(key))
+    
+    def _iter_query(self, key, after_key=None, descending=False, limit=None):
+        """
+        按(日期, id)顺序逐条产出符合条件的交易
+        
+        内存数据库和列式后端在内存索引上筛选，文件数据库将条件下推为SQL，
+        从游标分批读取。after_key为键集分页的起点，limit为最多产出的条数。
+        """
+        if self.backend == 'columnar' or self.database.is_memory:
+            self._ensure_loaded(key[0])
+            *conditions, note_match = key
+            rows = self._iter_in_memory(
+                *conditions, match_ids=self._match_ids(note_match),
+                after_key=after_key, descending=descending
+            )
+            return islice(rows, limit) if limit is not None else rows
+        
+        # 文件数据库：条件下推为参数化SQL，由索引完成过滤
+        where, params = self._build_query(key)
+        if after_key is not None:
+            clause, seek_params = seek_clause(
+                after_key, self.database.codec, descending)
+            where = f'{where} AND {clause}' if where else clause
+            params = params + seek_params
+        return self.database.iter_load(
+            'transactions', where, params,
+            columns=TRANSACTION_COLUMNS,
+            row_factory=self._row_factory(),
+            order_by='date DESC, id DESC' if descending else 'date, id',
+            limit=limit
+        )
+    
+    def _build_query(self, key):
+        """查询条件转换为WHERE子句和参数"""
+        return TransactionQuery(*key).build(
+            self.database.codec, fts=self.database.has_fts)
+    
+    def _match_ids(self, note_match):
+        """全文检索表达式由数据库的全文索引求出匹配的ID集合"""
+        return self.database.match_notes(note_match) if note_match else None
+    
+    def _iter_in_memory(self, start_date, end_date, category_id,
+                        min_amount, max_amount, keyword, trans_type,
+                        match_ids=None, after_key=None, descending=False):
+        """
+        在内存索引上筛选，用于:memory:数据库和列式后端
+        
+        match_ids为全文检索匹配的ID集合，after_key和descending同_iter_query
+        """
+        candidates = self._candidates(start_date, end_date, category_id,
+                                      trans_type, match_ids, keyword,
+                                      after_key, descending)
+        keyword = keyword.lower() if keyword else None
+        
+        for t in candidates:
+            if start_date and t.date < start_date:
+                continue
+            if end_date and t.date > end_date:
+                continue
+            if category_id and t.category_id != category_id:
+                continue
+            if min_amount is not None and not t.amount >= min_amount:
+                continue
+            if max_amount is not None and not t.amount <= max_amount:
+                continue
+            if keyword and keyword not in t.note.lower():
+                continue
+            if trans_type and t.type != trans_type:
+                continue
+            if match_ids is not None and t.id not in match_ids:
+                continue
+            yield t
+    
+    def _query_columnar(self, **conditions):
+        """在列式存储中查询，结果可由Statistics直接在列上汇总"""
+        store = self._columnar_store()
+        positions = store.select(**conditions)
+        by_id = self._by_id
+        transactions = [by_id[trans_id] for trans_id in store.ids_at(positions)]
+        return ColumnarResult(transactions, store, positions)
+    
+    def _columnar_store(self):
+        """获取列式存储，数据变化后按日期索引的顺序重建"""
+        if self._columnar is None:
+            by_id = self._by_id
+            self._columnar = ColumnarStore(
+                by_id[trans_id] for _, trans_id in self._date_keys
+            )
+        return self._columnar
+    
+    def _candidates(self, start_date, end_date, category_id, trans_type,
+                    match_ids=None, keyword=None, after_key=None,
+                    descending=False):
+        """
+        根据日期、分类、类型、全文检索和关键词条件从索引中选出候选交易
+        
+        日期范围通过二分查找定位，分类和类型取对应的索引桶，
+        全文检索和关键词取匹配的ID集合，选择其中最小的一个作为候选集，
+        结果按(日期, id)排序；指定after_key时只保留排在它之后的交易
+        """
+        lo, hi = self._date_range(start_date, end_date)
+        keys = self._date_keys
+        if after_key is not None:
+            if descending:
+                hi = min(hi, bisect_left(keys, after_key))
+            else:
+                lo = max(lo, bisect_right(keys, after_key))
+            hi = max(lo, hi)
+        buckets = []
+        by_id = self._by_id
+        for ids in (match_ids,
+                    self._notes.candidates(keyword) if keyword else None):
+            if ids is not None:
+                buckets.append({trans_id: by_id[trans_id] for trans_id in ids
+                                if trans_id in by_id})
         if category_id:
-            results = [t for t in results if t.category_id == category_id]
-        if min_amount is not None:
-            results = [t for t in results if t.amount >= min_amount]
-        if max_amount is not None:
-            results = [t for t in results if t.amount <= max_amount]
-        if keyword:
-            results = [t for t in results 
-                      if keyword.lower() in t.note.lower()]
+            buckets.append(self._by_category.get(category_id, {}))
         if trans_type:
-            results = [t for t in results if t.type == trans_type]
+            buckets.append(self._by_type.get(trans_type, {}))
+        
+        if buckets:
+            bucket = min(buckets, key=len)
+            if len(bucket) < hi - lo:
+                candidates = sorted(bucket.values(),
+                                    key=lambda t: (t.date, t.id),
+                                    reverse=descending)
+                if after_key is None:
+                    return candidates
+                if descending:
+                    return [t for t in candidates if (t.date, t.id) < after_key]
+                return [t for t in candidates if (t.date, t.id) > after_key]
         
-        return results
+        positions = range(hi - 1, lo - 1, -1) if descending else range(lo, hi)
+        return (by_id[keys[pos][1]] for pos in positions)
+    
+    def _date_range(self, start_date, end_date):
+        """日期索引中[start_date, end_date]范围的下标区间，O(log n)"""
+        lo = bisect_left(self._date_keys, (start_date,)) if start_date else 0
+        if end_date:
+            hi = bisect_right(self._date_keys, (end_date, float('inf')))
+        else:
+            hi = len(self._date_keys)
+        return lo, max(lo, hi)
     
     def get_transaction_count(self):
         """获取交易记录总数"""
-        return len(self.transactions)
+        if self._loaded_from is not None:
+            return self.count()
+        return len(self._by_id)
     
     def get_latest_transactions(self, count=10):
         """
@@ -129,7 +828,9 @@ class TransactionManager:
         Returns:
             交易记录列表
         """
-        sorted_trans = sorted(self.transactions, 
-                            key=lambda x: x.date, 
-                            reverse=True)
-        return sorted_trans[:count]
\ No newline at end of file
+        if len(self._date_keys) < count:
+            # 窗口内的记录不足时加载更早的数据
+            self._ensure_loaded()
+        by_id = self._by_id
+        keys = self._date_keys[-count:] if count > 0 else []
+        return [by_id[trans_id] for _, trans_id in reversed(keys)]
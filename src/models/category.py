@@ -4,6 +4,8 @@
 class Category:
     """分类类 - 对应UML类图中的Category类"""
     
+    __slots__ = ('id', 'name', 'icon', 'type', 'is_predefined')
+    
     def __init__(self, category_id=None, name="", icon="", 
                  trans_type=None, is_predefined=False):
         """
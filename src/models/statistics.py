@@ -1,35 +1,434 @@
 """统计数据模型"""
+import math
+from collections import Counter
 from models.transaction import TransactionType
 
 
+class _ExactSum:
+    """
+    浮点数的精确累加器
+
+    有限浮点数都是形如 整数/2**k 的二进制分数，累加器以同一个2**k为分母
+    保存整数分子，没有舍入误差，取值时只做一次正确舍入的整数除法，
+    因此结果与math.fsum()相同，且与累加、撤销、合并的顺序无关。
+    k取已累加的数中最大的一个（常见金额约为50位），状态只有两个整数，
+    占用的内存与累加的个数无关。
+    """
+
+    __slots__ = ('_numerator', '_bits', '_special')
+
+    def __init__(self, values=()):
+        """
+        Args:
+            values: 初始数值（可选）
+        """
+        # 和 = _numerator / 2**_bits
+        self._numerator = 0
+        self._bits = 0
+        # 非有限值单独计数：[+inf个数, -inf个数, nan个数]
+        self._special = None
+        for value in values:
+            self.add(value)
+
+    def add(self, value):
+        """累加一个数"""
+        self._add(value, 1)
+
+    def sub(self, value):
+        """撤销一次累加"""
+        self._add(value, -1)
+
+    def merge(self, other):
+        """合并另一个累加器"""
+        self._add_fraction(other._numerator, other._bits)
+        if other._special:
+            special = self._special or [0, 0, 0]
+            self._special = [a + b for a, b in zip(special, other._special)]
+
+    def value(self):
+        """当前的精确和舍入到最近的浮点数"""
+        return self._round(self._numerator, self._bits, self._special)
+
+    def value_with(self, other):
+        """与另一个累加器之和，两者都不改变"""
+        special = self._special
+        if other._special:
+            special = [a + b for a, b in zip(special or [0, 0, 0],
+                                             other._special)]
+        bits = max(self._bits, other._bits)
+        numerator = ((self._numerator << (bits - self._bits))
+                     + (other._numerator << (bits - other._bits)))
+        return self._round(numerator, bits, special)
+
+    @staticmethod
+    def _round(numerator, bits, special):
+        """分数舍入为浮点数（整数除法正确舍入），含非有限值时按IEEE规则"""
+        if special and any(special):
+            positive, negative, nan = special
+            if nan or (positive and negative):
+                return math.nan
+            return math.inf if positive else -math.inf
+        return numerator / (1 << bits)
+
+    def _add(self, value, sign):
+        try:
+            numerator, denominator = value.as_integer_ratio()
+        except (OverflowError, ValueError):
+            special = self._special or [0, 0, 0]
+            index = 2 if math.isnan(value) else (0 if value > 0 else 1)
+            special[index] += sign
+            self._special = special
+            return
+        bits = denominator.bit_length() - 1
+        if bits <= self._bits:
+            self._numerator += sign * numerator << (self._bits - bits)
+        else:
+            self._numerator = ((self._numerator << (bits - self._bits))
+                               + sign * numerator)
+            self._bits = bits
+
+    def _add_fraction(self, numerator, bits):
+        if bits <= self._bits:
+            self._numerator += numerator << (self._bits - bits)
+        else:
+            self._numerator = (self._numerator << (bits - self._bits)) + numerator
+            self._bits = bits
+
+
+class _CategoryTotals:
+    """
+    一个分类的收入、支出合计、笔数和最小、最大金额
+
+    计入金额时最值直接比较更新；移出当前最值后需要其余金额才能确定新的最值，
+    只有跟踪最值时才保留金额的多重集合（金额 -> 笔数），否则最值变为未知（None）。
+    由汇总结果直接设置时同样没有逐笔金额。
+    """
+
+    __slots__ = ('income', 'expense', 'count', 'minimum', 'maximum', 'amounts')
+
+    def __init__(self, track_extremes=False):
+        """
+        Args:
+            track_extremes: 是否保留金额的多重集合
+        """
+        self.income = _ExactSum()
+        self.expense = _ExactSum()
+        self.count = 0
+        self.minimum = None
+        self.maximum = None
+        self.amounts = Counter() if track_extremes else None
+
+    @classmethod
+    def from_totals(cls, income, expense, count, minimum=None, maximum=None):
+        """由已汇总的结果建立"""
+        totals = cls()
+        totals.income.add(income)
+        totals.expense.add(expense)
+        totals.count = count
+        totals.minimum = minimum
+        totals.maximum = maximum
+        return totals
+
+    def total(self):
+        """收入与支出合计"""
+        return self.income.value_with(self.expense)
+
+    def add(self, amount, is_income):
+        """计入一笔金额"""
+        (self.income if is_income else self.expense).add(amount)
+        if self.amounts is not None:
+            self.amounts[amount] += 1
+        if not self.count:
+            self.minimum = self.maximum = amount
+        elif self.minimum is not None:
+            if amount < self.minimum:
+                self.minimum = amount
+            elif amount > self.maximum:
+                self.maximum = amount
+        self.count += 1
+
+    def remove(self, amount, is_income):
+        """移出一笔金额"""
+        (self.income if is_income else self.expense).sub(amount)
+        self.count -= 1
+        removed = False
+        if self.amounts is not None:
+            left = self.amounts[amount] - 1
+            if left > 0:
+                self.amounts[amount] = left
+            else:
+                del self.amounts[amount]
+                removed = True
+        if not self.count:
+            self.minimum = self.maximum = None
+        elif amount == self.minimum or amount == self.maximum:
+            if self.amounts is None:
+                self.minimum = self.maximum = None
+            elif removed:
+                self.minimum = min(self.amounts)
+                self.maximum = max(self.amounts)
+
+    def merge(self, other):
+        """合并另一个分类合计"""
+        if self.amounts is not None and other.amounts is not None:
+            self.amounts.update(other.amounts)
+        else:
+            self.amounts = None
+        self.income.merge(other.income)
+        self.expense.merge(other.expense)
+        if not self.count:
+            self.minimum, self.maximum = other.minimum, other.maximum
+        elif other.count:
+            if self.minimum is None or other.minimum is None:
+                self.minimum = self.maximum = None
+            else:
+                self.minimum = min(self.minimum, other.minimum)
+                self.maximum = max(self.maximum, other.maximum)
+        self.count += other.count
+
+
 class Statistics:
     """统计类"""
-    
-    def __init__(self):
-        """初始化统计数据"""
+
+    def __init__(self, track_extremes=True):
+        """
+        初始化统计数据
+
+        Args:
+            track_extremes: 是否为retract()跟踪最值。默认跟踪：每个分类保留
+                金额的多重集合（内存与不同金额的个数成正比），移出最小或最大
+                金额后仍能确定新的最值，apply()/retract()/merge()之后的所有
+                统计项都与重新calculate()完全相同。只计算一次、不再增量更新的
+                统计可以传入False，calculate()不保留金额、可以使用列上的汇总；
+                此时移出最值后该分类和全部交易的最值变为None，合计、笔数不受影响
+        """
+        self.track_extremes = track_extremes
         self.total_income = 0.0
         self.total_expense = 0.0
         self.balance = 0.0
+        self.transaction_count = 0
+        # 全部交易的最小、最大、平均金额，没有交易或无法确定时最值为None
+        self.min_amount = None
+        self.max_amount = None
+        self.mean_amount = 0.0
+        # 按分类ID：合计、笔数、收入、支出、最小、最大、平均金额
         self.category_data = {}
-    
+        self.category_counts = {}
+        self.category_income = {}
+        self.category_expense = {}
+        self.category_min = {}
+        self.category_max = {}
+        self.category_mean = {}
+        # 精确累加器，支持增量更新和合并：收入、支出、{分类ID: _CategoryTotals}
+        self._income = _ExactSum()
+        self._expense = _ExactSum()
+        self._categories = {}
+
     def calculate(self, transactions):
-        """计算统计数据"""
-        self.total_income = 0.0
-        self.total_expense = 0.0
-        self.category_data = {}
-        
+        """
+        计算统计数据
+
+        一次遍历同时得到收支合计和各分类的笔数、收支、最小、最大、平均金额。
+        合计值是精确和舍入到最近的浮点数（与math.fsum相同），不受累加顺序影响。
+        transactions可以是任意可迭代对象（如TransactionManager.iter_query()
+        的生成器），逐条累加，不保留交易记录和金额列表，占用的内存只与分类数
+        有关（跟踪最值时另有各分类不同金额的多重集合）。不跟踪最值且传入的
+        结果对象提供aggregate()方法时（如列式存储的查询结果），直接使用其在
+        列上的汇总结果，之后的增量更新以这些合计为起点。
+        """
+        aggregate = getattr(transactions, 'aggregate', None)
+        if aggregate is not None and not self.track_extremes:
+            self.total_income, self.total_expense, categories = aggregate()
+            self._income = _ExactSum([self.total_income])
+            self._expense = _ExactSum([self.total_expense])
+            self._categories = {}
+            self._clear_categories()
+            for cat_id, (total, count, income, expense,
+                         minimum, maximum) in categories.items():
+                self._categories[cat_id] = _CategoryTotals.from_totals(
+                    income, expense, count, minimum, maximum)
+                self._publish_category(cat_id, total, count, income, expense,
+                                       minimum, maximum)
+            self.transaction_count = sum(self.category_counts.values())
+            self._refresh_extremes()
+            self._refresh_balance()
+            return
+
+        self._accumulate(transactions)
+        self._refresh()
+
+    def set_totals(self, total_income, total_expense, categories):
+        """
+        直接设置已汇总好的统计数据（如由月度汇总表读出的合计）
+
+        Args:
+            total_income: 总收入
+            total_expense: 总支出
+            categories: {分类ID: (收入, 支出, 笔数, 最小金额, 最大金额)}，
+                最值未知时为None；retract()据笔数判断分类是否已无交易
+
+        汇总结果没有逐笔金额，之后移出最小或最大金额时最值变为None
+        """
+        self._income = _ExactSum([total_income])
+        self._expense = _ExactSum([total_expense])
+        self._categories = {cat_id: _CategoryTotals.from_totals(*totals)
+                            for cat_id, totals in categories.items()}
+        self._refresh()
+
+    def apply(self, transaction):
+        """
+        计入一笔交易，O(1)
+
+        结果与对全部交易重新calculate()完全相同
+        """
+        amount = transaction.amount
+        is_income = transaction.type == TransactionType.INCOME
+        (self._income if is_income else self._expense).add(amount)
+        entry = self._categories.get(transaction.category_id)
+        if entry is None:
+            entry = self._categories[transaction.category_id] = \
+                _CategoryTotals(self.track_extremes)
+        entry.add(amount, is_income)
+        self._refresh_category(transaction.category_id, entry)
+        if not self.transaction_count:
+            self.min_amount = self.max_amount = amount
+        elif self.min_amount is not None:
+            self.min_amount = min(self.min_amount, amount)
+            self.max_amount = max(self.max_amount, amount)
+        self.transaction_count += 1
+        self._refresh_totals()
+
+    def retract(self, transaction):
+        """
+        移出一笔之前计入的交易
+
+        合计和笔数O(1)，与重新calculate()完全相同。移出的恰好是最小或最大
+        金额时，跟踪最值的统计重新确定最值，开销与分类数和该分类不同金额的
+        个数成正比；不跟踪时最值变为None。交易修改时先用修改前的内容
+        retract()，再用修改后的内容apply()
+        """
+        entry = self._categories.get(transaction.category_id)
+        if entry is None:
+            raise ValueError(f"分类{transaction.category_id}没有可移出的交易")
+        amount = transaction.amount
+        is_income = transaction.type == TransactionType.INCOME
+        (self._income if is_income else self._expense).sub(amount)
+        entry.remove(amount, is_income)
+        if entry.count:
+            self._refresh_category(transaction.category_id, entry)
+        else:
+            # 分类下已没有交易，与重新计算的结果一样不再列出
+            del self._categories[transaction.category_id]
+            for data in self._category_dicts():
+                data.pop(transaction.category_id, None)
+        self.transaction_count -= 1
+        if amount == self.min_amount or amount == self.max_amount:
+            self._refresh_extremes()
+        self._refresh_totals()
+
+    def merge(self, other):
+        """
+        合并另一份统计（如分块或在其他进程中计算的部分结果）
+
+        Args:
+            other: Statistics对象，合并后不应再单独修改
+
+        Returns:
+            self，合并结果与对两部分交易一起calculate()完全相同
+        """
+        self._income.merge(other._income)
+        self._expense.merge(other._expense)
+        for cat_id, totals in other._categories.items():
+            entry = self._categories.get(cat_id)
+            if entry is None:
+                entry = self._categories[cat_id] = \
+                    _CategoryTotals(self.track_extremes)
+            entry.merge(totals)
+        self._refresh()
+        return self
+
+    def _accumulate(self, transactions):
+        """逐条计入交易，按分类累加收入和支出"""
+        categories = {}
+        income_type = TransactionType.INCOME
+        track_extremes = self.track_extremes
+
         for trans in transactions:
-            if trans.type == TransactionType.INCOME:
-                self.total_income += trans.amount
-            else:
-                self.total_expense += trans.amount
-                
-            cat_id = trans.category_id
-            if cat_id not in self.category_data:
-                self.category_data[cat_id] = 0.0
-            self.category_data[cat_id] += trans.amount
-        
+            entry = categories.get(trans.category_id)
+            if entry is None:
+                entry = categories[trans.category_id] = \
+                    _CategoryTotals(track_extremes)
+            entry.add(trans.amount, trans.type == income_type)
+
+        # 总收入、总支出由各分类的累加器合并，与分类数成正比
+        self._income = _ExactSum()
+        self._expense = _ExactSum()
+        for entry in categories.values():
+            self._income.merge(entry.income)
+            self._expense.merge(entry.expense)
+        self._categories = categories
+
+    def _category_dicts(self):
+        """按分类ID索引的各项统计"""
+        return (self.category_data, self.category_counts, self.category_income,
+                self.category_expense, self.category_min, self.category_max,
+                self.category_mean)
+
+    def _clear_categories(self):
+        """清空各分类的统计"""
+        for data in self._category_dicts():
+            data.clear()
+
+    def _publish_category(self, cat_id, total, count, income, expense,
+                          minimum, maximum):
+        """设置一个分类的各项统计"""
+        self.category_data[cat_id] = total
+        self.category_counts[cat_id] = count
+        self.category_income[cat_id] = income
+        self.category_expense[cat_id] = expense
+        self.category_min[cat_id] = minimum
+        self.category_max[cat_id] = maximum
+        self.category_mean[cat_id] = total / count if count else 0.0
+
+    def _refresh_category(self, cat_id, entry):
+        """由累加器更新一个分类的统计"""
+        self._publish_category(cat_id, entry.total(), entry.count,
+                               entry.income.value(), entry.expense.value(),
+                               entry.minimum, entry.maximum)
+
+    def _refresh_extremes(self):
+        """由各分类重新确定全部交易的最值，有分类最值未知时也未知"""
+        minimums = [entry.minimum for entry in self._categories.values()]
+        if not minimums or None in minimums:
+            self.min_amount = self.max_amount = None
+        else:
+            self.min_amount = min(minimums)
+            self.max_amount = max(entry.maximum
+                                  for entry in self._categories.values())
+
+    def _refresh_totals(self):
+        """由累加器更新收入、支出和余额"""
+        self.total_income = self._income.value()
+        self.total_expense = self._expense.value()
+        self._refresh_balance()
+
+    def _refresh_balance(self):
+        """更新余额和平均金额"""
         self.balance = self.total_income - self.total_expense
+        self.mean_amount = ((self.total_income + self.total_expense)
+                            / self.transaction_count
+                            if self.transaction_count else 0.0)
+
+    def _refresh(self):
+        """由累加器更新全部统计数据"""
+        self._clear_categories()
+        for cat_id, entry in self._categories.items():
+            self._refresh_category(cat_id, entry)
+        self.transaction_count = sum(entry.count
+                                     for entry in self._categories.values())
+        self._refresh_extremes()
+        self._refresh_totals()
+
     def get_balance(self):
         """获取余额"""
-        return self.balance
\ No newline at end of file
+        return self.balance
@@ -1,7 +1,40 @@
 """交易记录模型"""
-from datetime import datetime
+import calendar
+import math
+from datetime import datetime, timedelta
 from enum import Enum
 
+# 整数时间戳的起点（不带时区，与SQLite的unixepoch一致）
+EPOCH = datetime(1970, 1, 1)
+
+
+def to_cents(amount):
+    """
+    金额转换为整数分，四舍五入（0.5远离零方向，与SQLite的ROUND一致）
+    
+    Raises:
+        ValueError: 金额为无穷大或NaN
+    """
+    if not math.isfinite(amount):
+        raise ValueError(f"金额无效: {amount}")
+    cents = math.floor(abs(amount) * 100 + 0.5)
+    return -cents if amount < 0 else cents
+
+
+def from_cents(cents):
+    """整数分转换为金额"""
+    return cents / 100
+
+
+def to_timestamp(date):
+    """日期转换为整数秒时间戳（舍去秒以下部分）"""
+    return calendar.timegm(date.timetuple())
+
+
+def from_timestamp(timestamp):
+    """整数秒时间戳转换为日期"""
+    return EPOCH + timedelta(seconds=timestamp)
+
 
 class TransactionType(Enum):
     """交易类型枚举"""
@@ -12,6 +45,9 @@ class TransactionType(Enum):
 class Transaction:
     """交易记录类 - 对应UML类图中的Transaction类"""
     
+    # 不为每个实例创建__dict__，大量交易驻留内存时显著节省空间
+    __slots__ = ('id', 'amount', 'type', 'category_id', 'date', 'note')
+    
     def __init__(self, transaction_id=None, amount=0.0, 
                  trans_type=TransactionType.EXPENSE,
                  category_id=None, date=None, note=""):
@@ -45,6 +81,24 @@ class Transaction:
         """获取日期 - 对应UML中的getDate()方法"""
         return self.date
     
+    @property
+    def amount_cents(self):
+        """金额（整数分）"""
+        return to_cents(self.amount)
+    
+    @amount_cents.setter
+    def amount_cents(self, cents):
+        self.amount = from_cents(cents)
+    
+    @property
+    def timestamp(self):
+        """日期（整数秒时间戳）"""
+        return to_timestamp(self.date)
+    
+    @timestamp.setter
+    def timestamp(self, value):
+        self.date = from_timestamp(value)
+    
     def to_dict(self):
         """转换为字典用于数据库存储"""
         return {
@@ -247,7 +247,8 @@ class MainView:
             self.root, 
             self.trans_mgr, 
             self.cat_mgr,
-            export_mgr
+            export_mgr,
+            self.stats_mgr
         )
     
     def delete_selected(self):
@@ -8,7 +8,10 @@ from models.transaction import TransactionType
 class QueryView:
     """查询界面类"""
     
-    def __init__(self, parent, trans_mgr, cat_mgr, export_mgr):
+    # 结果列表每页显示的条数
+    PAGE_SIZE = 200
+    
+    def __init__(self, parent, trans_mgr, cat_mgr, export_mgr, stats_mgr):
         """
         初始化查询窗口
         
@@ -17,17 +20,22 @@ class QueryView:
             trans_mgr: 交易管理器
             cat_mgr: 分类管理器
             export_mgr: 导出管理器
+            stats_mgr: 统计管理器，用于计算查询结果的收支合计
         """
         self.trans_mgr = trans_mgr
         self.cat_mgr = cat_mgr
         self.export_mgr = export_mgr
+        self.stats_mgr = stats_mgr
         
         self.window = tk.Toplevel(parent)
         self.window.title("高级查询")
         self.window.geometry("750x600")
         self.window.transient(parent)
         
-        self.query_results = []
+        # 当前查询条件、结果数和下一页的起点，用于分页加载和导出
+        self.filters = {}
+        self.result_count = 0
+        self.next_key = None
         self.setup_ui()
     
     def setup_ui(self):
@@ -122,6 +130,18 @@ class QueryView:
         self.keyword_entry.grid(row=row, column=1, columnspan=3, 
                                sticky=tk.EW, padx=5, pady=5)
         
+        # 全文检索语法：关键词按FTS5表达式解析
+        row += 1
+        self.fts_var = tk.BooleanVar(value=False)
+        fts_check = tk.Checkbutton(
+            condition_frame,
+            text='全文检索语法（"短语"、前缀*、AND/OR/NOT）',
+            variable=self.fts_var
+        )
+        fts_check.grid(row=row, column=1, columnspan=3, sticky=tk.W, padx=5)
+        if not self.trans_mgr.database.has_fts:
+            fts_check.config(state=tk.DISABLED)
+        
         # 查询按钮
         row += 1
         button_frame = tk.Frame(condition_frame)
@@ -187,10 +207,22 @@ class QueryView:
         )
         self.result_listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         scrollbar.config(command=self.result_listbox.yview)
+        
+        self.more_button = tk.Button(
+            self.window,
+            text="⬇ 加载更多",
+            command=self.load_more,
+            font=("Arial", 10),
+            state=tk.DISABLED
+        )
+        self.more_button.pack(pady=(0, 10))
     
     def do_query(self):
         """执行查询"""
         self.result_listbox.delete(0, tk.END)
+        self.result_count = 0
+        self.next_key = None
+        self.more_button.config(state=tk.DISABLED)
         
         try:
             # 解析条件
@@ -216,6 +248,9 @@ class QueryView:
                 max_amount = float(self.max_amount_entry.get())
             
             keyword = self.keyword_entry.get()
+            note_match = None
+            if self.fts_var.get():
+                note_match, keyword = keyword, None
             
             # 交易类型
             trans_type = None
@@ -233,42 +268,29 @@ class QueryView:
                         break
             
             # 执行查询
-            self.query_results = self.trans_mgr.query(
-                start_date=start_date,
-                end_date=end_date,
-                category_id=category_id,
-                min_amount=min_amount,
-                max_amount=max_amount,
-                keyword=keyword,
-                trans_type=trans_type
-            )
+            self.filters = {
+                'start_date': start_date,
+                'end_date': end_date,
+                'category_id': category_id,
+                'min_amount': min_amount,
+                'max_amount': max_amount,
+                'keyword': keyword,
+                'trans_type': trans_type,
+                'note_match': note_match,
+            }
+            # 记录数和收支合计由数据库聚合得出，不遍历结果
+            stats = self.stats_mgr.calculate(self.filters)
+            self.result_count = stats.transaction_count
             
             # 显示结果
-            if self.query_results:
-                total_income = sum(
-                    t.amount for t in self.query_results 
-                    if t.type == TransactionType.INCOME
-                )
-                total_expense = sum(
-                    t.amount for t in self.query_results 
-                    if t.type == TransactionType.EXPENSE
-                )
-                
+            if self.result_count:
                 self.stats_label.config(
-                    text=f"查询结果: {len(self.query_results)}条记录  "
-                         f"收入: ¥{total_income:.2f}  "
-                         f"支出: ¥{total_expense:.2f}"
+                    text=f"查询结果: {self.result_count}条记录  "
+                         f"收入: ¥{stats.total_income:.2f}  "
+                         f"支出: ¥{stats.total_expense:.2f}"
                 )
                 
-                for trans in self.query_results:
-                    cat = self.cat_mgr.get_category_by_id(trans.category_id)
-                    cat_name = cat.name if cat else '未分类'
-                    sign = '+' if trans.type == TransactionType.INCOME else '-'
-                    
-                    line = (f"{trans.date.strftime('%Y-%m-%d')}  "
-                           f"{cat_name:8s}  {sign}¥{trans.amount:8.2f}  "
-                           f"{trans.note}")
-                    self.result_listbox.insert(tk.END, line)
+                self.load_more()
             else:
                 self.stats_label.config(text="查询结果: 0条记录")
                 self.result_listbox.insert(tk.END, "未找到符合条件的记录")
@@ -276,6 +298,29 @@ class QueryView:
         except Exception as e:
             messagebox.showerror("错误", f"查询失败: {str(e)}")
     
+    def load_more(self):
+        """按页追加显示查询结果，每页PAGE_SIZE条"""
+        try:
+            page, self.next_key = self.trans_mgr.query_page(
+                self.filters, limit=self.PAGE_SIZE, after_key=self.next_key
+            )
+        except Exception as e:
+            messagebox.showerror("错误", f"查询失败: {str(e)}")
+            return
+        
+        for trans in page:
+            cat = self.cat_mgr.get_category_by_id(trans.category_id)
+            cat_name = cat.name if cat else '未分类'
+            sign = '+' if trans.type == TransactionType.INCOME else '-'
+            
+            line = (f"{trans.date.strftime('%Y-%m-%d')}  "
+                   f"{cat_name:8s}  {sign}¥{trans.amount:8.2f}  "
+                   f"{trans.note}")
+            self.result_listbox.insert(tk.END, line)
+        
+        state = tk.NORMAL if self.next_key is not None else tk.DISABLED
+        self.more_button.config(state=state)
+    
     def reset_conditions(self):
         """重置查询条件"""
         self.start_date_entry.delete(0, tk.END)
@@ -285,14 +330,19 @@ class QueryView:
         self.min_amount_entry.delete(0, tk.END)
         self.max_amount_entry.delete(0, tk.END)
         self.keyword_entry.delete(0, tk.END)
+        self.fts_var.set(False)
         self.type_var.set("全部")
         self.category_var.set("全部")
         self.result_listbox.delete(0, tk.END)
         self.stats_label.config(text="查询结果: 0条记录")
+        self.filters = {}
+        self.result_count = 0
+        self.next_key = None
+        self.more_button.config(state=tk.DISABLED)
     
     def export_results(self):
         """导出查询结果"""
-        if not self.query_results:
+        if not self.result_count:
             messagebox.showwarning("提示", "没有可导出的数据")
             return
         
@@ -302,7 +352,7 @@ class QueryView:
         )
         
         if filename:
-            if self.export_mgr.export_to_csv(filename, self.query_results):
-                messagebox.showinfo("成功", f"已导出 {len(self.query_results)} 条记录")
+            if self.export_mgr.export_to_csv(filename, filters=self.filters):
+                messagebox.showinfo("成功", f"已导出 {self.result_count} 条记录")
             else:
                 messagebox.showerror("错误", "导出失败")
\ No newline at end of file
@@ -135,29 +135,14 @@ class StatisticsView:
     def show_yearly_stats(self):
         """显示年度统计"""
         now = datetime.now()
-        
-        # 计算年度统计
-        start_date = datetime(now.year, 1, 1)
-        end_date = datetime(now.year, 12, 31, 23, 59, 59)
-        transactions = self.trans_mgr.query(
-            start_date=start_date,
-            end_date=end_date
-        )
-        
-        from models.statistics import Statistics
-        stats = Statistics()
-        stats.calculate(transactions)
+        stats = self.stats_mgr.calculate_yearly(now.year)
         
         title = f"📅 {now.year}年统计"
         self.display_stats(stats, title)
     
     def show_all_stats(self):
         """显示全部统计"""
-        transactions = self.trans_mgr.get_transactions()
-        
-        from models.statistics import Statistics
-        stats = Statistics()
-        stats.calculate(transactions)
+        stats = self.stats_mgr.calculate_all()
         
         title = "📅 全部数据统计"
         self.display_stats(stats, title)
@@ -175,7 +160,7 @@ class StatisticsView:
         summary += f"💰 总收入: ¥{stats.total_income:.2f}\n"
         summary += f"💸 总支出: ¥{stats.total_expense:.2f}\n"
         summary += f"💵 净余额: ¥{stats.get_balance():.2f}\n"
-        summary += f"📊 交易笔数: {self.trans_mgr.get_transaction_count()}笔"
+        summary += f"📊 交易笔数: {stats.transaction_count}笔"
         
         self.summary_label.config(text=summary)
         
@@ -185,9 +170,10 @@ class StatisticsView:
         
         if stats.category_data:
             # 表头
-            header = f"{'分类':10s}  {'金额':>12s}  {'占比':>8s}  {'笔数':>6s}\n"
+            header = (f"{'分类':10s}  {'金额':>12s}  {'占比':>8s}  {'笔数':>6s}  "
+                      f"{'均额':>10s}\n")
             self.stats_text.insert(tk.END, header)
-            self.stats_text.insert(tk.END, "-" * 50 + "\n")
+            self.stats_text.insert(tk.END, "-" * 62 + "\n")
             
             # 分类数据（按金额降序）
             sorted_cats = sorted(
@@ -196,18 +182,22 @@ class StatisticsView:
                 reverse=True
             )
             
+            # 笔数、收支和均额都来自同一次统计，与显示的时间范围一致
             for cat_id, amount in sorted_cats:
                 cat = self.cat_mgr.get_category_by_id(cat_id)
                 if cat:
-                    # 计算占比
-                    percentage = (amount / stats.total_expense * 100 
-                                if stats.total_expense > 0 else 0)
+                    # 计算占比：收入分类占总收入，支出分类占总支出
+                    if cat.type == TransactionType.INCOME:
+                        part, total = stats.category_income[cat_id], stats.total_income
+                    else:
+                        part, total = stats.category_expense[cat_id], stats.total_expense
+                    percentage = part / total * 100 if total > 0 else 0
                     
-                    # 计算笔数
-                    count = sum(1 for t in self.trans_mgr.get_transactions()
-                              if t.category_id == cat_id)
+                    count = stats.category_counts[cat_id]
+                    mean = stats.category_mean[cat_id]
                     
-                    line = f"{cat.icon} {cat.name:8s}  ¥{amount:10.2f}  {percentage:6.1f}%  {count:4d}笔\n"
+                    line = (f"{cat.icon} {cat.name:8s}  ¥{amount:10.2f}  "
+                            f"{percentage:6.1f}%  {count:4d}笔  ¥{mean:8.2f}\n")
                     self.stats_text.insert(tk.END, line)
         else:
             self.stats_text.insert(tk.END, "暂无数据")
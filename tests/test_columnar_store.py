@@ -0,0 +1,190 @@
+# tests/test_columnar_store.py
+"""
+列式存储单元测试
+"""
+import pytest
+from datetime import datetime, timedelta
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from database.database import Database
+from managers.transaction_manager import TransactionManager
+from managers.columnar_store import ColumnarStore, np
+from models.statistics import Statistics
+from models.transaction import Transaction, TransactionType
+
+
+CONDITIONS = [
+    {},
+    {'start_date': datetime(2024, 3, 10)},
+    {'start_date': datetime(2024, 3, 5), 'end_date': datetime(2024, 3, 20)},
+    {'category_id': 2},
+    {'category_id': 99},
+    {'min_amount': 0.3, 'max_amount': 7.1},
+    {'keyword': 'LUNCH'},
+    {'keyword': '打车', 'trans_type': TransactionType.EXPENSE},
+    {'trans_type': TransactionType.INCOME, 'end_date': datetime(2024, 3, 15)},
+]
+
+
+@pytest.fixture
+def managers():
+    """列表后端和列式后端各一个，数据相同"""
+    list_manager = TransactionManager(Database(':memory:'))
+    columnar_manager = TransactionManager(Database(':memory:'),
+                                          backend='columnar')
+    base_date = datetime(2024, 3, 1, 9, 30, 0)
+    for i in range(60):
+        trans = dict(
+            amount=round(0.1 * (i % 17) + i % 5, 2),
+            trans_type=(TransactionType.INCOME if i % 4 == 0
+                        else TransactionType.EXPENSE),
+            category_id=i % 5 + 1,
+            date=base_date + timedelta(hours=i * 9),
+            note=["Lunch 午餐", "打车", "工资", ""][i % 4]
+        )
+        list_manager.add_transaction(Transaction(**trans))
+        columnar_manager.add_transaction(Transaction(**trans))
+    yield list_manager, columnar_manager
+    list_manager.database.close()
+    columnar_manager.database.close()
+
+
+class TestColumnarStore:
+    """列式存储测试类"""
+
+    def test_columnar_query_matches_list(self, managers):
+        """
+        测试用例 TC-CS-01：列式后端的查询和统计结果与列表后端完全一致
+        """
+        list_manager, columnar_manager = managers
+
+        for condition in CONDITIONS:
+            expected = list_manager.query(**condition)
+            actual = columnar_manager.query(**condition)
+            assert [t.id for t in actual] == [t.id for t in expected]
+
+            expected_stats = Statistics()
+            expected_stats.calculate(expected)
+            actual_stats = Statistics()
+            actual_stats.calculate(actual)
+            assert actual_stats.total_income == expected_stats.total_income
+            assert actual_stats.total_expense == expected_stats.total_expense
+            assert actual_stats.category_data == expected_stats.category_data
+            for name in ('transaction_count', 'min_amount', 'max_amount',
+                         'category_counts', 'category_income',
+                         'category_expense', 'category_min', 'category_max'):
+                assert getattr(actual_stats, name) == getattr(expected_stats,
+                                                              name)
+
+    def test_columnar_store_rebuilt_after_changes(self, managers):
+        """
+        测试用例 TC-CS-02：增删改后列式存储同步更新，结果保持一致
+        """
+        list_manager, columnar_manager = managers
+        columnar_manager.query()
+
+        for manager in managers:
+            manager.delete_transaction(3)
+            trans = manager.get_transaction(5)
+            manager.update_transaction(Transaction(
+                transaction_id=5, amount=123.45, trans_type=trans.type,
+                category_id=2, date=trans.date, note="修改"))
+
+        for condition in CONDITIONS:
+            assert ([t.id for t in columnar_manager.query(**condition)] ==
+                    [t.id for t in list_manager.query(**condition)])
+
+    @pytest.mark.parametrize('use_numpy', [False, True])
+    def test_numpy_and_python_implementations_agree(self, managers, use_numpy):
+        """
+        测试用例 TC-CS-03：NumPy实现与纯Python实现结果相同
+        """
+        if use_numpy and np is None:
+            pytest.skip("未安装NumPy")
+        list_manager, _ = managers
+        transactions = list_manager.query()
+        store = ColumnarStore(transactions, use_numpy=use_numpy)
+        reference = ColumnarStore(transactions, use_numpy=False)
+
+        for condition in CONDITIONS:
+            positions = store.select(**condition)
+            expected = reference.select(**condition)
+            assert store.ids_at(positions) == reference.ids_at(expected)
+            assert store.aggregate(positions) == reference.aggregate(expected)
+
+    @pytest.mark.parametrize('use_numpy', [False, True])
+    def test_store_updated_row_by_row(self, managers, use_numpy):
+        """
+        测试用例 TC-CS-04：单笔增删改时列式存储逐行更新，与重新构建的结果相同
+        预期：不重建存储；此前返回的查询结果仍按原数据汇总
+        """
+        if use_numpy and np is None:
+            pytest.skip("未安装NumPy")
+        _, manager = managers
+        manager._columnar = ColumnarStore(manager.query(), use_numpy=use_numpy)
+        before = manager.query(category_id=2)
+        before_totals = before.aggregate()
+
+        manager.add_transaction(Transaction(
+            amount=8.5, trans_type=TransactionType.EXPENSE, category_id=7,
+            date=datetime(2024, 3, 2), note="新备注"))
+        manager.delete_transaction(10)
+        trans = manager.get_transaction(12)
+        manager.update_transaction(Transaction(
+            transaction_id=12, amount=0.75, trans_type=TransactionType.INCOME,
+            category_id=2, date=trans.date - timedelta(days=3), note="Lunch"))
+
+        store = manager._columnar
+        assert store is not None
+        rebuilt = ColumnarStore(
+            [manager.get_transaction(trans_id)
+             for _, trans_id in manager._date_keys], use_numpy=use_numpy)
+        assert store.ids_at(range(len(store))) == \
+            rebuilt.ids_at(range(len(rebuilt)))
+        for condition in CONDITIONS + [{'category_id': 7},
+                                       {'keyword': '新备注'}]:
+            assert (store.ids_at(store.select(**condition)) ==
+                    rebuilt.ids_at(rebuilt.select(**condition)))
+            assert (store.aggregate(store.select(**condition)) ==
+                    rebuilt.aggregate(rebuilt.select(**condition)))
+        assert before.aggregate() == before_totals
+
+    @pytest.mark.parametrize('use_numpy', [False, True])
+    def test_aggregate_is_exact(self, use_numpy):
+        """
+        测试用例 TC-CS-05：汇总结果是精确和舍入一次，与math.fsum相同
+        输入：量级相差很大、逐次累加会丢失精度的金额
+        """
+        import math
+
+        if use_numpy and np is None:
+            pytest.skip("未安装NumPy")
+        amounts = [0.1] * 10 + [1e15, 1e-7, -1e15, 3.3333, 2 ** -60] * 7
+        base_date = datetime(2024, 1, 1)
+        transactions = [
+            Transaction(i + 1, amount,
+                        TransactionType.INCOME if i % 3 == 0
+                        else TransactionType.EXPENSE,
+                        i % 4 + 1, base_date + timedelta(minutes=i), "")
+            for i, amount in enumerate(amounts)
+        ]
+        store = ColumnarStore(transactions, use_numpy=use_numpy)
+        total_income, total_expense, categories = \
+            store.aggregate(store.select())
+
+        def exact(predicate):
+            return math.fsum(t.amount for t in transactions if predicate(t))
+
+        assert total_income == exact(
+            lambda t: t.type == TransactionType.INCOME)
+        assert total_expense == exact(
+            lambda t: t.type == TransactionType.EXPENSE)
+        for cat_id, (total, count, income, expense,
+                     minimum, maximum) in categories.items():
+            group = [t.amount for t in transactions if t.category_id == cat_id]
+            assert total == math.fsum(group)
+            assert count == len(group)
+            assert (minimum, maximum) == (min(group), max(group))
@@ -0,0 +1,445 @@
+# tests/test_database.py
+"""
+数据库模块单元测试
+"""
+import pytest
+import sqlite3
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from database.database import Database
+from database.migrations import MIGRATIONS
+from models.transaction import to_cents
+
+
+def get_index_names(conn):
+    """获取交易表上的索引名"""
+    cursor = conn.execute(
+        "SELECT name FROM sqlite_master "
+        "WHERE type = 'index' AND tbl_name = 'transactions'"
+    )
+    return {row[0] for row in cursor.fetchall()}
+
+
+class TestDatabase:
+    """数据库测试类"""
+
+    def test_new_database_schema_version(self):
+        """
+        测试用例 TC-DB-01：新数据库迁移到最新版本
+        """
+        db = Database(':memory:')
+
+        assert db.get_schema_version() == MIGRATIONS[-1][0]
+        indexes = get_index_names(db.conn)
+        assert 'idx_transactions_date' in indexes
+        assert 'idx_transactions_category_date' in indexes
+        assert 'idx_transactions_type_date' in indexes
+        db.close()
+
+    def test_upgrade_existing_database(self, tmp_path):
+        """
+        测试用例 TC-DB-02：旧版本数据库原地升级且不丢失数据
+        """
+        db_path = str(tmp_path / 'old.db')
+        conn = sqlite3.connect(db_path)
+        conn.execute('''
+            CREATE TABLE transactions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                amount REAL NOT NULL,
+                type TEXT NOT NULL,
+                category_id INTEGER,
+                date TEXT NOT NULL,
+                note TEXT
+            )
+        ''')
+        conn.execute(
+            "INSERT INTO transactions (amount, type, category_id, date, note) "
+            "VALUES (12.5, '支出', 1, '2024-03-01 08:30:00', '早餐')"
+        )
+        conn.commit()
+        conn.close()
+
+        db = Database(db_path)
+        rows = db.load('transactions')
+
+        assert len(rows) == 1, "升级后数据不应丢失"
+        assert rows[0]['note'] == '早餐'
+        assert db.get_schema_version() == MIGRATIONS[-1][0]
+        assert 'idx_transactions_date' in get_index_names(db.conn)
+        db.close()
+
+    def test_reopen_does_not_rerun_migrations(self, tmp_path):
+        """
+        测试用例 TC-DB-03：重复打开数据库不重复执行迁移
+        """
+        db_path = str(tmp_path / 'reopen.db')
+        Database(db_path).close()
+
+        db = Database(db_path)
+        count = db.conn.execute(
+            'SELECT COUNT(*) FROM schema_version'
+        ).fetchone()[0]
+
+        assert count == len(MIGRATIONS)
+        db.close()
+
+    def test_save_many_inserts_batch(self):
+        """
+        测试用例 TC-DB-04：批量保存
+        """
+        db = Database(':memory:')
+        rows = [
+            {'amount': float(i), 'type': '支出', 'category_id': 1,
+             'date': '2024-01-01 12:00:00', 'note': f'批量{i}'}
+            for i in range(100)
+        ]
+
+        count = db.save_many('transactions', rows)
+
+        assert count == 100
+        assert len(db.load('transactions')) == 100
+        db.close()
+
+    def test_transaction_rollback_on_error(self, tmp_path):
+        """
+        测试用例 TC-DB-05：工作单元出错时整体回滚
+        """
+        db = Database(str(tmp_path / 'unit.db'))
+        data = {'amount': 10.0, 'type': '支出', 'category_id': 1,
+                'date': '2024-01-01 12:00:00', 'note': '回滚'}
+
+        with pytest.raises(RuntimeError):
+            with db.transaction():
+                db.save('transactions', data)
+                db.save('transactions', data)
+                raise RuntimeError("中途失败")
+
+        assert db.load('transactions') == []
+        db.close()
+
+    def test_transaction_commits_once(self, tmp_path):
+        """
+        测试用例 TC-DB-06：嵌套工作单元在最外层统一提交
+        """
+        db_path = str(tmp_path / 'unit.db')
+        db = Database(db_path)
+        data = {'amount': 10.0, 'type': '支出', 'category_id': 1,
+                'date': '2024-01-01 12:00:00', 'note': '提交'}
+
+        with db.transaction():
+            db.save('transactions', data)
+            with db.transaction():
+                db.save('transactions', data)
+            # 外层尚未结束，其他连接看不到未提交的数据
+            other = sqlite3.connect(db_path)
+            assert other.execute(
+                'SELECT COUNT(*) FROM transactions'
+            ).fetchone()[0] == 0
+            other.close()
+
+        assert len(db.load('transactions')) == 2
+        db.close()
+
+    def test_iter_load_streams_in_batches(self):
+        """
+        测试用例 TC-DB-07：流式加载按批读取并支持行转换函数
+        """
+        db = Database(':memory:')
+        db.save_many('transactions', [
+            {'amount': float(i), 'type': '支出', 'category_id': 1,
+             'date': '2024-01-01 12:00:00', 'note': ''}
+            for i in range(25)
+        ])
+
+        rows = db.iter_load('transactions', 'amount >= ?', (10,),
+                            batch_size=4, columns='id, amount',
+                            order_by='id')
+        first = next(rows)
+        assert first == (11, 10.0)
+        assert len(list(rows)) == 14
+
+        amounts = list(db.iter_load(
+            'transactions', batch_size=7,
+            row_factory=lambda cursor, row: row[1]
+        ))
+        assert amounts == [float(i) for i in range(25)]
+        db.close()
+
+    def test_concurrent_readers_not_blocked_by_writer(self, tmp_path):
+        """
+        测试用例 TC-DB-08：并发模式下工作线程读取不被写事务阻塞
+        """
+        import threading
+
+        db = Database(str(tmp_path / 'wal.db'), concurrent=True)
+        data = {'amount': 10.0, 'type': '支出', 'category_id': 1,
+                'date': '2024-01-01 12:00:00', 'note': '并发'}
+        db.save('transactions', data)
+
+        assert db.conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+
+        counts = []
+        with db.transaction():
+            db.save('transactions', data)
+            # 写线程自己能读到未提交的数据
+            assert len(db.load('transactions')) == 2
+
+            worker = threading.Thread(
+                target=lambda: counts.append(len(db.load('transactions')))
+            )
+            worker.start()
+            worker.join(timeout=5)
+
+        assert counts == [1], "工作线程只应读到已提交的数据"
+        assert len(db.load('transactions')) == 2
+        db.close()
+
+    def test_convert_existing_rows_to_compact(self, tmp_path):
+        """
+        测试用例 TC-DB-09：已有数据转换为紧凑整数存储格式
+        """
+        db_path = str(tmp_path / 'compact.db')
+        db = Database(db_path)
+        db.save('transactions', {'amount': 12.34, 'type': '支出',
+                                 'category_id': 1,
+                                 'date': '2024-03-01 08:30:00', 'note': '早餐'})
+        db.save('transactions', {'amount': 0.1, 'type': '收入',
+                                 'category_id': 6,
+                                 'date': '2024-03-02 09:00:00', 'note': ''})
+        db.delete('transactions', 2)
+        db.close()
+
+        db = Database(db_path, storage_format='compact')
+        row = db.conn.execute(
+            'SELECT id, amount, date, typeof(amount), typeof(date) '
+            'FROM transactions'
+        ).fetchone()
+
+        assert row == (1, 1234, 1709281800, 'integer', 'integer')
+        assert 'idx_transactions_date' in get_index_names(db.conn)
+        # 自增序列保留，已删除的ID不会被重新分配
+        new_id = db.save('transactions', {'amount': 1.0, 'type': '支出',
+                                          'category_id': 1,
+                                          'date': '2024-03-03 10:00:00'})
+        assert new_id == 3
+        db.close()
+
+        # 不指定格式时保持现有格式
+        db = Database(db_path)
+        assert db.codec.name == 'compact'
+        db.close()
+
+    def test_note_fts_follows_changes(self, tmp_path):
+        """
+        测试用例 TC-DB-10：备注全文索引随增删改同步，存储格式转换后仍然有效
+        """
+        db = Database(str(tmp_path / 'fts.db'))
+        if not db.has_fts:
+            pytest.skip("SQLite不支持FTS5 trigram")
+        data = {'amount': 10.0, 'type': '支出', 'category_id': 1,
+                'date': '2024-01-01 12:00:00', 'note': '公司楼下午餐费用'}
+        first = db.save('transactions', data)
+        second = db.save('transactions', dict(data, note='Taxi to airport'))
+
+        assert db.match_notes('"午餐费"') == {first}
+        assert db.match_notes('"TAXI"') == {second}
+
+        db.update('transactions', first, {'note': '晚餐费用'})
+        db.delete('transactions', second)
+        assert db.match_notes('"午餐费"') == set()
+        assert db.match_notes('"晚餐费"') == {first}
+
+        db.convert_storage('compact')
+        third = db.save('transactions', dict(data, note='晚餐费用AA'))
+        assert db.match_notes('"晚餐费"') == {first, third}
+        db.close()
+
+    def test_rebuild_fts_for_existing_database(self, tmp_path):
+        """
+        测试用例 TC-DB-11：为没有全文索引的旧数据库重建索引
+        """
+        db = Database(str(tmp_path / 'rebuild.db'))
+        if not db.has_fts:
+            pytest.skip("SQLite不支持FTS5 trigram")
+        db.save('transactions', {'amount': 10.0, 'type': '支出',
+                                 'category_id': 1,
+                                 'date': '2024-01-01 12:00:00',
+                                 'note': '超市购物'})
+        db.conn.execute('DROP TABLE transactions_fts')
+        db.conn.commit()
+
+        assert db.rebuild_fts()
+        assert db.match_notes('"超市购"') == {1}
+        db.close()
+
+    def test_text_date_decoding_matches_strptime(self):
+        """
+        测试用例 TC-DB-12：文本日期的快速解析与strptime结果一致，非法日期仍报错
+        """
+        from datetime import datetime
+        from database.storage import TextCodec, DATE_FORMAT
+        codec = TextCodec()
+        for value in ('2024-01-01 00:00:00', '2024-02-29 23:59:59',
+                      '1999-12-31 08:05:09'):
+            assert codec.decode_date(value) == datetime.strptime(
+                value, DATE_FORMAT)
+        for value in ('2024-02-30 00:00:00', '2024-01-01T00:00:00',
+                      '2024-01-01 24:00:00', '2024/01/01'):
+            with pytest.raises(ValueError):
+                codec.decode_date(value)
+
+    @pytest.mark.parametrize('storage_format', ['text', 'compact'])
+    def test_monthly_rollup_follows_changes(self, tmp_path, storage_format):
+        """
+        测试用例 TC-DB-13：月度汇总表随增删改同步，校验和重建可修复不一致
+        """
+        db = Database(str(tmp_path / 'rollup.db'),
+                      storage_format=storage_format)
+
+        def rollup():
+            # 合计按存储单位保存，换算为分后比较
+            return [(year, month, trans_type, category_id,
+                     to_cents(db.codec.decode_amount(total)), count)
+                    for year, month, trans_type, category_id, total, count
+                    in db.conn.execute(
+                        'SELECT year, month, type, category_id, total, count '
+                        'FROM monthly_rollup '
+                        'ORDER BY year, month, type, category_id')]
+
+        rows = [(0.1, '支出', 1, '2024-01-05 10:00:00'),
+                (0.2, '支出', 1, '2024-01-31 23:59:59'),
+                (1000.0, '收入', None, '2024-01-10 09:00:00'),
+                (19.99, '支出', 2, '2024-02-01 00:00:00')]
+        ids = [db.save('transactions', {'amount': amount, 'type': trans_type,
+                                        'category_id': category_id,
+                                        'date': date, 'note': ''})
+               for amount, trans_type, category_id, date in rows]
+        assert rollup() == [(2024, 1, '支出', 1, 30, 2),
+                            (2024, 1, '收入', None, 100000, 1),
+                            (2024, 2, '支出', 2, 1999, 1)]
+
+        db.update('transactions', ids[1], {'date': '2024-02-01 08:00:00',
+                                           'category_id': 2})
+        db.delete('transactions', ids[2])
+        assert rollup() == [(2024, 1, '支出', 1, 10, 1),
+                            (2024, 2, '支出', 2, 2019, 2)]
+        assert db.verify_rollup() == []
+
+        db.conn.execute("UPDATE monthly_rollup SET count = 5 WHERE month = 2")
+        db.conn.execute("DELETE FROM monthly_rollup WHERE month = 1")
+        db.conn.commit()
+        assert db.verify_rollup() == [(2024, 1, '支出', 1),
+                                      (2024, 2, '支出', 2)]
+        assert db.rebuild_rollup() == 2
+        assert db.verify_rollup() == []
+        db.close()
+
+    def test_monthly_rollup_keeps_sub_cent_amounts(self, tmp_path):
+        """
+        测试用例 TC-DB-14：文本格式的月度汇总不把每笔金额舍入到分
+        输入：三笔0.005和一笔0.0049的支出，随后修改、删除
+        预期：汇总合计与逐条求和一致（0.015而不是0.03），校验通过
+        """
+        db = Database(str(tmp_path / 'rollup.db'))
+        ids = [db.save('transactions', {'amount': amount, 'type': '支出',
+                                        'category_id': 1,
+                                        'date': '2024-03-05 10:00:00',
+                                        'note': ''})
+               for amount in (0.005, 0.005, 0.005, 0.0049)]
+
+        def total():
+            return db.conn.execute(
+                'SELECT total FROM monthly_rollup').fetchone()[0]
+
+        assert total() == pytest.approx(0.0199, abs=1e-12)
+        db.delete('transactions', ids[3])
+        assert total() == pytest.approx(0.015, abs=1e-12)
+        db.update('transactions', ids[0], {'amount': 0.123456})
+        assert total() == pytest.approx(0.133456, abs=1e-12)
+        assert db.verify_rollup() == []
+        db.close()
+
+    def test_immediate_transaction_locks_before_read(self, tmp_path):
+        """
+        测试用例 TC-DB-15：immediate工作单元开始时即取得写锁
+        预期：工作单元内读取next_id()后，其他连接无法抢先写入
+        """
+        db_path = str(tmp_path / 'immediate.db')
+        db = Database(db_path)
+        other = sqlite3.connect(db_path, timeout=0)
+        data = {'amount': 10.0, 'type': '支出', 'category_id': 1,
+                'date': '2024-01-01 12:00:00', 'note': '锁'}
+
+        with db.transaction(immediate=True):
+            first_id = db.next_id('transactions')
+            with pytest.raises(sqlite3.OperationalError):
+                other.execute(
+                    "INSERT INTO transactions (amount, type, category_id, "
+                    "date, note) VALUES (1.0, '支出', 1, "
+                    "'2024-01-01 00:00:00', '抢先')")
+            assert db.save('transactions', data) == first_id
+
+        other.close()
+        db.close()
+
+    def test_reader_connections_released_when_threads_exit(self, tmp_path):
+        """
+        测试用例 TC-DB-16：并发模式下工作线程结束后其只读连接被关闭
+        预期：大量短生命周期线程读取后，连接池中不残留它们的连接
+        """
+        import gc
+        import threading
+
+        db = Database(str(tmp_path / 'readers.db'), concurrent=True)
+        readers = []
+
+        def work():
+            reader = db.read_connection()
+            assert reader is db.read_connection()
+            readers.append(reader)
+            db.load('transactions')
+
+        for _ in range(20):
+            worker = threading.Thread(target=work)
+            worker.start()
+            worker.join(timeout=5)
+        gc.collect()
+
+        assert len(readers) == 20
+        assert db._readers == []
+        with pytest.raises(sqlite3.ProgrammingError):
+            readers[0].execute('SELECT 1')
+
+        # 仍存活的线程保留自己的连接，关闭数据库时一并关闭
+        main_reader = db.read_connection()
+        assert db._readers == [main_reader]
+        db.close()
+        with pytest.raises(sqlite3.ProgrammingError):
+            main_reader.execute('SELECT 1')
+
+    def test_verify_rollup_large_month(self):
+        """
+        测试用例 TC-DB-17：大量交易增删后校验不误报，真实的不一致仍能发现
+        输入：同一月份、分类的30000笔支出，删除一半
+        预期：REAL合计的累积舍入误差在相对误差范围内，校验通过；
+              汇总表被改动后报告该行
+        """
+        import random
+
+        db = Database(':memory:')
+        rng = random.Random(3)
+        db.save_many('transactions', (
+            {'amount': round(rng.uniform(0, 99999), 2), 'type': '支出',
+             'category_id': 1, 'date': '2024-01-15 10:00:00', 'note': ''}
+            for _ in range(30000)))
+        with db.transaction():
+            db.conn.execute('DELETE FROM transactions WHERE id % 2 = 0')
+        assert db.verify_rollup() == []
+
+        with db.transaction():
+            db.conn.execute('UPDATE monthly_rollup SET total = total * 1.001')
+        assert db.verify_rollup() == [(2024, 1, '支出', 1)]
+        db.close()
@@ -166,4 +166,187 @@ class TestStatistics:
         elapsed_time = time.time() - start_time
         
         assert elapsed_time < 1.0, f"处理时间过长：{elapsed_time}秒"
-        assert stats.total_expense == sum(range(1, 1001))
\ No newline at end of file
+        assert stats.total_expense == sum(range(1, 1001))
+    
+    def _mixed_transactions(self, count):
+        """生成金额带小数、收支混合的交易"""
+        return [
+            Transaction(amount=round(0.1 * (i % 97) + 0.2 + i * 0.01, 2),
+                       trans_type=(TransactionType.INCOME if i % 5 == 0
+                                   else TransactionType.EXPENSE),
+                       category_id=i % 4 + 1, date=datetime.now(), note=f"测试{i}")
+            for i in range(count)
+        ]
+    
+    def _assert_same(self, stats, expected):
+        """两份统计完全相同（逐位相等，不允许误差）"""
+        assert stats.total_income == expected.total_income
+        assert stats.total_expense == expected.total_expense
+        assert stats.balance == expected.balance
+        assert stats.category_data == expected.category_data
+    
+    def test_statistics_apply_retract(self):
+        """
+        测试用例 TC-ST-10：增量计入与移出
+        输入：逐笔apply()全部交易，再retract()其中一部分
+        预期：结果与对剩余交易重新calculate()逐位相同；分类全部移出后不再列出
+        """
+        trans_list = self._mixed_transactions(500)
+        stats = Statistics()
+        for trans in trans_list:
+            stats.apply(trans)
+        expected = Statistics()
+        expected.calculate(trans_list)
+        self._assert_same(stats, expected)
+        
+        removed = [t for t in trans_list if t.category_id == 2 or t.amount > 5]
+        for trans in removed:
+            stats.retract(trans)
+        remaining = [t for t in trans_list if t not in removed]
+        expected.calculate(remaining)
+        self._assert_same(stats, expected)
+        assert 2 not in stats.category_data
+    
+    def test_statistics_apply_after_calculate(self):
+        """
+        测试用例 TC-ST-11：计算后继续增量更新（对应交易的增、删、改）
+        """
+        trans_list = self._mixed_transactions(300)
+        stats = Statistics()
+        stats.calculate(trans_list[:200])
+        
+        # 新增
+        for trans in trans_list[200:]:
+            stats.apply(trans)
+        # 删除
+        stats.retract(trans_list[0])
+        # 修改：先移出旧内容，再计入新内容
+        old = trans_list[1]
+        new = Transaction(amount=0.3, trans_type=TransactionType.INCOME,
+                          category_id=9, date=old.date, note=old.note)
+        stats.retract(old)
+        stats.apply(new)
+        
+        expected = Statistics()
+        expected.calculate([new] + trans_list[2:])
+        self._assert_same(stats, expected)
+        
+        with pytest.raises(ValueError):
+            Statistics().retract(old)
+    
+    def test_statistics_merge(self):
+        """
+        测试用例 TC-ST-12：合并分块计算的部分结果
+        输入：0.1、0.2这类无法精确表示的金额，分成多块分别calculate()再merge()
+        预期：与对全部交易一次calculate()逐位相同，与合并顺序无关
+        """
+        trans_list = self._mixed_transactions(1000)
+        trans_list += [
+            Transaction(amount=amount, trans_type=TransactionType.EXPENSE,
+                       category_id=1, date=datetime.now(), note="精度")
+            for amount in (0.1, 0.2, 0.3, 1e-3, 123456.78)
+        ]
+        expected = Statistics()
+        expected.calculate(trans_list)
+        
+        chunks = []
+        for start in range(0, len(trans_list), 137):
+            part = Statistics()
+            part.calculate(trans_list[start:start + 137])
+            chunks.append(part)
+        
+        merged = Statistics()
+        for part in chunks:
+            merged.merge(part)
+        self._assert_same(merged, expected)
+        
+        reversed_merge = Statistics()
+        for part in reversed(chunks):
+            reversed_merge.merge(part)
+        self._assert_same(reversed_merge, expected)
+    
+    def test_statistics_category_details(self):
+        """
+        测试用例 TC-ST-13：分类笔数、收支拆分、最小、最大和平均金额
+        """
+        stats = Statistics()
+        trans_list = [
+            Transaction(amount=50.0, trans_type=TransactionType.EXPENSE,
+                       category_id=1, date=datetime.now(), note="餐饮1"),
+            Transaction(amount=80.0, trans_type=TransactionType.EXPENSE,
+                       category_id=1, date=datetime.now(), note="餐饮2"),
+            Transaction(amount=20.0, trans_type=TransactionType.INCOME,
+                       category_id=1, date=datetime.now(), note="退款"),
+            Transaction(amount=120.0, trans_type=TransactionType.EXPENSE,
+                       category_id=2, date=datetime.now(), note="交通")
+        ]
+        stats.calculate(iter(trans_list))
+        
+        assert stats.transaction_count == 4
+        assert stats.category_counts == {1: 3, 2: 1}
+        assert stats.category_income == {1: 20.0, 2: 0.0}
+        assert stats.category_expense == {1: 130.0, 2: 120.0}
+        assert stats.category_min == {1: 20.0, 2: 120.0}
+        assert stats.category_max == {1: 80.0, 2: 120.0}
+        assert stats.category_mean == {1: 50.0, 2: 120.0}
+        assert (stats.min_amount, stats.max_amount) == (20.0, 120.0)
+        assert stats.mean_amount == 67.5
+        
+        empty = Statistics()
+        empty.calculate([])
+        assert empty.transaction_count == 0
+        assert empty.min_amount is None and empty.mean_amount == 0.0
+    
+    def test_statistics_details_follow_changes(self):
+        """
+        测试用例 TC-ST-14：增量更新和合并后各项明细与重新计算一致
+        输入：默认的统计（跟踪最值），反复移出当前最小、最大金额的交易
+        预期：每一步所有统计项都与对剩余交易calculate()逐位相同
+        """
+        trans_list = self._mixed_transactions(120)
+        stats = Statistics()
+        stats.calculate(trans_list)
+        remaining = list(trans_list)
+        
+        while len(remaining) > 60:
+            extreme = (min if len(remaining) % 2 else max)(
+                remaining, key=lambda t: t.amount)
+            remaining.remove(extreme)
+            stats.retract(extreme)
+            expected = Statistics()
+            expected.calculate(remaining)
+            self._assert_details_same(stats, expected)
+        
+        merged = Statistics()
+        merged.calculate(remaining[:30])
+        part = Statistics()
+        part.calculate(remaining[30:])
+        merged.merge(part)
+        self._assert_details_same(merged, expected)
+    
+    def test_statistics_untracked_extremes(self):
+        """
+        测试用例 TC-ST-15：不跟踪最值时移出最值，最值变为未知，合计仍精确
+        """
+        trans_list = self._mixed_transactions(50)
+        stats = Statistics(track_extremes=False)
+        stats.calculate(iter(trans_list))
+        smallest = min(trans_list, key=lambda t: t.amount)
+        trans_list.remove(smallest)
+        stats.retract(smallest)
+        
+        expected = Statistics()
+        expected.calculate(trans_list)
+        self._assert_same(stats, expected)
+        assert stats.category_counts == expected.category_counts
+        assert stats.min_amount is None and stats.max_amount is None
+        assert stats.category_min[smallest.category_id] is None
+    
+    def _assert_details_same(self, stats, expected):
+        """两份统计的所有统计项逐位相同"""
+        self._assert_same(stats, expected)
+        for name in ('transaction_count', 'min_amount', 'max_amount',
+                     'mean_amount', 'category_counts', 'category_income',
+                     'category_expense', 'category_min', 'category_max',
+                     'category_mean'):
+            assert getattr(stats, name) == getattr(expected, name), name
@@ -0,0 +1,257 @@
+# tests/test_statistics_manager.py
+"""
+统计管理器单元测试
+"""
+import pytest
+from datetime import datetime, timedelta
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from database.database import Database
+from managers.transaction_manager import TransactionManager
+from managers.statistics_manager import StatisticsManager
+from models.statistics import Statistics
+from models.transaction import Transaction, TransactionType
+
+
+def add_sample_transactions(trans_mgr):
+    """添加跨两年、含未分类交易的测试数据"""
+    for i in range(40):
+        trans_mgr.add_transaction(Transaction(
+            amount=round(3.37 * (i + 1), 2),
+            trans_type=(TransactionType.INCOME if i % 5 == 0
+                        else TransactionType.EXPENSE),
+            category_id=(1 + i % 4) if i % 7 else None,
+            date=datetime(2023 + i % 2, 1 + i % 12, 1 + i % 28, 12, 0, 0),
+            note=f"stat {i}"))
+
+
+@pytest.fixture
+def setup_managers(tmp_path):
+    """在文件数据库上准备跨两年的交易"""
+    db = Database(str(tmp_path / 'stats.db'))
+    trans_mgr = TransactionManager(db)
+    add_sample_transactions(trans_mgr)
+    yield trans_mgr, StatisticsManager(trans_mgr)
+    db.close()
+
+
+def assert_same_statistics(actual, transactions):
+    """数据库聚合的统计结果与逐条计算的结果一致（金额允许1e-9以内的求和误差）"""
+    expected = Statistics()
+    expected.calculate(transactions)
+    assert actual.total_income == pytest.approx(expected.total_income, abs=1e-9)
+    assert actual.total_expense == pytest.approx(expected.total_expense,
+                                                 abs=1e-9)
+    assert actual.get_balance() == pytest.approx(expected.get_balance(),
+                                                 abs=1e-9)
+    assert actual.category_data.keys() == expected.category_data.keys()
+    for cat_id, amount in expected.category_data.items():
+        assert actual.category_data[cat_id] == pytest.approx(amount, abs=1e-9)
+    assert actual.category_counts == expected.category_counts
+    assert actual.transaction_count == expected.transaction_count
+    for cat_id in expected.category_data:
+        assert actual.category_income[cat_id] == pytest.approx(
+            expected.category_income[cat_id], abs=1e-9)
+        assert actual.category_expense[cat_id] == pytest.approx(
+            expected.category_expense[cat_id], abs=1e-9)
+        # 月度汇总表没有最值
+        if actual.category_min[cat_id] is not None:
+            assert actual.category_min[cat_id] == expected.category_min[cat_id]
+            assert actual.category_max[cat_id] == expected.category_max[cat_id]
+
+
+class TestStatisticsManager:
+    """统计管理器测试类"""
+    
+    def test_rollup_statistics_match_transactions(self, setup_managers):
+        """
+        测试用例 TC-SM-01：月度、年度、全部统计与逐条计算的结果一致
+        """
+        trans_mgr, stats_mgr = setup_managers
+        
+        assert_same_statistics(
+            stats_mgr.calculate_monthly(2024, 2),
+            trans_mgr.query(start_date=datetime(2024, 2, 1),
+                            end_date=datetime(2024, 2, 29, 23, 59, 59)))
+        assert_same_statistics(
+            stats_mgr.calculate_yearly(2023),
+            trans_mgr.query(start_date=datetime(2023, 1, 1),
+                            end_date=datetime(2023, 12, 31, 23, 59, 59)))
+        assert_same_statistics(stats_mgr.calculate_all(),
+                               trans_mgr.get_transactions())
+    
+    def test_rollup_statistics_follow_changes(self, setup_managers):
+        """
+        测试用例 TC-SM-02：增删改后统计随之变化，空月份统计为0
+        """
+        trans_mgr, stats_mgr = setup_managers
+        assert stats_mgr.calculate_monthly(2025, 1).total_expense == 0.0
+        
+        trans = trans_mgr.query(start_date=datetime(2024, 2, 1),
+                                end_date=datetime(2024, 2, 29, 23, 59, 59))[0]
+        trans.date = datetime(2025, 1, 15)
+        trans_mgr.update_transaction(trans)
+        trans_mgr.add_transaction(Transaction(
+            amount=0.1, trans_type=TransactionType.EXPENSE, category_id=1,
+            date=datetime(2025, 1, 20), note="new"))
+        trans_mgr.delete_transaction(trans_mgr.query()[0].id)
+        
+        assert_same_statistics(
+            stats_mgr.calculate_monthly(2025, 1),
+            trans_mgr.query(start_date=datetime(2025, 1, 1),
+                            end_date=datetime(2025, 1, 31, 23, 59, 59)))
+        assert_same_statistics(stats_mgr.calculate_all(),
+                               trans_mgr.get_transactions())
+        assert trans_mgr.database.verify_rollup() == []
+    
+    @pytest.mark.parametrize("granularity", ['day', 'week', 'month', 'quarter',
+                                             'year'])
+    def test_calculate_series(self, setup_managers, granularity):
+        """
+        测试用例 TC-SM-03：按周期分段统计与逐段查询计算的结果一致
+        输入：整月对齐的区间（月、季、年走汇总表）和不对齐的区间（遍历交易）
+        预期：周期连续、按时间排列，每段统计与该段交易直接计算的结果一致
+        """
+        trans_mgr, stats_mgr = setup_managers
+        ranges = [
+            (datetime(2023, 1, 1), datetime(2024, 12, 31, 23, 59, 59)),
+            (datetime(2023, 3, 10, 8, 0, 0), datetime(2024, 5, 20, 12, 0, 0)),
+        ]
+        for start, end in ranges:
+            series = stats_mgr.calculate_series(start, end, granularity)
+            assert series[0][0] <= start
+            assert series[-1][0] <= end
+            for (period, stats), (next_period, _) in zip(series, series[1:]):
+                assert period < next_period
+                # 周期区间内的交易，并截取到查询区间
+                expected = trans_mgr.query(
+                    start_date=max(period, start),
+                    end_date=min(next_period - timedelta(seconds=1), end))
+                assert_same_statistics(stats, expected)
+            period, stats = series[-1]
+            assert_same_statistics(
+                stats, trans_mgr.query(start_date=max(period, start),
+                                       end_date=end))
+            assert sum(sum(stats.category_counts.values())
+                       for _, stats in series) == trans_mgr.count(
+                {'start_date': start, 'end_date': end})
+    
+    def test_calculate_series_invalid(self, setup_managers):
+        """
+        测试用例 TC-SM-04：不支持的周期报错，空区间返回空列表
+        """
+        _, stats_mgr = setup_managers
+        with pytest.raises(ValueError):
+            stats_mgr.calculate_series(datetime(2024, 1, 1),
+                                       datetime(2024, 2, 1), 'hour')
+        assert stats_mgr.calculate_series(datetime(2024, 2, 1),
+                                          datetime(2024, 1, 1), 'day') == []
+    
+    @pytest.mark.parametrize('storage_format', ['text', 'compact'])
+    @pytest.mark.parametrize('backend', ['rollup', 'sql', 'memory'])
+    def test_backends_agree(self, tmp_path, storage_format, backend):
+        """
+        测试用例 TC-SM-05：各统计后端的结果一致
+        输入：compare=True，数据库聚合的每个结果都与逐条计算核对
+        预期：不抛出RuntimeError，结果与逐条计算一致
+        """
+        db = Database(str(tmp_path / 'backend.db'),
+                      storage_format=storage_format)
+        trans_mgr = TransactionManager(db)
+        add_sample_transactions(trans_mgr)
+        stats_mgr = StatisticsManager(trans_mgr, backend=backend, compare=True)
+        
+        assert_same_statistics(
+            stats_mgr.calculate_monthly(2024, 2),
+            trans_mgr.query(start_date=datetime(2024, 2, 1),
+                            end_date=datetime(2024, 2, 29, 23, 59, 59)))
+        assert_same_statistics(
+            stats_mgr.calculate_yearly(2023),
+            trans_mgr.query(start_date=datetime(2023, 1, 1),
+                            end_date=datetime(2023, 12, 31, 23, 59, 59)))
+        assert_same_statistics(stats_mgr.calculate_all(),
+                               trans_mgr.get_transactions())
+        filters = {'start_date': datetime(2023, 3, 15), 'category_id': 2,
+                   'min_amount': 20.0, 'trans_type': TransactionType.EXPENSE}
+        assert_same_statistics(stats_mgr.calculate(filters),
+                               trans_mgr.query(**filters))
+        db.close()
+    
+    def test_compare_detects_mismatch(self, setup_managers):
+        """
+        测试用例 TC-SM-06：汇总表与交易数据不一致时核对报错
+        """
+        trans_mgr, _ = setup_managers
+        stats_mgr = StatisticsManager(trans_mgr, compare=True)
+        stats_mgr.calculate_all()
+        
+        with trans_mgr.database.transaction():
+            trans_mgr.database.conn.execute(
+                'UPDATE monthly_rollup SET total = total + 1')
+        with pytest.raises(RuntimeError):
+            stats_mgr.calculate_all()
+        with pytest.raises(ValueError):
+            StatisticsManager(trans_mgr, backend='numpy')
+    
+    @pytest.mark.parametrize('backend', ['rollup', 'sql', 'memory'])
+    def test_sub_cent_amounts(self, tmp_path, backend):
+        """
+        测试用例 TC-SM-07：金额超过两位小数时各后端与逐条计算一致
+        输入：文本格式数据库中三笔0.005的支出和一笔0.1234的收入
+        预期：月度、年度、全部统计的支出为0.015（不是逐笔舍入到分的0.03），
+              compare=True时各后端与逐条计算的核对不误报
+        """
+        db = Database(str(tmp_path / 'sub_cent.db'))
+        trans_mgr = TransactionManager(db)
+        for amount, trans_type in ((0.005, TransactionType.EXPENSE),
+                                   (0.005, TransactionType.EXPENSE),
+                                   (0.005, TransactionType.EXPENSE),
+                                   (0.1234, TransactionType.INCOME)):
+            trans_mgr.add_transaction(Transaction(
+                amount=amount, trans_type=trans_type, category_id=1,
+                date=datetime(2024, 6, 15, 8, 0, 0), note="sub cent"))
+        stats_mgr = StatisticsManager(trans_mgr, backend=backend, compare=True)
+        
+        # compare=True：每个结果都与逐条计算核对，不应误报不一致
+        for stats in (stats_mgr.calculate_monthly(2024, 6),
+                      stats_mgr.calculate_yearly(2024),
+                      stats_mgr.calculate_all()):
+            assert stats.total_expense == pytest.approx(0.015, abs=1e-12)
+            assert stats.total_income == pytest.approx(0.1234, abs=1e-12)
+            assert_same_statistics(stats, trans_mgr.get_transactions())
+        db.close()
+    
+    def test_memory_backend_uses_columnar_aggregate(self, tmp_path,
+                                                    monkeypatch):
+        """
+        测试用例 TC-SM-08：列式后端下memory统计在列上汇总
+        预期：调用列式存储的aggregate()，结果与逐条计算一致
+        """
+        from managers.columnar_store import ColumnarStore
+        
+        calls = []
+        aggregate = ColumnarStore.aggregate
+        
+        def spy(store, positions):
+            calls.append(len(positions))
+            return aggregate(store, positions)
+        
+        monkeypatch.setattr(ColumnarStore, 'aggregate', spy)
+        db = Database(str(tmp_path / 'columnar.db'))
+        trans_mgr = TransactionManager(db, backend='columnar')
+        add_sample_transactions(trans_mgr)
+        
+        stats = StatisticsManager(trans_mgr, backend='memory').calculate_yearly(
+            2023)
+        assert calls == [20]
+        assert_same_statistics(stats, list(trans_mgr.iter_query(
+            start_date=datetime(2023, 1, 1),
+            end_date=datetime(2023, 12, 31, 23, 59, 59))))
+        
+        # compare=True时核对用的memory统计同样在列上汇总
+        StatisticsManager(trans_mgr, compare=True).calculate_monthly(2024, 2)
+        assert len(calls) == 2
+        db.close()
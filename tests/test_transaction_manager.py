@@ -192,4 +192,659 @@ class TestTransactionManager:
         manager.add_transaction(trans2)
         
         results = manager.query(keyword="午餐")
-        assert len(results) == 1, "应该返回1条包含'午餐'的记录"
\ No newline at end of file
+        assert len(results) == 1, "应该返回1条包含'午餐'的记录"
+    
+    def test_rollback_restores_memory(self, setup_manager):
+        """
+        测试用例 TC-TM-11：工作单元回滚后内存数据与数据库一致
+        """
+        manager = setup_manager
+        
+        with pytest.raises(RuntimeError):
+            with manager.database.transaction():
+                manager.add_transaction(Transaction(
+                    amount=10.0, trans_type=TransactionType.EXPENSE,
+                    category_id=1, date=datetime.now(), note="回滚"))
+                raise RuntimeError("中途失败")
+        
+        assert len(manager.transactions) == 0
+    
+    def test_sql_query_matches_in_memory(self, tmp_path):
+        """
+        测试用例 TC-TM-12：文件数据库的SQL查询与内存查询结果一致
+        """
+        file_manager = TransactionManager(Database(str(tmp_path / 'q.db')))
+        memory_manager = TransactionManager(Database(':memory:'))
+        base_date = datetime(2024, 5, 20, 12, 0, 0)
+        
+        for i in range(30):
+            trans_type = (TransactionType.INCOME if i % 3 == 0
+                          else TransactionType.EXPENSE)
+            for manager in (file_manager, memory_manager):
+                manager.add_transaction(Transaction(
+                    amount=float(i * 7 % 50), trans_type=trans_type,
+                    category_id=i % 4 + 1, date=base_date - timedelta(days=i),
+                    note=f"Lunch 午餐{i}" if i % 2 else f"打车{i}"))
+        
+        conditions = [
+            {},
+            {'start_date': base_date - timedelta(days=10)},
+            {'end_date': base_date - timedelta(days=5), 'category_id': 2},
+            {'min_amount': 10, 'max_amount': 30},
+            {'keyword': 'LUNCH'},
+            {'keyword': '午餐', 'trans_type': TransactionType.EXPENSE},
+        ]
+        for condition in conditions:
+            expected = [t.id for t in memory_manager.query(**condition)]
+            actual = [t.id for t in file_manager.query(**condition)]
+            assert actual == expected, f"条件{condition}结果不一致"
+        
+        file_manager.database.close()
+        memory_manager.database.close()
+    
+    def test_compact_storage_round_trip(self, tmp_path):
+        """
+        测试用例 TC-TM-13：紧凑存储格式下金额和日期保持不变
+        """
+        db_path = str(tmp_path / 'compact.db')
+        manager = TransactionManager(Database(db_path, storage_format='compact'))
+        date = datetime(2024, 2, 29, 23, 59, 59)
+        manager.add_transaction(Transaction(
+            amount=19.99, trans_type=TransactionType.EXPENSE,
+            category_id=1, date=date, note="紧凑"))
+        manager.database.close()
+        
+        manager = TransactionManager(Database(db_path))
+        trans = manager.get_transactions()[0]
+        assert trans.amount == 19.99
+        assert trans.amount_cents == 1999
+        assert trans.date == date
+        
+        results = manager.query(start_date=date, min_amount=19.99,
+                                max_amount=19.99)
+        assert [t.id for t in results] == [trans.id]
+        # 日期条件按整秒比较
+        assert len(manager.query(start_date=date.replace(microsecond=1))) == 1
+        assert manager.query(start_date=date + timedelta(seconds=1)) == []
+        manager.database.close()
+    
+    def test_indexes_follow_update_and_delete(self, setup_manager):
+        """
+        测试用例 TC-TM-14：ID索引和分类、类型索引随增删改同步更新
+        """
+        manager = setup_manager
+        ids = []
+        for i in range(6):
+            ids.append(manager.add_transaction(Transaction(
+                amount=10.0 + i, trans_type=TransactionType.EXPENSE,
+                category_id=i % 2 + 1, date=datetime(2024, 1, i + 1),
+                note=f"索引{i}")))
+        
+        assert manager.get_transaction(ids[2]).note == "索引2"
+        
+        moved = Transaction(transaction_id=ids[0], amount=99.0,
+                            trans_type=TransactionType.INCOME, category_id=2,
+                            date=datetime(2024, 1, 1), note="改为收入")
+        manager.update_transaction(moved)
+        manager.delete_transaction(ids[1])
+        
+        assert manager.get_transaction(ids[1]) is None
+        assert [t.id for t in manager.query(category_id=1)] == [ids[2], ids[4]]
+        assert [t.id for t in manager.query(category_id=2)] == [
+            ids[0], ids[3], ids[5]]
+        assert [t.id for t in manager.query(
+            trans_type=TransactionType.INCOME)] == [ids[0]]
+        assert manager.get_transaction_count() == 5
+    
+    def test_update_patches_in_place(self, tmp_path):
+        """
+        测试用例 TC-TM-15：更新只修改内存中的对象，外部修改时全量重新加载
+        """
+        import sqlite3
+        
+        db_path = str(tmp_path / 'update.db')
+        manager = TransactionManager(Database(db_path))
+        trans_id = manager.add_transaction(Transaction(
+            amount=10.0, trans_type=TransactionType.EXPENSE, category_id=1,
+            date=datetime(2024, 1, 1, 8, 0, 0), note="原始"))
+        original = manager.get_transaction(trans_id)
+        
+        # 调用方直接修改内存对象后提交更新
+        original.category_id = 3
+        original.note = "已修改"
+        manager.update_transaction(original)
+        assert manager.get_transaction(trans_id) is original
+        assert [t.id for t in manager.query(category_id=3)] == [trans_id]
+        assert manager.query(category_id=1) == []
+        
+        # 其他连接修改数据库后，更新会触发全量重新加载
+        other = sqlite3.connect(db_path)
+        other.execute("UPDATE transactions SET note = '外部' WHERE id = ?",
+                      (trans_id,))
+        other.execute(
+            "INSERT INTO transactions (amount, type, category_id, date, note) "
+            "VALUES (5.0, '支出', 2, '2024-01-02 09:00:00', '外部新增')")
+        other.commit()
+        other.close()
+        
+        manager.update_transaction(Transaction(
+            transaction_id=trans_id, amount=20.0,
+            trans_type=TransactionType.EXPENSE, category_id=3,
+            date=datetime(2024, 1, 1, 8, 0, 0), note="再次修改"))
+        assert manager.get_transaction_count() == 2
+        assert manager.get_transaction(trans_id).amount == 20.0
+        assert manager.get_transaction(trans_id) is not original
+        manager.database.close()
+    
+    def test_date_index_ranges_and_latest(self, setup_manager):
+        """
+        测试用例 TC-TM-16：日期索引支持范围查询和最近N条，并随增删改保持有序
+        """
+        manager = setup_manager
+        base_date = datetime(2024, 6, 1, 12, 0, 0)
+        ids = {}
+        for day in [5, 1, 3, 2, 4]:
+            ids[day] = manager.add_transaction(Transaction(
+                amount=float(day), trans_type=TransactionType.EXPENSE,
+                category_id=1, date=base_date + timedelta(days=day),
+                note=f"第{day}天"))
+        
+        results = manager.query(start_date=base_date + timedelta(days=2),
+                                end_date=base_date + timedelta(days=4))
+        assert [t.amount for t in results] == [2.0, 3.0, 4.0]
+        
+        latest = manager.get_latest_transactions(2)
+        assert [t.id for t in latest] == [ids[5], ids[4]]
+        
+        moved = manager.get_transaction(ids[1])
+        moved.date = base_date + timedelta(days=10)
+        manager.update_transaction(moved)
+        manager.delete_transaction(ids[5])
+        
+        latest = manager.get_latest_transactions(3)
+        assert [t.id for t in latest] == [ids[1], ids[4], ids[3]]
+        assert [t.id for t in manager.query(
+            end_date=base_date + timedelta(days=3))] == [ids[2], ids[3]]
+    
+    def test_query_cache_hits_and_invalidation(self, setup_manager):
+        """
+        测试用例 TC-TM-17：相同条件的查询命中缓存，增删改后缓存失效
+        """
+        manager = setup_manager
+        manager.add_transaction(Transaction(
+            amount=10.0, trans_type=TransactionType.EXPENSE, category_id=1,
+            date=datetime(2024, 1, 1), note="Coffee"))
+        
+        first = manager.query(keyword="coffee", category_id=1)
+        second = manager.query(keyword="COFFEE", category_id=1)
+        assert [t.id for t in first] == [t.id for t in second]
+        assert manager.cache_info()['hits'] == 1
+        
+        # 修改返回的列表不影响缓存
+        second.clear()
+        assert len(manager.query(keyword="coffee", category_id=1)) == 1
+        
+        manager.add_transaction(Transaction(
+            amount=5.0, trans_type=TransactionType.EXPENSE, category_id=1,
+            date=datetime(2024, 1, 2), note="coffee beans"))
+        assert len(manager.query(keyword="coffee", category_id=1)) == 2
+        
+        info = manager.cache_info()
+        assert info['hits'] == 2
+        assert info['misses'] == 2
+        assert info['size'] == 1
+    
+    def test_query_cache_lru_eviction(self):
+        """
+        测试用例 TC-TM-18：缓存容量满时淘汰最久未使用的查询
+        """
+        db = Database(':memory:')
+        manager = TransactionManager(db, cache_size=2)
+        
+        manager.query(category_id=1)
+        manager.query(category_id=2)
+        manager.query(category_id=1)
+        manager.query(category_id=3)
+        manager.query(category_id=1)
+        manager.query(category_id=2)
+        
+        info = manager.cache_info()
+        assert info['size'] == 2
+        assert info['hits'] == 2
+        assert info['misses'] == 4
+        db.close()
+    
+    @pytest.mark.parametrize('in_memory', [True, False])
+    def test_note_full_text_search(self, tmp_path, in_memory):
+        """
+        测试用例 TC-TM-19：关键词和全文检索表达式在两种数据库下结果一致
+        """
+        db = Database(':memory:' if in_memory else str(tmp_path / 'fts.db'))
+        if not db.has_fts:
+            pytest.skip("SQLite不支持FTS5 trigram")
+        manager = TransactionManager(db)
+        notes = ["公司楼下午餐费用", "Lunch with Bob", "打车回家", "lunchbox"]
+        for i, note in enumerate(notes):
+            manager.add_transaction(Transaction(
+                amount=10.0, trans_type=TransactionType.EXPENSE,
+                category_id=1, date=datetime(2024, 1, i + 1), note=note))
+        
+        assert [t.note for t in manager.query(keyword="LUNCH")] == [
+            "Lunch with Bob", "lunchbox"]
+        assert [t.note for t in manager.query(keyword="打车")] == ["打车回家"]
+        assert [t.note for t in manager.query(
+            note_match='"lunch" NOT bob')] == ["lunchbox"]
+        assert [t.note for t in manager.query(
+            note_match='"午餐费" OR "车回家"')] == ["公司楼下午餐费用", "打车回家"]
+        db.close()
+    
+    def test_note_ngram_index_follows_changes(self, setup_manager):
+        """
+        测试用例 TC-TM-20：备注二元组索引随增删改同步，关键词结果不变
+        """
+        manager = setup_manager
+        notes = ["早餐咖啡", "Coffee beans", "午餐", "coffee"]
+        for i, note in enumerate(notes):
+            manager.add_transaction(Transaction(
+                amount=10.0, trans_type=TransactionType.EXPENSE,
+                category_id=1, date=datetime(2024, 1, i + 1), note=note))
+        ids = [t.id for t in manager.query()]
+        
+        assert manager._notes.candidates("COFFEE") == {ids[1], ids[3]}
+        assert manager._notes.candidates("c") is None
+        assert [t.note for t in manager.query(keyword="c")] == [
+            "Coffee beans", "coffee"]
+        assert [t.note for t in manager.query(keyword="餐")] == [
+            "早餐咖啡", "午餐"]
+        
+        manager.delete_transaction(ids[1])
+        assert [t.note for t in manager.query(keyword="coffee")] == ["coffee"]
+        
+        trans = manager.get_transaction(ids[2])
+        trans.note = "午餐咖啡"
+        manager.update_transaction(trans)
+        assert [t.note for t in manager.query(keyword="咖啡")] == [
+            "早餐咖啡", "午餐咖啡"]
+        assert manager._notes.candidates("午餐") == {ids[2]}
+        assert len(manager._notes) == 3
+    
+    @pytest.mark.parametrize('storage', ['memory', 'text', 'compact'])
+    def test_query_page_keyset(self, tmp_path, storage):
+        """
+        测试用例 TC-TM-21：键集分页逐页取完与一次查询结果一致，count不取行
+        """
+        if storage == 'memory':
+            db = Database(':memory:')
+        else:
+            db = Database(str(tmp_path / 'page.db'), storage_format=storage)
+        manager = TransactionManager(db)
+        base = datetime(2024, 3, 1, 12, 0, 0)
+        for i in range(23):
+            # 每三条同一时间，检验相同日期按id续页
+            manager.add_transaction(Transaction(
+                amount=float(i + 1),
+                trans_type=(TransactionType.INCOME if i % 4 == 0
+                            else TransactionType.EXPENSE),
+                category_id=1 + i % 2,
+                date=base + timedelta(days=(i * 7) % 23 // 3),
+                note=f"note {i}"))
+        
+        for filters in (None, {'category_id': 2},
+                        {'min_amount': 5.0, 'start_date': base}):
+            expected = manager.query(**(filters or {}))
+            for order_by in ('date', '-date'):
+                pages, after_key = [], None
+                while True:
+                    page, after_key = manager.query_page(
+                        filters, order_by=order_by, limit=4,
+                        after_key=after_key)
+                    assert len(page) <= 4
+                    pages.extend(page)
+                    if after_key is None:
+                        break
+                    assert len(page) == 4
+                if order_by == '-date':
+                    pages.reverse()
+                assert [t.id for t in pages] == [t.id for t in expected]
+            assert manager.count(filters) == len(expected)
+        
+        assert manager.count({'end_date': base}) == 3
+        with pytest.raises(ValueError):
+            manager.query_page(order_by='amount')
+        db.close()
+    
+    @pytest.mark.parametrize('in_memory', [True, False])
+    def test_iter_query_streams_in_date_order(self, tmp_path, in_memory):
+        """
+        测试用例 TC-TM-22：iter_query逐条产出，结果与query一致，可直接用于统计
+        """
+        from models.statistics import Statistics
+        db = Database(':memory:' if in_memory else str(tmp_path / 'iter.db'))
+        manager = TransactionManager(db)
+        for i in range(10):
+            manager.add_transaction(Transaction(
+                amount=0.1 * (i + 1),
+                trans_type=(TransactionType.INCOME if i % 3 == 0
+                            else TransactionType.EXPENSE),
+                category_id=1 + i % 2,
+                date=datetime(2024, 5, 10 - i),
+                note=f"item {i}"))
+        
+        rows = manager.iter_query(start_date=datetime(2024, 5, 3))
+        assert not isinstance(rows, list)
+        first = next(rows)
+        assert first.date == datetime(2024, 5, 3)
+        assert [first.id] + [t.id for t in rows] == [
+            t.id for t in manager.query(start_date=datetime(2024, 5, 3))]
+        
+        streamed, listed = Statistics(), Statistics()
+        streamed.calculate(manager.iter_query(category_id=2))
+        listed.calculate(manager.query(category_id=2))
+        assert streamed.total_income == listed.total_income
+        assert streamed.total_expense == listed.total_expense
+        assert streamed.category_data == listed.category_data
+        db.close()
+    
+    @pytest.mark.parametrize('in_memory', [True, False])
+    @pytest.mark.parametrize('backend', ['list', 'columnar'])
+    def test_lazy_window_matches_eager(self, tmp_path, in_memory, backend):
+        """
+        测试用例 TC-TM-23：延迟加载只预加载最近窗口，按需加载后结果与全量加载一致
+        """
+        db = Database(':memory:' if in_memory else str(tmp_path / 'lazy.db'))
+        eager = TransactionManager(db, backend=backend)
+        this_year = datetime.now().year
+        for i in range(12):
+            eager.add_transaction(Transaction(
+                amount=float(i + 1),
+                trans_type=(TransactionType.INCOME if i % 3 == 0
+                            else TransactionType.EXPENSE),
+                category_id=1 + i % 2,
+                date=datetime(this_year - i // 2, 6, 1 + i),
+                note=f"year {i // 2}"))
+        
+        lazy = TransactionManager(db, backend=backend, window_years=2)
+        assert len(lazy._by_id) == 4
+        assert lazy.get_transaction_count() == 12
+        
+        def ids(rows):
+            return [t.id for t in rows]
+        
+        for conditions in ({'start_date': datetime(this_year - 1, 1, 1)},
+                           {'start_date': datetime(this_year - 3, 1, 1),
+                            'category_id': 2},
+                           {'keyword': 'year 5'},
+                           {}):
+            assert ids(lazy.query(**conditions)) == ids(
+                eager.query(**conditions))
+            assert lazy.count(conditions) == eager.count(conditions)
+        
+        lazy = TransactionManager(db, backend=backend, window_years=1)
+        oldest = eager.query()[0]
+        old = lazy.get_transaction(oldest.id)
+        assert old is not None and old.note == "year 5"
+        old.date = datetime(this_year, 12, 31)
+        lazy.update_transaction(old)
+        eager.load_transactions()
+        assert ids(lazy.query(start_date=datetime(this_year, 1, 1))) == ids(
+            eager.query(start_date=datetime(this_year, 1, 1)))
+        assert ids(lazy.get_latest_transactions(5)) == ids(
+            eager.get_latest_transactions(5))
+        assert ids(lazy.get_transactions()) == ids(eager.get_transactions())
+        
+        with pytest.raises(ValueError):
+            TransactionManager(db, window_years=0)
+        db.close()
+    
+    def test_snapshot_warm_start(self, tmp_path):
+        """
+        测试用例 TC-TM-24：快照未过期时从快照加载，数据库被修改后快照作废
+        """
+        from managers.category_manager import CategoryManager
+        from managers.snapshot import load_snapshot, save_snapshot
+        db_path = str(tmp_path / 'snap.db')
+        snapshot = str(tmp_path / 'trans.snapshot')
+        cat_snapshot = str(tmp_path / 'cat.snapshot')
+        
+        db = Database(db_path)
+        manager = TransactionManager(db, snapshot_path=snapshot)
+        for i in range(5):
+            manager.add_transaction(Transaction(
+                amount=1.5 * (i + 1), trans_type=TransactionType.EXPENSE,
+                category_id=1, date=datetime(2024, 2, i + 1),
+                note=f"snap {i}"))
+        assert manager.save_snapshot()
+        assert CategoryManager(db, snapshot_path=cat_snapshot).save_snapshot()
+        db.close()
+        
+        # 篡改快照内容但保留修改标记，加载结果来自快照即可看出
+        db = Database(db_path)
+        stamp = db.change_stamp('transactions')
+        loaded_from, rows = load_snapshot(snapshot, stamp)
+        rows[0] = rows[0][:5] + ("from snapshot",)
+        save_snapshot(snapshot, stamp, (loaded_from, rows))
+        manager = TransactionManager(db, snapshot_path=snapshot)
+        assert manager.get_transaction(rows[0][0]).note == "from snapshot"
+        assert [t.id for t in manager.query(start_date=datetime(2024, 2, 3))] \
+            == [r[0] for r in rows[2:]]
+        categories = CategoryManager(db, snapshot_path=cat_snapshot)
+        assert len(categories.get_categories()) == len(
+            CategoryManager(db).get_categories())
+        
+        # 修改记录不改变行数和最大ID，修改计数使快照过期
+        db.update('transactions', rows[1][0], {'note': 'edited'})
+        manager = TransactionManager(db, snapshot_path=snapshot)
+        assert manager.get_transaction(rows[0][0]).note == "snap 0"
+        assert manager.get_transaction(rows[1][0]).note == "edited"
+        db.close()
+        
+        # 快照损坏时回退到数据库
+        with open(snapshot, 'wb') as f:
+            f.write(b'not a snapshot')
+        db = Database(db_path)
+        manager = TransactionManager(db, snapshot_path=snapshot)
+        assert manager.get_transaction_count() == 5
+        db.close()
+    
+    @pytest.mark.parametrize('in_memory', [True, False])
+    def test_add_transactions_batch(self, tmp_path, in_memory):
+        """
+        测试用例 TC-TM-25：批量添加时逐条拒绝不合格记录，其余记录一次插入
+        """
+        db = Database(':memory:' if in_memory else str(tmp_path / 'bulk.db'))
+        manager = TransactionManager(db)
+        first = manager.add_transaction(Transaction(
+            amount=1.0, trans_type=TransactionType.EXPENSE, category_id=1,
+            date=datetime(2024, 1, 1), note="single"))
+        manager.delete_transaction(first)
+        
+        def make(amount=10.0, trans_type=TransactionType.EXPENSE,
+                 category_id=1, day=1, note="batch"):
+            return Transaction(amount=amount, trans_type=trans_type,
+                               category_id=category_id,
+                               date=datetime(2024, 2, day), note=note)
+        
+        batch = [make(day=3), make(amount=2000000.0), make(amount=-1.0),
+                 make(category_id=9999), make(trans_type="支出"),
+                 make(amount=float('nan')), make(day=1, note=None),
+                 make(amount=5, trans_type=TransactionType.INCOME, day=2)]
+        ids, rejected = manager.add_transactions(iter(batch))
+        
+        # 已删除记录的ID不会被重新分配
+        assert ids == [first + 1, first + 2, first + 3]
+        assert [index for index, _ in rejected] == [1, 2, 3, 4, 5]
+        assert [batch[0].id, batch[6].id, batch[7].id] == ids
+        assert [t.id for t in manager.query()] == [ids[1], ids[2], ids[0]]
+        assert manager.count({'trans_type': TransactionType.INCOME}) == 1
+        
+        reloaded = TransactionManager(db)
+        assert [t.id for t in reloaded.query()] == [ids[1], ids[2], ids[0]]
+        assert manager.add_transactions([make(amount=-5.0)])[0] == []
+        db.close()
+    
+    @pytest.mark.parametrize('backend', ['list', 'columnar'])
+    def test_add_rules_and_empty_note(self, backend):
+        """
+        测试用例 TC-TM-26：单条与批量添加校验规则一致，备注为None时按空字符串保存
+        """
+        manager = TransactionManager(Database(':memory:'), backend=backend)
+        
+        def make(amount=10.0, category_id=1, note="rules"):
+            return Transaction(amount=amount, trans_type=TransactionType.EXPENSE,
+                               category_id=category_id,
+                               date=datetime(2024, 2, 1), note=note)
+        
+        for invalid in (make(amount=-1.0), make(amount=2000000.0),
+                        make(category_id=9999), make(amount=float('inf'))):
+            with pytest.raises(ValueError):
+                manager.add_transaction(invalid)
+            assert manager.add_transactions([invalid])[0] == []
+        assert manager.get_transaction_count() == 0
+        
+        single = make(note=None)
+        manager.add_transaction(single)
+        ids, _ = manager.add_transactions([make(note=None), make(note="Lunch")])
+        assert single.note == ''
+        assert [t.note for t in manager.query()] == ['', '', 'Lunch']
+        assert [t.id for t in manager.query(keyword='lu')] == [ids[1]]
+        manager.database.close()
+    
+    @pytest.mark.parametrize('backend', ['list', 'columnar'])
+    def test_memory_values_match_storage(self, backend):
+        """
+        测试用例 TC-TM-27：内存中的金额和日期与存储的值一致
+        输入：紧凑格式数据库中添加0.125元、秒以下部分非零的交易，再修改
+        预期：内存对象按分舍入、舍去秒以下部分，查询条件与统计结果与SQL一致
+        """
+        from managers.statistics_manager import StatisticsManager
+        
+        db = Database(':memory:', storage_format='compact')
+        manager = TransactionManager(db, backend=backend)
+        late = datetime(2024, 1, 31, 23, 59, 59, 500000)
+        trans = Transaction(amount=0.125, trans_type=TransactionType.EXPENSE,
+                            category_id=1, date=late, note="舍入")
+        manager.add_transaction(trans)
+        bulk = Transaction(amount=0.335, trans_type=TransactionType.EXPENSE,
+                           category_id=1, date=late, note="批量")
+        manager.add_transactions([bulk])
+        
+        assert trans.amount == 0.13 and bulk.amount == 0.34
+        assert trans.date == datetime(2024, 1, 31, 23, 59, 59)
+        assert manager.query(max_amount=0.125) == []
+        assert len(manager.query(min_amount=0.13)) == 2
+        assert len(manager.query(end_date=datetime(2024, 1, 31, 23, 59, 59))) == 2
+        
+        for stats_backend in ('rollup', 'sql', 'memory'):
+            stats = StatisticsManager(manager, backend=stats_backend,
+                                      compare=True).calculate_monthly(2024, 1)
+            assert stats.total_expense == pytest.approx(0.47, abs=1e-9)
+        
+        manager.update_transaction(Transaction(
+            trans.id, 0.004, TransactionType.EXPENSE, 1,
+            datetime(2024, 2, 1, 0, 0, 0, 1), "修改"))
+        updated = manager.get_transaction(trans.id)
+        assert updated.amount == 0.0
+        assert updated.date == datetime(2024, 2, 1)
+        assert StatisticsManager(manager, compare=True).calculate_monthly(
+            2024, 2).total_expense == 0.0
+        db.close()
+    
+    def test_count_and_statistics_cached(self, tmp_path):
+        """
+        测试用例 TC-TM-28：计数和统计结果经过查询缓存，数据变化后失效
+        输入：界面使用的count()、calculate()和calculate_monthly()
+        预期：相同条件第二次命中缓存；增删或直接修改数据库后重新计算
+        """
+        from managers.statistics_manager import StatisticsManager
+        
+        db = Database(str(tmp_path / 'cached.db'))
+        manager = TransactionManager(db)
+        stats_mgr = StatisticsManager(manager)
+        manager.add_transaction(Transaction(
+            amount=10.0, trans_type=TransactionType.EXPENSE, category_id=1,
+            date=datetime(2024, 1, 5), note="Coffee"))
+        filters = {'keyword': 'coffee', 'category_id': 1}
+        
+        assert manager.count(filters) == 1
+        assert stats_mgr.calculate(filters).total_expense == 10.0
+        assert stats_mgr.calculate_monthly(2024, 1).total_expense == 10.0
+        misses = manager.cache_info()['misses']
+        
+        assert manager.count({'keyword': 'COFFEE', 'category_id': 1}) == 1
+        stats = stats_mgr.calculate(filters)
+        assert stats_mgr.calculate_monthly(2024, 1).total_expense == 10.0
+        info = manager.cache_info()
+        assert info['misses'] == misses
+        assert info['hits'] == 3
+        # 修改返回的统计不影响缓存
+        stats.total_expense = 0.0
+        assert stats_mgr.calculate(filters).total_expense == 10.0
+        
+        manager.add_transaction(Transaction(
+            amount=5.0, trans_type=TransactionType.EXPENSE, category_id=1,
+            date=datetime(2024, 1, 6), note="coffee beans"))
+        assert manager.count(filters) == 2
+        assert stats_mgr.calculate_monthly(2024, 1).total_expense == 15.0
+        
+        # 不经过管理器直接修改数据库
+        with db.transaction():
+            db.conn.execute('DELETE FROM transactions WHERE amount = 5.0')
+        assert manager.count(filters) == 1
+        assert stats_mgr.calculate_monthly(2024, 1).total_expense == 10.0
+        db.close()
+    
+    def test_query_cache_thread_safe(self):
+        """
+        测试用例 TC-TM-29：多个线程同时读写查询缓存不出错
+        """
+        import threading
+        from managers.query_cache import QueryCache
+        
+        cache = QueryCache(maxsize=4)
+        errors = []
+        
+        def work(offset):
+            try:
+                for i in range(3000):
+                    key = (offset + i) % 7
+                    if cache.get(key, 1) is None:
+                        cache.put(key, 1, [key])
+            except Exception as e:
+                errors.append(e)
+        
+        workers = [threading.Thread(target=work, args=(n,)) for n in range(8)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join(timeout=30)
+        
+        assert errors == []
+        info = cache.info()
+        assert info['size'] <= 4
+        assert info['hits'] + info['misses'] == 8 * 3000
+    
+    def test_keyword_case_folding_matches_in_memory(self, tmp_path):
+        """
+        测试用例 TC-TM-30：大小写折叠与SQLite不一致的关键词，文件数据库与内存结果相同
+        输入：'İstanbul'、格鲁吉亚文大写字母等备注，关键词大小写与备注不同
+        预期：文件数据库（有全文索引）与内存数据库返回相同的记录
+        """
+        file_manager = TransactionManager(Database(str(tmp_path / 'fold.db')))
+        memory_manager = TransactionManager(Database(':memory:'))
+        notes = ["İstanbul trip", "ᲐᲑᲒ ქართული", "Kelvin",
+                 "KELVIN K", "午餐 LUNCH"]
+        for note in notes:
+            for manager in (file_manager, memory_manager):
+                manager.add_transaction(Transaction(
+                    amount=1.0, trans_type=TransactionType.EXPENSE,
+                    category_id=1, date=datetime(2024, 1, 1), note=note))
+        
+        for keyword in ('İst', 'i̇st', 'აბგ', 'kel',
+                        'Kelvin', '午餐 l', 'Lunch'):
+            expected = [t.note for t in memory_manager.query(keyword=keyword)]
+            actual = [t.note for t in file_manager.query(keyword=keyword)]
+            assert expected, f"关键词{keyword!r}应有匹配"
+            assert actual == expected, f"关键词{keyword!r}结果不一致"
+        
+        file_manager.database.close()
+        memory_manager.database.close()